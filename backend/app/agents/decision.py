@@ -1,6 +1,60 @@
-from typing import List, Dict, Any
-from backend.app.schemas.ai import AIAnalysisResult, FraudFlag, Suggestion
+from typing import TYPE_CHECKING, List, Dict, Any, Iterable, Optional, Tuple
+from backend.app.agents.suggestions import priority, render_detail, render_suggestions
 from backend.app.core.config import settings
+import numpy as np
+
+if TYPE_CHECKING:
+    from backend.app.schemas.ai import AIAnalysisResult, FraudFlag
+
+VENDOR_STATUS_CODES = ("", "TRUSTED", "NEW", "FLAGGED", "UNVERIFIED")  # vendor_status column may hold these codes
+
+# Columns evaluate_batch() reads, with the value used when an invoice lacks one.
+# Also the decision_features table layout (schemas/ai.py FEATURE_COLUMNS).
+BATCH_COLUMNS = {
+    "amount": 0.0,
+    "vendor_status": 0,                # index into VENDOR_STATUS_CODES, or the status string
+    "is_duplicate": False,
+    "near_duplicate_similarity": 0.0,  # best near-duplicate match, 0 = none
+    "has_po": False,
+    "erp_valid": False,
+    "erp_unavailable": False,          # PO lookup failed (outage): review, not reject
+    "po_budget": 0.0,
+    "has_gstin": False,
+    "gst_valid": True,
+    "forensics_suspicious": False,
+    "forensics_flags": 0,              # number of forensic findings (one HIGH flag each)
+    "bank_match": True,
+}
+
+def decision_features(extraction: Dict, security_check: Dict) -> Tuple:
+    """One invoice's BATCH_COLUMNS values, read from its inputs the way evaluate() reads them."""
+    near = security_check.get('near_duplicates')
+    erp_result = security_check.get('erp_validation', {})
+    gst_result = security_check.get('gst_validation', {})
+    forensics = security_check.get('digital_forensics', {})
+    status = security_check.get('vendor_status')
+    return (
+        extraction.get('amount', 0) or 0.0,
+        VENDOR_STATUS_CODES.index(status) if status in VENDOR_STATUS_CODES else 0,
+        bool(security_check.get('is_duplicate', False)),
+        near[0]['similarity'] if near else 0.0,
+        bool(extraction.get('po_number')),
+        bool(erp_result.get('valid')),
+        bool(erp_result.get('erp_unavailable')),
+        (erp_result.get('details') or {}).get('budget', 0) if erp_result.get('valid') else 0.0,
+        bool(extraction.get('gstin')),
+        not (gst_result and not gst_result.get('valid', True)),
+        bool(forensics.get('is_suspicious')),
+        len(forensics.get('flags', [])),
+        bool(security_check.get('bank_validation', {}).get('match', True)),
+    )
+
+def batch_columns(items: Iterable[Tuple[Dict, Dict]]) -> Dict[str, np.ndarray]:
+    """Columnar evaluate_batch() input from (extraction, security_check) pairs."""
+    rows = [decision_features(extraction, security_check) for extraction, security_check in items]
+    values = list(zip(*rows)) if rows else [()] * len(BATCH_COLUMNS)
+    return {name: np.array(column, dtype=type(default))
+            for (name, default), column in zip(BATCH_COLUMNS.items(), values)}
 
 class DecisionAgent:
     """
@@ -9,11 +63,22 @@ class DecisionAgent:
     - Calculates Confidence Score (0.00-1.00)
     - Makes Final Decision: APPROVED, REJECTED, NEEDS_REVIEW
     - Generates rich AI suggestions for every invoice
+    evaluate_batch() is the score-and-decision part alone, vectorised over
+    columns for back-testing and re-scoring; it must stay in step with the
+    rules below.
     """
 
-    def evaluate(self, extraction: Dict, security_check: Dict) -> AIAnalysisResult:
-        flags: List[FraudFlag] = []
-        suggestions: List[Suggestion] = []
+    def evaluate(self, extraction: Dict, security_check: Dict, render: bool = True) -> "AIAnalysisResult":
+        """
+        Suggestions are recorded as (code, params) in `suggestion_codes`;
+        render=False skips formatting them into `suggestions`, for callers
+        that render on demand (agents/suggestions.py) or never.
+        """
+        # Imported here: schemas/ai.py builds its feature table from BATCH_COLUMNS
+        from backend.app.schemas.ai import AIAnalysisResult, FraudFlag, Suggestion
+
+        flags: List["FraudFlag"] = []
+        suggestions: List[Tuple[str, Dict[str, Any]]] = []
         confidence = 1.0
 
         vendor_status = security_check.get('vendor_status')
@@ -34,12 +99,7 @@ class DecisionAgent:
                 severity="HIGH"
             ))
             confidence -= 0.6
-            suggestions.append(Suggestion(
-                icon="🚫",
-                title="Block Vendor Payment",
-                detail=f"'{vendor_name}' is on the high-risk vendor list. Freeze all payments immediately and escalate to the Compliance team for investigation. Do not contact the vendor until cleared.",
-                priority="URGENT"
-            ))
+            suggestions.append(("BLOCK_VENDOR_PAYMENT", {'vendor': vendor_name}))
 
         elif vendor_status == 'NEW':
             flags.append(FraudFlag(
@@ -48,20 +108,19 @@ class DecisionAgent:
                 severity="MEDIUM"
             ))
             confidence -= 0.15
-            suggestions.append(Suggestion(
-                icon="📋",
-                title="Complete Vendor Onboarding",
-                detail=f"'{vendor_name}' is not in your Vendor Master Data. Initiate the vendor onboarding process: collect GST certificate, bank verification letter, and PAN card. Add to ERP before processing payment.",
-                priority="HIGH"
-            ))
+            suggestions.append(("COMPLETE_VENDOR_ONBOARDING", {'vendor': vendor_name}))
 
         elif vendor_status == 'TRUSTED':
-            suggestions.append(Suggestion(
-                icon="✅",
-                title="Vendor Verified in Master Data",
-                detail=f"'{vendor_name}' is a trusted vendor with a risk score of {vendor_score}. No additional vendor verification needed.",
-                priority="INFO"
+            suggestions.append(("VENDOR_VERIFIED", {'vendor': vendor_name, 'vendor_score': vendor_score}))
+
+        elif vendor_status == 'UNVERIFIED':
+            # Vendor Master Data unreachable (ERP outage): hold for a person, like an unchecked PO
+            flags.append(FraudFlag(
+                code="VENDOR_UNVERIFIED",
+                description=f"Vendor '{vendor_name}' could not be checked: ERP unavailable.",
+                severity="MEDIUM"
             ))
+            suggestions.append(("VENDOR_CHECK_PENDING", {'vendor': vendor_name}))
 
         # ── RULE 2: Duplicate Check ──────────────────────────────────────────
         if security_check.get('is_duplicate', False):
@@ -71,28 +130,23 @@ class DecisionAgent:
                 severity="HIGH"
             ))
             confidence = 0.0
-            suggestions.append(Suggestion(
-                icon="⛔",
-                title="Duplicate Invoice — Do Not Pay",
-                detail=f"Invoice #{invoice_no} from '{vendor_name}' is an exact duplicate of a previously processed invoice. Archive this record, notify the vendor, and investigate whether this is a billing error or attempted double-billing fraud.",
-                priority="URGENT"
+            suggestions.append(("DUPLICATE_DO_NOT_PAY", {'invoice_number': invoice_no, 'vendor': vendor_name}))
+        elif security_check.get('near_duplicates'):
+            match = security_check['near_duplicates'][0]
+            flags.append(FraudFlag(
+                code="NEAR_DUPLICATE_INVOICE",
+                description=f"Invoice {invoice_no} is {match['similarity']:.0%} similar to previously processed invoice {match['invoice_id']}.",
+                severity="HIGH" if match['similarity'] >= 0.95 else "MEDIUM"
             ))
+            confidence -= 0.5
+            suggestions.append(("POSSIBLE_RESUBMISSION", {'match_invoice_id': match['invoice_id'], 'match_vendor': match['vendor'],
+                                                          'similarity': match['similarity']}))
 
         # ── RULE 3: Amount Analysis ──────────────────────────────────────────
         if amount == 0:
-            suggestions.append(Suggestion(
-                icon="⚠️",
-                title="Amount Could Not Be Extracted",
-                detail="The AI could not detect a clear invoice amount. This may be a scanned/image PDF or an unusual format. Use the 'Paste Text' tab and manually enter the invoice text, or check if the PDF is text-based.",
-                priority="HIGH"
-            ))
+            suggestions.append(("AMOUNT_NOT_EXTRACTED", {}))
         elif amount > 100000:
-            suggestions.append(Suggestion(
-                icon="💰",
-                title="High-Value Invoice — Senior Approval Required",
-                detail=f"This invoice is for {currency} {amount:,.2f}, which exceeds the standard auto-approval limit. Route to Finance Manager or CFO for sign-off before releasing payment.",
-                priority="HIGH"
-            ))
+            suggestions.append(("SENIOR_APPROVAL_REQUIRED", {'currency': currency, 'amount': amount}))
             if vendor_status != 'TRUSTED':
                 flags.append(FraudFlag(
                     code="AMOUNT_SPIKE_DETECTED",
@@ -109,54 +163,40 @@ class DecisionAgent:
                 severity="MEDIUM"
             ))
             confidence -= 0.25
-            suggestions.append(Suggestion(
-                icon="🔍",
-                title="Verify Amount Against Purchase Order",
-                detail=f"The invoice amount of {currency} {amount:,.2f} exceeds the automated approval threshold for a new/unverified vendor. Cross-check this amount against the original purchase order and goods receipt note (GRN) before approving.",
-                priority="HIGH"
-            ))
+            suggestions.append(("VERIFY_AMOUNT_AGAINST_PO", {'currency': currency, 'amount': amount}))
         else:
-            suggestions.append(Suggestion(
-                icon="💵",
-                title="Amount Within Normal Range",
-                detail=f"Invoice amount of {currency} {amount:,.2f} is within the standard processing threshold.",
-                priority="INFO"
-            ))
+            suggestions.append(("AMOUNT_NORMAL", {'currency': currency, 'amount': amount}))
 
         # ── RULE 4: PO Verification ──────────────────────────────────────────
         erp_result = security_check.get('erp_validation', {})
+        po_pending = bool(po_number) and bool(erp_result.get('erp_unavailable'))
+        erp_pending = po_pending or vendor_status == 'UNVERIFIED'
         if po_number:
-            if not erp_result.get('valid'):
+            if po_pending:
+                # Nothing is known about the PO: hold the invoice for a person instead of rejecting it
+                flags.append(FraudFlag(
+                    code="ERP_UNAVAILABLE",
+                    description=f"PO '{po_number}' could not be checked: {erp_result.get('message', 'ERP unavailable')}",
+                    severity="MEDIUM"
+                ))
+                suggestions.append(("PO_CHECK_PENDING", {'po_number': po_number}))
+            elif not erp_result.get('valid'):
                 flags.append(FraudFlag(
                     code="ERP_MISMATCH",
                     description=f"PO '{po_number}' not found or invalid in ERP: {erp_result.get('message', 'Unknown error')}",
                     severity="HIGH"
                 ))
                 confidence -= 0.5
-                suggestions.append(Suggestion(
-                    icon="📦",
-                    title="PO Mismatch — Verify with Procurement",
-                    detail=f"PO number '{po_number}' on this invoice does not match any open purchase order in the ERP system. Contact the Procurement team to verify if this PO exists. If not, reject the invoice and ask the vendor to resubmit with a valid PO.",
-                    priority="URGENT"
-                ))
+                suggestions.append(("PO_MISMATCH", {'po_number': po_number}))
             else:
                 po_details = erp_result.get('details', {})
                 budget = po_details.get('budget', 0)
                 if budget > 0 and amount > budget:
-                    suggestions.append(Suggestion(
-                        icon="📊",
-                        title="Invoice Exceeds PO Budget",
-                        detail=f"PO '{po_number}' has a budget of {currency} {budget:,.2f} but this invoice is for {currency} {amount:,.2f}. The overage of {currency} {amount - budget:,.2f} needs a budget amendment before payment.",
-                        priority="HIGH"
-                    ))
+                    suggestions.append(("PO_BUDGET_EXCEEDED", {'po_number': po_number, 'currency': currency, 'budget': budget,
+                                                               'amount': amount, 'overage': amount - budget}))
                     confidence -= 0.15
                 else:
-                    suggestions.append(Suggestion(
-                        icon="✅",
-                        title="PO Matched Successfully",
-                        detail=f"Purchase Order '{po_number}' is open and valid in ERP. Invoice amount is within the approved budget.",
-                        priority="INFO"
-                    ))
+                    suggestions.append(("PO_MATCHED", {'po_number': po_number}))
         else:
             if amount > 10000:
                 flags.append(FraudFlag(
@@ -165,19 +205,9 @@ class DecisionAgent:
                     severity="MEDIUM"
                 ))
                 confidence -= 0.1
-                suggestions.append(Suggestion(
-                    icon="📝",
-                    title="Request PO or Non-PO Approval",
-                    detail=f"This invoice for {currency} {amount:,.2f} has no Purchase Order number. Either locate the original PO and ask the vendor to resubmit, or initiate a Non-PO Invoice approval workflow with your Finance Manager.",
-                    priority="HIGH"
-                ))
+                suggestions.append(("REQUEST_PO", {'currency': currency, 'amount': amount}))
             else:
-                suggestions.append(Suggestion(
-                    icon="📝",
-                    title="No PO — Low Value Invoice",
-                    detail="No PO number found, but the invoice amount is below the threshold. You may process this as a petty cash or direct expense invoice.",
-                    priority="MEDIUM"
-                ))
+                suggestions.append(("NO_PO_LOW_VALUE", {}))
 
         # ── RULE 5: GST Verification ─────────────────────────────────────────
         gst_result = security_check.get('gst_validation', {})
@@ -189,26 +219,11 @@ class DecisionAgent:
                     severity="HIGH"
                 ))
                 confidence -= 0.4
-                suggestions.append(Suggestion(
-                    icon="🏛️",
-                    title="Invalid GSTIN — Tax Compliance Risk",
-                    detail=f"The GSTIN '{gstin}' on this invoice failed format/checksum validation. You cannot claim GST Input Tax Credit (ITC) on this invoice. Ask the vendor to correct their GSTIN and reissue the invoice before payment.",
-                    priority="URGENT"
-                ))
+                suggestions.append(("INVALID_GSTIN", {'gstin': gstin}))
             else:
-                suggestions.append(Suggestion(
-                    icon="🏛️",
-                    title="GSTIN Valid — ITC Claimable",
-                    detail=f"GSTIN '{gstin}' passed validation. You are eligible to claim GST Input Tax Credit on this invoice. Ensure it is filed in GSTR-2B.",
-                    priority="INFO"
-                ))
+                suggestions.append(("GSTIN_VALID", {'gstin': gstin}))
         else:
-            suggestions.append(Suggestion(
-                icon="🏛️",
-                title="No GSTIN Found",
-                detail="No GSTIN was detected on this invoice. If this is a B2B transaction above ₹20,000, a GSTIN is mandatory. Request a revised invoice with the vendor's GSTIN.",
-                priority="MEDIUM"
-            ))
+            suggestions.append(("NO_GSTIN", {}))
 
         # ── RULE 6: Digital Forensics ────────────────────────────────────────
         forensics = security_check.get('digital_forensics', {})
@@ -220,19 +235,9 @@ class DecisionAgent:
                     severity="HIGH"
                 ))
             confidence -= 0.5
-            suggestions.append(Suggestion(
-                icon="🔬",
-                title="PDF Forgery Suspected — Forensic Review",
-                detail=f"Digital forensics detected suspicious metadata: {'; '.join(forensics.get('flags', []))}. This PDF may have been created or altered using image editing software. Do not pay. Request the original invoice directly from the vendor via a verified communication channel.",
-                priority="URGENT"
-            ))
+            suggestions.append(("FORGERY_SUSPECTED", {'findings': '; '.join(forensics.get('flags', []))}))
         else:
-            suggestions.append(Suggestion(
-                icon="🔬",
-                title="PDF Forensics: Authentic",
-                detail="No signs of digital tampering detected in the PDF metadata. The document appears to have been generated by standard accounting software.",
-                priority="INFO"
-            ))
+            suggestions.append(("FORENSICS_AUTHENTIC", {}))
 
         # ── RULE 7: Bank Account Verification ───────────────────────────────
         bank_result = security_check.get('bank_validation', {})
@@ -243,29 +248,14 @@ class DecisionAgent:
                 severity="HIGH"
             ))
             confidence -= 0.6
-            suggestions.append(Suggestion(
-                icon="🏦",
-                title="CRITICAL: Bank Account Changed — Potential Fraud",
-                detail=f"The bank account on this invoice differs from the verified account in your ERP. This is the #1 sign of Business Email Compromise (BEC) fraud. DO NOT transfer funds. Call the vendor's finance team on a phone number from your records (not from this invoice) to verify the change.",
-                priority="URGENT"
-            ))
+            suggestions.append(("BANK_ACCOUNT_CHANGED", {}))
         else:
-            if bank_result.get('reason') != 'Vendor not found in Master Data':
-                suggestions.append(Suggestion(
-                    icon="🏦",
-                    title="Bank Account Verified",
-                    detail="The bank account on this invoice matches the verified account in your ERP Vendor Master Data. Safe to proceed with payment to this account.",
-                    priority="INFO"
-                ))
+            if bank_result.get('reason') not in ('Vendor not found in Master Data', 'Vendor Master Data unavailable'):
+                suggestions.append(("BANK_ACCOUNT_VERIFIED", {}))
 
         # ── Date Check ───────────────────────────────────────────────────────
         if not date:
-            suggestions.append(Suggestion(
-                icon="📅",
-                title="Invoice Date Missing",
-                detail="No invoice date was detected. An invoice date is required for accounting entries and GST filing. Request a revised invoice with the correct date.",
-                priority="MEDIUM"
-            ))
+            suggestions.append(("INVOICE_DATE_MISSING", {}))
 
         # ── FINAL DECISION ───────────────────────────────────────────────────
         confidence = max(0.0, min(1.0, confidence))
@@ -274,24 +264,19 @@ class DecisionAgent:
         decision = "NEEDS_REVIEW"
         reason = "One or more fields require human validation before processing."
 
-        if confidence >= settings.CONFIDENCE_THRESHOLD_APPROVED and not high_flags:
+        if confidence >= settings.CONFIDENCE_THRESHOLD_APPROVED and not high_flags and not erp_pending:
             decision = "APPROVED"
             reason = f"Automated Approval: All checks passed for '{vendor_name}'. Vendor verified, amount within threshold, no fraud signals detected."
-            suggestions.insert(0, Suggestion(
-                icon="🚀",
-                title="Ready for Payment Processing",
-                detail=f"This invoice from '{vendor_name}' for {currency} {amount:,.2f} has passed all automated checks. Queue for payment as per agreed payment terms.",
-                priority="INFO"
-            ))
+            suggestions.insert(0, ("READY_FOR_PAYMENT", {'vendor': vendor_name, 'currency': currency, 'amount': amount}))
         elif confidence < settings.CONFIDENCE_THRESHOLD_REVIEW or high_flags:
             decision = "REJECTED"
             codes = [f.code for f in high_flags]
             reason = f"Blocked by policy: {codes}. Confidence: {round(confidence * 100)}%."
 
         # ── PRIMARY RECOMMENDATION ───────────────────────────────────────────
-        urgent = [s for s in suggestions if s.priority == 'URGENT']
+        urgent = [(code, params) for code, params in suggestions if priority(code) == 'URGENT']
         if urgent:
-            recommendation = urgent[0].detail
+            recommendation = render_detail(*urgent[0])
         elif decision == 'APPROVED':
             recommendation = f"Invoice approved. Queue for payment to '{vendor_name}' as per payment terms."
         elif decision == 'REJECTED':
@@ -306,5 +291,70 @@ class DecisionAgent:
             decision=decision,
             reasoning=reason,
             recommendation=recommendation,
-            suggestions=suggestions,
+            suggestions=[Suggestion(**s) for s in render_suggestions(suggestions)] if render else [],
+            suggestion_codes=suggestions,
         )
+
+    def evaluate_batch(self, columns: Dict[str, Any], approve_threshold: Optional[float] = None,
+                       review_threshold: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """
+        Confidence and decision for many invoices at once, no flag or
+        suggestion objects. `columns` maps BATCH_COLUMNS names to equal-length
+        arrays (missing columns take their default); see batch_columns().
+        Penalties are applied in evaluate()'s order with the same float
+        arithmetic, so results match it exactly. Thresholds default to the
+        configured ones (override them to back-test a policy).
+        Returns {"confidence", "decision", "high_flags"} arrays.
+        """
+        n = len(next(iter(columns.values()))) if columns else 0
+        col = {name: np.broadcast_to(np.asarray(columns.get(name, default)), (n,))
+               for name, default in BATCH_COLUMNS.items()}
+        amount = col["amount"].astype(float)
+        status = col["vendor_status"]
+        if status.dtype.kind in "iuf":
+            status = np.array(VENDOR_STATUS_CODES, dtype=object)[status.astype(np.intp)]
+        flagged, new, trusted = status == 'FLAGGED', status == 'NEW', status == 'TRUSTED'
+        unverified = status == 'UNVERIFIED'
+        duplicate = col["is_duplicate"].astype(bool)
+        similarity = col["near_duplicate_similarity"].astype(float)
+        near = ~duplicate & (similarity > 0)
+        has_po, erp_valid = col["has_po"].astype(bool), col["erp_valid"].astype(bool)
+        po_pending = has_po & col["erp_unavailable"].astype(bool)
+        budget = col["po_budget"].astype(float)
+        gst_invalid = col["has_gstin"].astype(bool) & ~col["gst_valid"].astype(bool)
+        suspicious = col["forensics_suspicious"].astype(bool)
+        bank_mismatch = ~col["bank_match"].astype(bool)
+
+        high_value = amount > 100000
+        mid_value = ~high_value & (amount > 10000) & ~trusted
+        po_invalid = has_po & ~erp_valid & ~po_pending
+        over_budget = has_po & erp_valid & (budget > 0) & (amount > budget)
+        missing_po = ~has_po & (amount > 10000)
+
+        confidence = np.ones(n)
+        for mask, penalty in ((flagged, 0.6), (new, 0.15)):                    # RULE 1
+            confidence = np.where(mask, confidence - penalty, confidence)
+        confidence = np.where(duplicate, 0.0, confidence)                       # RULE 2
+        confidence = np.where(near, confidence - 0.5, confidence)
+        confidence = np.where(high_value & ~trusted, confidence - 0.35, confidence)  # RULE 3
+        confidence = np.where(high_value & trusted, confidence - 0.05, confidence)
+        for mask, penalty in ((mid_value, 0.25), (po_invalid, 0.5), (over_budget, 0.15),  # RULE 4
+                              (missing_po, 0.1), (gst_invalid, 0.4),                     # RULE 5
+                              (suspicious, 0.5), (bank_mismatch, 0.6)):                  # RULE 6, 7
+            confidence = np.where(mask, confidence - penalty, confidence)
+        confidence = np.clip(confidence, 0.0, 1.0)
+
+        high_flags = (flagged.astype(np.int32) + duplicate + (near & (similarity >= 0.95))
+                      + (high_value & ~trusted) + po_invalid + gst_invalid + bank_mismatch
+                      + np.where(suspicious, col["forensics_flags"].astype(np.int32), 0))
+
+        approve = settings.CONFIDENCE_THRESHOLD_APPROVED if approve_threshold is None else approve_threshold
+        review = settings.CONFIDENCE_THRESHOLD_REVIEW if review_threshold is None else review_threshold
+        decision = np.full(n, "NEEDS_REVIEW", dtype=object)
+        decision[(confidence < review) | (high_flags > 0)] = "REJECTED"
+        decision[(confidence >= approve) & (high_flags == 0) & ~po_pending & ~unverified] = "APPROVED"
+
+        # Python's round() (not np.round) on the few distinct scores, as evaluate() reports them
+        distinct, inverse = np.unique(confidence, return_inverse=True)
+        rounded = np.array([round(float(c), 2) for c in distinct])[inverse.reshape(-1)] if n else confidence
+        return {"confidence": rounded, "decision": decision, "high_flags": high_flags}
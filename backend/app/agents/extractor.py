@@ -1,16 +1,291 @@
 import re
-from typing import Dict, Any
+from itertools import islice
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
 
-class InvoiceParserAgent:
+# ── FIELD PATTERNS ───────────────────────────────────────────────────────────
+# Module-level and shared by every InvoiceParserAgent (re caches compiled
+# patterns anyway; this mostly keeps them in one place).
+# Order inside each tuple is the priority order used by extract().
+
+_WHITESPACE_RE = re.compile(r'[ \t]+')
+_LINE_RE = re.compile(r'[^\n]+')
+_DIGIT_RE = re.compile(r'\d')
+
+# Labels and values are often split across a page break ("Total:\n" / "500").
+# Each chunk is scanned together with up to this many trailing characters
+# (whole lines) of the previous one.
+_CHUNK_OVERLAP_CHARS = 256
+
+_VENDOR_RE = re.compile(
+    r"(?:From|Vendor|Bill\s*From|Seller|Company|Billed\s*By)[:\s]+([A-Za-z0-9\s\.,&'\-]+?)(?:\n|$|,|\|)",
+    re.IGNORECASE | re.MULTILINE
+)
+_VENDOR_SKIP_RE = re.compile(r'^(invoice|bill|receipt|tax|gst)', re.IGNORECASE)
+
+# Single scan for all currencies. The lookahead keeps matches zero-width so
+# overlapping tokens (e.g. "EURs 500") are still seen, exactly as the
+# separate per-currency searches would.
+_CURRENCY_RE = re.compile(
+    r"(?=(?P<INR>INR|Rs\.?\s|₹|Rupee)|(?P<EUR>EUR|€|Euro)|(?P<GBP>GBP|£|Pound))",
+    re.IGNORECASE
+)
+
+# Pattern A: keyword + optional currency + number
+_AMOUNT_TOTAL_RE = re.compile(
+    r"(?:Total|Amount\s*Due|Balance\s*Due|Grand\s*Total|Invoice\s*Total|Net\s*Amount|Sub\s*Total|Due\s*Amount)"
+    r"[\s:₹$€£Rs.]*"
+    r"([\d,]+(?:\.\d{1,2})?)",
+    re.IGNORECASE
+)
+# Only a final-total label settles the amount during streaming; "Total" and
+# "Sub Total" show up on every annexure page and a bigger one may follow
+_FINAL_TOTAL_RE = re.compile(
+    r"(?:Grand\s*Total|Amount\s*Due|Balance\s*Due|Invoice\s*Total|Due\s*Amount)[\s:₹$€£Rs.]*\d",
+    re.IGNORECASE
+)
+# Pattern B: currency symbol immediately before number (₹1,23,456.00)
+_AMOUNT_SYMBOL_RE = re.compile(r"(?:₹|Rs\.?\s*|\$|€|£)\s*([\d,]+(?:\.\d{1,2})?)", re.IGNORECASE)
+# Pattern C: number followed by currency keyword
+_AMOUNT_SUFFIX_RE = re.compile(r"([\d,]+(?:\.\d{1,2})?)\s*(?:INR|USD|EUR|GBP|Rs\.?)\b", re.IGNORECASE)
+# Pattern D: any decimal number >= 10 (last resort fallback)
+_AMOUNT_ANY_RE = re.compile(r'\b(\d{2,}(?:,\d{2,3})*(?:\.\d{1,2})?)\b')
+
+_INVOICE_NO_RES = (
+    re.compile(r"(?:Invoice|Inv|Bill|Receipt)\s*(?:No\.?|Number|#|:)?\s*[:\-#]?\s*([A-Z0-9][A-Z0-9\-/]{3,})", re.IGNORECASE),
+    re.compile(r"#\s*([A-Z0-9\-]{4,})", re.IGNORECASE),
+    re.compile(r"(?:Invoice|Bill)\s+(?:No|Number)[:\s.]+([A-Z0-9\-]{3,})", re.IGNORECASE),
+)
+
+_DATE_RES = (
+    re.compile(r"(?:Invoice\s*Date|Bill\s*Date|Date\s*of\s*Issue|Date)[:\s]+(\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4})", re.IGNORECASE),
+    re.compile(r"(\d{4}-\d{2}-\d{2})", re.IGNORECASE),
+    re.compile(r"(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4})", re.IGNORECASE),
+)
+
+_PO_RES = (
+    re.compile(r"(?:PO|P\.O\.|Purchase\s*Order\s*(?:No\.?|Number|#)?)[:\s#\-]+([A-Z0-9][A-Z0-9\-]{2,})", re.IGNORECASE),
+    re.compile(r"PO\s*(?:No\.?|Number)[:\s]+([A-Z0-9\-]{3,})", re.IGNORECASE),
+)
+_PO_STOPWORD_RE = re.compile(r'^(number|no|date|ref|order)$', re.IGNORECASE)
+
+_GSTIN_RE = re.compile(r'\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z]Z[0-9A-Z]')
+# IBAN — strict: 2-letter country code + 2 digits + 11-30 alphanumeric, total 15-34 chars
+# Flipkart order IDs like OD436621289408659100 start with letters but are NOT IBANs
+_IBAN_RE = re.compile(r'\b([A-Z]{2}\d{2}[A-Z0-9]{11,30})\b')
+_IFSC_RE = re.compile(r'\b([A-Z]{4}0[A-Z0-9]{6})\b')
+_ACCOUNT_RE = re.compile(
+    r'(?:Account\s*No\.?|Acc\.?\s*No\.?|A/c\s*No\.?)[:\s]*([\d\-]{9,18})',
+    re.IGNORECASE
+)
+
+# Valid IBAN country codes are real ISO 3166-1 alpha-2 codes (not OD, XX etc.)
+_IBAN_COUNTRIES = frozenset({
+    'GB','DE','FR','IN','US','AE','SA','QA','KW','BH','OM','JO','LB',
+    'CH','AT','BE','NL','ES','IT','PT','SE','NO','DK','FI','PL','CZ',
+    'HU','RO','BG','HR','SI','SK','LT','LV','EE','MT','CY','LU','IE',
+    'GR','TR','IL','EG','ZA','NG','KE','GH','TZ','UG','RW','ET','SN',
+    'CI','CM','MG','MZ','AO','ZM','ZW','MU','SC','MV','LK','BD','PK',
+    'NP','AF','MM','TH','VN','PH','ID','MY','SG','HK','TW','KR','JP',
+    'CN','MN','KZ','UZ','TM','AZ','GE','AM','MD','UA','BY','RS','BA',
+    'MK','AL','ME','XK','IS','LI','MC','SM','VA','AD','GL','FO',
+})
+
+
+def _parse_amounts(values: List[str]) -> List[float]:
+    """Convert captured '1,23,456.00' style strings to floats, skipping junk like ','."""
+    parsed = []
+    for v in values:
+        try:
+            parsed.append(float(v.replace(',', '')))
+        except ValueError:
+            pass
+    return parsed
+
+
+def _has_digit(candidate: str) -> bool:
+    return bool(_DIGIT_RE.search(candidate))
+
+
+def _is_po_reference(candidate: str) -> bool:
+    # PO must contain a digit and be a real reference, not a generic word
+    return _has_digit(candidate) and not _PO_STOPWORD_RE.match(candidate)
+
+
+def _search(pat, text: str, limit: int):
+    """pat.search(), ignoring matches that start at or after `limit` (see _FieldAccumulator.feed)."""
+    m = pat.search(text)
+    return m if m and m.start() < limit else None
+
+
+def _fill_slots(slots: List[Optional[str]], patterns, text: str, accept, limit: int) -> None:
     """
-    Enhanced AI extraction logic for real-world invoices.
-    Uses multiple regex patterns and fallback strategies.
+    Record the first capture of each priority-ordered pattern.
+    Lower-priority patterns are not scanned once a higher one has settled
+    the answer (every slot before it filled, and it passes `accept`).
+    """
+    prefix_filled = True
+    for i, pat in enumerate(patterns):
+        if slots[i] is None:
+            m = _search(pat, text, limit)
+            if m:
+                slots[i] = m.group(1).strip()
+        if slots[i] is None:
+            prefix_filled = False
+        elif prefix_filled and accept(slots[i]):
+            return
+
+
+def _pick_slot(slots: List[Optional[str]], accept):
     """
+    Highest-priority capture passing `accept`, plus whether it is settled,
+    i.e. no later text could still fill a higher-priority slot.
+    """
+    settled = True
+    for slot in slots:
+        if slot is None:
+            settled = False
+        elif accept(slot):
+            return slot, settled
+    return None, False
 
-    def extract(self, text: str) -> Dict[str, Any]:
+
+def _always(candidate: str) -> bool:
+    return True
+
+
+class _FieldAccumulator:
+    """
+    Mergeable scan state for one document.
+    Text is fed in chunks (pages, sheets) that end on a line boundary; the
+    result is the same as scanning the concatenated text in one go, but only
+    the running state and a short overlap are kept, never the text itself.
+    Every aggregate (first match, max, set) is idempotent, so re-scanning the
+    overlap never double counts.
+    """
+
+    def __init__(self):
+        self.tail = ""
+        self.vendor: Optional[str] = None
+        self.head_lines: List[str] = []          # vendor fallback: first five non-empty lines
+        self.currencies = set()
+        self.max_total: Optional[float] = None   # pattern A
+        self.final_total = False                 # a grand total / amount due has been read
+        self.max_candidate: Optional[float] = None
+        self.max_any: Optional[float] = None     # pattern D, only while nothing better exists
+        self.invoice_slots: List[Optional[str]] = [None] * len(_INVOICE_NO_RES)
+        self.date_slots: List[Optional[str]] = [None] * len(_DATE_RES)
+        self.po_slots: List[Optional[str]] = [None] * len(_PO_RES)
+        self.gstin: Optional[str] = None
+        self.iban: Optional[str] = None          # first IBAN-shaped token, validated in result()
+        self.ifsc: Optional[str] = None
+        self.account: Optional[str] = None
+
+    def feed(self, chunk: str, final: bool = False) -> None:
         """
-        Extract invoice data with robust pattern matching.
+        Scan one chunk (plus the overlap from the previous one).
+        First-match fields ignore matches starting inside the new overlap:
+        they may be cut short by the chunk end ("Invoice\n" | "9999") and are
+        picked up in full on the next feed, or on the `final` one.
         """
+        text = self.tail + chunk
+        if final:
+            tail = ""
+        else:
+            # Keep whole trailing lines only, so no match can start mid-token
+            tail = text[-_CHUNK_OVERLAP_CHARS:]
+            if len(text) > _CHUNK_OVERLAP_CHARS:
+                tail = tail[tail.find('\n') + 1:] if '\n' in tail[:-1] else ""
+        self.tail = tail
+        limit = len(text) - len(tail)
+
+        # Normalize whitespace
+        text_norm = _WHITESPACE_RE.sub(' ', text)
+
+        # ── 1. VENDOR EXTRACTION ─────────────────────────────────────────────
+        if self.vendor is None:
+            vendor_match = _search(_VENDOR_RE, text, limit)
+            if vendor_match:
+                self.vendor = vendor_match.group(1).strip()[:60]
+            elif len(self.head_lines) < 5:
+                lines = (m.group(0).strip() for m in _LINE_RE.finditer(chunk))
+                self.head_lines.extend(islice((l for l in lines if l), 5 - len(self.head_lines)))
+
+        # ── 2. CURRENCY DETECTION ────────────────────────────────────────────
+        if "INR" not in self.currencies:
+            for m in _CURRENCY_RE.finditer(text):
+                self.currencies.add(m.lastgroup)
+                if m.lastgroup == "INR":
+                    break
+
+        # ── 3. AMOUNT EXTRACTION ─────────────────────────────────────────────
+        totals = _parse_amounts(_AMOUNT_TOTAL_RE.findall(text_norm))
+        candidates = (
+            totals
+            + _parse_amounts(_AMOUNT_SYMBOL_RE.findall(text_norm))
+            + _parse_amounts(_AMOUNT_SUFFIX_RE.findall(text_norm))
+        )
+        if totals:
+            self.max_total = max(totals + ([self.max_total] if self.max_total is not None else []))
+            if not self.final_total:
+                self.final_total = _FINAL_TOTAL_RE.search(text_norm) is not None
+        if candidates:
+            self.max_candidate = max(candidates + ([self.max_candidate] if self.max_candidate is not None else []))
+        elif self.max_candidate is None:
+            fallback = _parse_amounts(_AMOUNT_ANY_RE.findall(text_norm))
+            if fallback:
+                self.max_any = max(fallback + ([self.max_any] if self.max_any is not None else []))
+
+        # ── 4-6. INVOICE NUMBER, DATE, PURCHASE ORDER ────────────────────────
+        _fill_slots(self.invoice_slots, _INVOICE_NO_RES, text, _has_digit, limit)
+        _fill_slots(self.date_slots, _DATE_RES, text, _always, limit)
+        _fill_slots(self.po_slots, _PO_RES, text, _is_po_reference, limit)
+
+        # ── 7. GSTIN ─────────────────────────────────────────────────────────
+        if self.gstin is None:
+            gst_match = _search(_GSTIN_RE, text, limit)
+            if gst_match:
+                self.gstin = gst_match.group(0)
+
+        # ── 8. BANK DETAILS ──────────────────────────────────────────────────
+        if self.iban is None:
+            iban_match = _search(_IBAN_RE, text, limit)
+            if iban_match:
+                self.iban = iban_match.group(1)
+
+        if self.ifsc is None:
+            ifsc_match = _search(_IFSC_RE, text, limit)
+            if ifsc_match:
+                self.ifsc = ifsc_match.group(1)
+
+        if self.account is None:
+            acc_match = _search(_ACCOUNT_RE, text, limit)
+            if acc_match:
+                self.account = acc_match.group(1).replace('-', '').strip()
+
+    def is_settled(self, field: str) -> bool:
+        """True when reading more text can no longer change (or improve) `field`."""
+        if field == "vendor_name":
+            return self.vendor is not None
+        if field == "amount":
+            # result() takes the largest total in the document; stopping on any
+            # total (e.g. a page 1 sub total) would miss the real one later
+            return self.final_total
+        if field == "currency":
+            return "INR" in self.currencies
+        if field == "invoice_number":
+            return _pick_slot(self.invoice_slots, _has_digit)[1]
+        if field == "date":
+            return _pick_slot(self.date_slots, _always)[1]
+        if field == "po_number":
+            return _pick_slot(self.po_slots, _is_po_reference)[1]
+        return {
+            "gstin": self.gstin,
+            "iban": self.iban,
+            "ifsc": self.ifsc,
+            "account_number": self.account,
+        }.get(field) is not None
+
+    def result(self) -> Dict[str, Any]:
         result: Dict[str, Any] = {
             "vendor_name":    "Unknown Vendor",
             "invoice_number": "UNK-000",
@@ -24,174 +299,96 @@ class InvoiceParserAgent:
             "account_number": None,
         }
 
-        # Normalize whitespace
-        text_norm = re.sub(r'[ \t]+', ' ', text)
-
-        # ── 1. VENDOR EXTRACTION ─────────────────────────────────────────────
-        vendor_match = re.search(
-            r"(?:From|Vendor|Bill\s*From|Seller|Company|Billed\s*By)[:\s]+([A-Za-z0-9\s\.,&'\-]+?)(?:\n|$|,|\|)",
-            text, re.IGNORECASE | re.MULTILINE
-        )
-        if vendor_match:
-            result['vendor_name'] = vendor_match.group(1).strip()[:60]
+        if self.vendor is not None:
+            result['vendor_name'] = self.vendor
         else:
-            lines = [l.strip() for l in text.split('\n') if l.strip()]
-            for line in lines[:5]:
-                if len(line) > 3 and not re.match(r'^(invoice|bill|receipt|tax|gst)', line, re.IGNORECASE):
+            for line in self.head_lines:
+                if len(line) > 3 and not _VENDOR_SKIP_RE.match(line):
                     result['vendor_name'] = line[:60]
                     break
 
-        # ── 2. CURRENCY DETECTION ────────────────────────────────────────────
-        if re.search(r'(?:INR|Rs\.?\s|₹|Rupee)', text, re.IGNORECASE):
-            result['currency'] = "INR"
-        elif re.search(r'(?:EUR|€|Euro)', text, re.IGNORECASE):
-            result['currency'] = "EUR"
-        elif re.search(r'(?:GBP|£|Pound)', text, re.IGNORECASE):
-            result['currency'] = "GBP"
-        else:
-            result['currency'] = "USD"
+        # Priority INR > EUR > GBP > USD, regardless of position in the text.
+        for code in ("INR", "EUR", "GBP"):
+            if code in self.currencies:
+                result['currency'] = code
+                break
 
-        # ── 3. AMOUNT EXTRACTION ─────────────────────────────────────────────
-        # Strategy: find the LARGEST numeric value near total/amount keywords.
-        # This handles: "Total: ₹1,23,456.00", "$12,345.67", "Amount Due 9999"
-        
-        amount_candidates = []
-
-        # Pattern A: keyword + optional currency + number
-        pat_a = re.findall(
-            r"(?:Total|Amount\s*Due|Balance\s*Due|Grand\s*Total|Invoice\s*Total|Net\s*Amount|Sub\s*Total|Due\s*Amount)"
-            r"[\s:₹$€£Rs.]*"
-            r"([\d,]+(?:\.\d{1,2})?)",
-            text_norm, re.IGNORECASE
-        )
-        for v in pat_a:
-            try:
-                amount_candidates.append(float(v.replace(',', '')))
-            except ValueError:
-                pass
-
-        # Pattern B: currency symbol immediately before number (₹1,23,456.00)
-        pat_b = re.findall(
-            r"(?:₹|Rs\.?\s*|\$|€|£)\s*([\d,]+(?:\.\d{1,2})?)",
-            text_norm, re.IGNORECASE
-        )
-        for v in pat_b:
-            try:
-                amount_candidates.append(float(v.replace(',', '')))
-            except ValueError:
-                pass
-
-        # Pattern C: number followed by currency keyword
-        pat_c = re.findall(
-            r"([\d,]+(?:\.\d{1,2})?)\s*(?:INR|USD|EUR|GBP|Rs\.?)\b",
-            text_norm, re.IGNORECASE
-        )
-        for v in pat_c:
-            try:
-                amount_candidates.append(float(v.replace(',', '')))
-            except ValueError:
-                pass
-
-        # Pattern D: any decimal number >= 10 (last resort fallback)
-        if not amount_candidates:
-            pat_d = re.findall(r'\b(\d{2,}(?:,\d{2,3})*(?:\.\d{1,2})?)\b', text_norm)
-            for v in pat_d:
-                try:
-                    amount_candidates.append(float(v.replace(',', '')))
-                except ValueError:
-                    pass
-
-        if amount_candidates:
-            # Prefer the largest value found near a "total" keyword (pat_a),
-            # otherwise take the largest overall.
-            if pat_a:
-                result['amount'] = max(float(v.replace(',', '')) for v in pat_a)
-            else:
-                result['amount'] = max(amount_candidates)
-
-        # ── 4. INVOICE NUMBER ────────────────────────────────────────────
-        # Must contain at least one digit and be >= 4 chars to avoid matching words
-        inv_patterns = [
-            r"(?:Invoice|Inv|Bill|Receipt)\s*(?:No\.?|Number|#|:)?\s*[:\-#]?\s*([A-Z0-9][A-Z0-9\-/]{3,})",
-            r"#\s*([A-Z0-9\-]{4,})",
-            r"(?:Invoice|Bill)\s+(?:No|Number)[:\s.]+([A-Z0-9\-]{3,})",
-        ]
-        for pat in inv_patterns:
-            m = re.search(pat, text, re.IGNORECASE)
-            if m:
-                candidate = m.group(1).strip()
-                # Must contain at least one digit to be a real invoice number
-                if re.search(r'\d', candidate):
-                    result['invoice_number'] = candidate
-                    break
+        # Prefer the largest value found near a "total" keyword (pattern A),
+        # otherwise take the largest overall.
+        if self.max_total is not None:
+            result['amount'] = self.max_total
+        elif self.max_candidate is not None:
+            result['amount'] = self.max_candidate
+        elif self.max_any is not None:
+            result['amount'] = self.max_any
 
-        # ── 5. DATE ──────────────────────────────────────────────────────────
-        date_patterns = [
-            r"(?:Invoice\s*Date|Bill\s*Date|Date\s*of\s*Issue|Date)[:\s]+(\d{1,2}[\/\-\.]\d{1,2}[\/\-\.]\d{2,4})",
-            r"(\d{4}-\d{2}-\d{2})",
-            r"(\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{4})",
-        ]
-        for pat in date_patterns:
-            m = re.search(pat, text, re.IGNORECASE)
-            if m:
-                result['date'] = m.group(1).strip()
-                break
+        invoice_number = _pick_slot(self.invoice_slots, _has_digit)[0]
+        if invoice_number:
+            result['invoice_number'] = invoice_number
+        result['date'] = _pick_slot(self.date_slots, _always)[0]
+        result['po_number'] = _pick_slot(self.po_slots, _is_po_reference)[0]
+        result['gstin'] = self.gstin
 
-        # ── 6. PURCHASE ORDER ────────────────────────────────────────────
-        # PO must contain a digit and be a real reference, not a generic word
-        po_patterns = [
-            r"(?:PO|P\.O\.|Purchase\s*Order\s*(?:No\.?|Number|#)?)[:\s#\-]+([A-Z0-9][A-Z0-9\-]{2,})",
-            r"PO\s*(?:No\.?|Number)[:\s]+([A-Z0-9\-]{3,})",
-        ]
-        for pat in po_patterns:
-            m = re.search(pat, text, re.IGNORECASE)
-            if m:
-                candidate = m.group(1).strip()
-                # Must contain a digit and not be a generic word
-                if re.search(r'\d', candidate) and not re.match(r'^(number|no|date|ref|order)$', candidate, re.IGNORECASE):
-                    result['po_number'] = candidate
-                    break
+        # Valid IBAN country codes are real ISO 3166-1 alpha-2 codes (not OD, XX etc.)
+        if self.iban and self.iban[:2] in _IBAN_COUNTRIES and 15 <= len(self.iban) <= 34:
+            result['iban'] = self.iban
+        result['ifsc'] = self.ifsc
+        result['account_number'] = self.account
+        return result
 
-        # ── 7. GSTIN ─────────────────────────────────────────────────────────
-        gst_match = re.search(r'\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z]Z[0-9A-Z]', text)
-        if gst_match:
-            result['gstin'] = gst_match.group(0)
 
-        # ── 8. BANK DETAILS ──────────────────────────────────────────────────
-        # IBAN — strict: 2-letter country code + 2 digits + 11-30 alphanumeric, total 15-34 chars
-        # Flipkart order IDs like OD436621289408659100 start with letters but are NOT IBANs
-        iban_match = re.search(
-            r'\b([A-Z]{2}\d{2}[A-Z0-9]{11,30})\b',
-            text
-        )
-        if iban_match:
-            candidate = iban_match.group(1)
-            # Valid IBAN country codes are real ISO 3166-1 alpha-2 codes (not OD, XX etc.)
-            country = candidate[:2]
-            valid_countries = {
-                'GB','DE','FR','IN','US','AE','SA','QA','KW','BH','OM','JO','LB',
-                'CH','AT','BE','NL','ES','IT','PT','SE','NO','DK','FI','PL','CZ',
-                'HU','RO','BG','HR','SI','SK','LT','LV','EE','MT','CY','LU','IE',
-                'GR','TR','IL','EG','ZA','NG','KE','GH','TZ','UG','RW','ET','SN',
-                'CI','CM','MG','MZ','AO','ZM','ZW','MU','SC','MV','LK','BD','PK',
-                'NP','AF','MM','TH','VN','PH','ID','MY','SG','HK','TW','KR','JP',
-                'CN','MN','KZ','UZ','TM','AZ','GE','AM','MD','UA','BY','RS','BA',
-                'MK','AL','ME','XK','IS','LI','MC','SM','VA','AD','GL','FO',
-            }
-            if country in valid_countries and 15 <= len(candidate) <= 34:
-                result['iban'] = candidate
-
-        # IFSC (India)
-        ifsc_match = re.search(r'\b([A-Z]{4}0[A-Z0-9]{6})\b', text)
-        if ifsc_match:
-            result['ifsc'] = ifsc_match.group(1)
-
-        # Account Number
-        acc_match = re.search(
-            r'(?:Account\s*No\.?|Acc\.?\s*No\.?|A/c\s*No\.?)[:\s]*([\d\-]{9,18})',
-            text, re.IGNORECASE
-        )
-        if acc_match:
-            result['account_number'] = acc_match.group(1).replace('-', '').strip()
+class InvoiceParserAgent:
+    """
+    Enhanced AI extraction logic for real-world invoices.
+    Uses multiple regex patterns and fallback strategies.
+    The field patterns stay separate scans (about twenty per document):
+    merged alternations consume overlapping matches and change results.
+    What is saved is repeat work: the three currency searches share one
+    scan, lower-priority fallback patterns are skipped once a field is
+    settled, and first-match fields stop at their first hit.
+    backend/tests/golden holds the original extractor's output to compare against.
+    """
 
-        return result
+    # Fields that must be settled before extract_stream() stops reading pages
+    EARLY_EXIT_FIELDS = ("vendor_name", "invoice_number", "amount", "date")
+
+    def extract(self, text: str) -> Dict[str, Any]:
+        """
+        Extract invoice data with robust pattern matching.
+        """
+        acc = _FieldAccumulator()
+        acc.feed(text, final=True)
+        return acc.result()
+
+    def extract_stream(
+        self,
+        chunks: Iterable[str],
+        early_exit: bool = True,
+        required: Sequence[str] = EARLY_EXIT_FIELDS,
+    ) -> Tuple[Dict[str, Any], int, bool]:
+        """
+        Incremental extraction over a page/sheet stream.
+        Reads chunks until the stream ends or, with early_exit, until every
+        `required` field is settled; remaining pages are never decoded.
+        Returns (extracted_data, chunks_read, stopped_early).
+        """
+        acc = _FieldAccumulator()
+        chunks_read = 0
+        stopped_early = False
+        iterator = iter(chunks)
+        try:
+            for chunk in iterator:
+                acc.feed(chunk)
+                chunks_read += 1
+                if early_exit and all(acc.is_settled(f) for f in required):
+                    stopped_early = True
+                    break
+            else:
+                # Natural end of document: resolve matches held back in the overlap
+                acc.feed("", final=True)
+        finally:
+            # Stop the producer (e.g. a PDF page generator) right away
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+        return acc.result(), chunks_read, stopped_early
@@ -1,4 +1,4 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from backend.app.schemas.ai import FraudFlag
 
 class SecurityAgent:
@@ -20,22 +20,33 @@ class SecurityAgent:
         raw = f"{vendor.lower().strip()}-{inv_id.strip()}-{amount}"
         return hashlib.sha256(raw.encode()).hexdigest()
 
-    def check_duplicate(self, fingerprint: str) -> bool:
-        # Mock DB Lookup: In real app, query `invoices` table
-        # SELECT EXISTS(SELECT 1 FROM invoices WHERE invoice_hash = :fingerprint)
-        
-        # Simulating that "INV-8842" (from dashboard) is a duplicate
-        if "8842" in fingerprint: 
+    def check_duplicate(self, fingerprint: str, invoice_id: Optional[str] = None) -> bool:
+        """
+        Records the fingerprint in the persistent duplicate index.
+        True if it was already on file. Atomic: of two concurrent uploads of
+        the same invoice, only the first comes back False. A new invoice
+        misses the Bloom filter and costs one insert; a re-upload is
+        answered by the read-only lookup (filter, then SQLite) and never
+        reaches the insert.
+        """
+        from backend.app.services.duplicate_index import duplicate_index
+        if duplicate_index.seen(fingerprint):
             return True
-        return False
+        return not duplicate_index.claim(fingerprint, invoice_id)
+
+    def release_duplicate(self, fingerprint: str):
+        """Undo check_duplicate()'s claim for a request that failed before its decision was saved."""
+        from backend.app.services.duplicate_index import duplicate_index
+        duplicate_index.release(fingerprint)
 
     def verify_vendor(self, vendor_name: str) -> Dict[str, Any]:
         """
-        Check if vendor is Trusted, New, or Flagged.
-        Result: { status: 'TRUSTED' | 'NEW' | 'FLAGGED', score: 0-100, data: {...} }
+        Check if vendor is Trusted, New, or Flagged (UNVERIFIED if the ERP
+        could not be reached, so nothing is known either way).
+        Result: { status: 'TRUSTED' | 'NEW' | 'FLAGGED' | 'UNVERIFIED', score: 0-100, data: {...} }
         """
-        from backend.app.services.erp_mock import erp_system
-        erp_result = erp_system.validate_vendor(vendor_name)
+        from backend.app.services.erp_client import erp_gateway
+        erp_result = erp_gateway.validate_vendor(vendor_name)
         
         if erp_result.get('exists'):
             v_data = erp_result.get('data', {})
@@ -44,6 +55,8 @@ class SecurityAgent:
                 return {"status": "FLAGGED", "score": 100 - risk, "data": v_data}
             return {"status": "TRUSTED", "score": 100 - risk, "data": v_data}
         
+        if erp_result.get('erp_unavailable'):
+            return {"status": "UNVERIFIED", "score": 0, "data": None}
         return {"status": "NEW", "score": 40, "data": None}
 
     def verify_gstin(self, gstin: str) -> Dict[str, Any]:
@@ -121,11 +134,17 @@ class SecurityAgent:
         
         return True # Default to True if we don't know the vendor domain
 
-    def verify_bank_details(self, vendor_data: Dict, extracted_data: Dict) -> Dict[str, Any]:
+    def verify_bank_details(self, vendor_data: Dict, extracted_data: Dict,
+                            master_unavailable: bool = False) -> Dict[str, Any]:
         """
         Critical 3-Way Match Step:
         Compares extracted Bank Account/IFSC/IBAN against Vendor Master Data.
+        With `master_unavailable` (ERP outage) there is nothing to compare
+        against; the unverified vendor already keeps the invoice in review.
         """
+        if master_unavailable:
+             return {"match": True, "reason": "Vendor Master Data unavailable"}
+
         # If we don't know the vendor, we can't verify their bank (High Risk for New Vendor)
         if not vendor_data:
              return {"match": False, "reason": "Vendor not found in Master Data"}
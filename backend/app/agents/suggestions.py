@@ -0,0 +1,120 @@
+from typing import Any, Dict, Iterable, List, Tuple
+
+# code -> (icon, title, detail template, priority). DecisionAgent records
+# (code, params) pairs; the prose is only formatted for clients that read it.
+SUGGESTIONS: Dict[str, Tuple[str, str, str, str]] = {
+    "BLOCK_VENDOR_PAYMENT": (
+        "🚫", "Block Vendor Payment",
+        "'{vendor}' is on the high-risk vendor list. Freeze all payments immediately and escalate to the Compliance team for investigation. Do not contact the vendor until cleared.",
+        "URGENT"),
+    "COMPLETE_VENDOR_ONBOARDING": (
+        "📋", "Complete Vendor Onboarding",
+        "'{vendor}' is not in your Vendor Master Data. Initiate the vendor onboarding process: collect GST certificate, bank verification letter, and PAN card. Add to ERP before processing payment.",
+        "HIGH"),
+    "VENDOR_VERIFIED": (
+        "✅", "Vendor Verified in Master Data",
+        "'{vendor}' is a trusted vendor with a risk score of {vendor_score}. No additional vendor verification needed.",
+        "INFO"),
+    "DUPLICATE_DO_NOT_PAY": (
+        "⛔", "Duplicate Invoice — Do Not Pay",
+        "Invoice #{invoice_number} from '{vendor}' is an exact duplicate of a previously processed invoice. Archive this record, notify the vendor, and investigate whether this is a billing error or attempted double-billing fraud.",
+        "URGENT"),
+    "POSSIBLE_RESUBMISSION": (
+        "👯", "Possible Re-submitted Invoice",
+        "This document closely matches invoice #{match_invoice_id} from '{match_vendor}' ({similarity:.0%} similar) but is not an exact copy. Re-scans, edited invoice numbers and re-rounded amounts are common double-billing patterns; compare both documents before paying.",
+        "HIGH"),
+    "AMOUNT_NOT_EXTRACTED": (
+        "⚠️", "Amount Could Not Be Extracted",
+        "The AI could not detect a clear invoice amount. This may be a scanned/image PDF or an unusual format. Use the 'Paste Text' tab and manually enter the invoice text, or check if the PDF is text-based.",
+        "HIGH"),
+    "SENIOR_APPROVAL_REQUIRED": (
+        "💰", "High-Value Invoice — Senior Approval Required",
+        "This invoice is for {currency} {amount:,.2f}, which exceeds the standard auto-approval limit. Route to Finance Manager or CFO for sign-off before releasing payment.",
+        "HIGH"),
+    "VERIFY_AMOUNT_AGAINST_PO": (
+        "🔍", "Verify Amount Against Purchase Order",
+        "The invoice amount of {currency} {amount:,.2f} exceeds the automated approval threshold for a new/unverified vendor. Cross-check this amount against the original purchase order and goods receipt note (GRN) before approving.",
+        "HIGH"),
+    "AMOUNT_NORMAL": (
+        "💵", "Amount Within Normal Range",
+        "Invoice amount of {currency} {amount:,.2f} is within the standard processing threshold.",
+        "INFO"),
+    "PO_MISMATCH": (
+        "📦", "PO Mismatch — Verify with Procurement",
+        "PO number '{po_number}' on this invoice does not match any open purchase order in the ERP system. Contact the Procurement team to verify if this PO exists. If not, reject the invoice and ask the vendor to resubmit with a valid PO.",
+        "URGENT"),
+    "PO_BUDGET_EXCEEDED": (
+        "📊", "Invoice Exceeds PO Budget",
+        "PO '{po_number}' has a budget of {currency} {budget:,.2f} but this invoice is for {currency} {amount:,.2f}. The overage of {currency} {overage:,.2f} needs a budget amendment before payment.",
+        "HIGH"),
+    "PO_CHECK_PENDING": (
+        "⏳", "PO Not Verified — ERP Unavailable",
+        "The ERP could not be reached to check PO '{po_number}', so this invoice was not auto-approved. Re-submit it once the ERP is back, or verify the PO with Procurement before approving.",
+        "HIGH"),
+    "VENDOR_CHECK_PENDING": (
+        "⏳", "Vendor Not Verified — ERP Unavailable",
+        "The ERP could not be reached to look up '{vendor}' or its bank details, so this invoice was not auto-approved. Re-submit it once the ERP is back, or confirm the vendor and bank account with Procurement before approving.",
+        "HIGH"),
+    "PO_MATCHED": (
+        "✅", "PO Matched Successfully",
+        "Purchase Order '{po_number}' is open and valid in ERP. Invoice amount is within the approved budget.",
+        "INFO"),
+    "REQUEST_PO": (
+        "📝", "Request PO or Non-PO Approval",
+        "This invoice for {currency} {amount:,.2f} has no Purchase Order number. Either locate the original PO and ask the vendor to resubmit, or initiate a Non-PO Invoice approval workflow with your Finance Manager.",
+        "HIGH"),
+    "NO_PO_LOW_VALUE": (
+        "📝", "No PO — Low Value Invoice",
+        "No PO number found, but the invoice amount is below the threshold. You may process this as a petty cash or direct expense invoice.",
+        "MEDIUM"),
+    "INVALID_GSTIN": (
+        "🏛️", "Invalid GSTIN — Tax Compliance Risk",
+        "The GSTIN '{gstin}' on this invoice failed format/checksum validation. You cannot claim GST Input Tax Credit (ITC) on this invoice. Ask the vendor to correct their GSTIN and reissue the invoice before payment.",
+        "URGENT"),
+    "GSTIN_VALID": (
+        "🏛️", "GSTIN Valid — ITC Claimable",
+        "GSTIN '{gstin}' passed validation. You are eligible to claim GST Input Tax Credit on this invoice. Ensure it is filed in GSTR-2B.",
+        "INFO"),
+    "NO_GSTIN": (
+        "🏛️", "No GSTIN Found",
+        "No GSTIN was detected on this invoice. If this is a B2B transaction above ₹20,000, a GSTIN is mandatory. Request a revised invoice with the vendor's GSTIN.",
+        "MEDIUM"),
+    "FORGERY_SUSPECTED": (
+        "🔬", "PDF Forgery Suspected — Forensic Review",
+        "Digital forensics detected suspicious metadata: {findings}. This PDF may have been created or altered using image editing software. Do not pay. Request the original invoice directly from the vendor via a verified communication channel.",
+        "URGENT"),
+    "FORENSICS_AUTHENTIC": (
+        "🔬", "PDF Forensics: Authentic",
+        "No signs of digital tampering detected in the PDF metadata. The document appears to have been generated by standard accounting software.",
+        "INFO"),
+    "BANK_ACCOUNT_CHANGED": (
+        "🏦", "CRITICAL: Bank Account Changed — Potential Fraud",
+        "The bank account on this invoice differs from the verified account in your ERP. This is the #1 sign of Business Email Compromise (BEC) fraud. DO NOT transfer funds. Call the vendor's finance team on a phone number from your records (not from this invoice) to verify the change.",
+        "URGENT"),
+    "BANK_ACCOUNT_VERIFIED": (
+        "🏦", "Bank Account Verified",
+        "The bank account on this invoice matches the verified account in your ERP Vendor Master Data. Safe to proceed with payment to this account.",
+        "INFO"),
+    "INVOICE_DATE_MISSING": (
+        "📅", "Invoice Date Missing",
+        "No invoice date was detected. An invoice date is required for accounting entries and GST filing. Request a revised invoice with the correct date.",
+        "MEDIUM"),
+    "READY_FOR_PAYMENT": (
+        "🚀", "Ready for Payment Processing",
+        "This invoice from '{vendor}' for {currency} {amount:,.2f} has passed all automated checks. Queue for payment as per agreed payment terms.",
+        "INFO"),
+}
+
+def priority(code: str) -> str:
+    return SUGGESTIONS[code][3]
+
+def render_detail(code: str, params: Dict[str, Any]) -> str:
+    return SUGGESTIONS[code][2].format(**params)
+
+def render_suggestion(code: str, params: Dict[str, Any]) -> Dict[str, str]:
+    """Suggestion fields (icon, title, detail, priority) for one (code, params) pair."""
+    icon, title, detail, level = SUGGESTIONS[code]
+    return {"icon": icon, "title": title, "detail": detail.format(**params), "priority": level}
+
+def render_suggestions(codes: Iterable[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, str]]:
+    return [render_suggestion(code, params) for code, params in codes]
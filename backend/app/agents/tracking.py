@@ -0,0 +1,104 @@
+from typing import Any, Dict, List, Optional
+import numpy as np
+import itertools
+
+_MATCH_IOU = 0.3  # Detections this close to a track's predicted box (same label) continue it
+
+class Track:
+    def __init__(self, track_id: int, label: str, box: np.ndarray, confidence: float, frame: int, now: float):
+        self.track_id = track_id
+        self.label = label
+        self.box = box
+        self.velocity = np.zeros(4)  # per frame, for all four coordinates
+        self.confidence = confidence
+        self.anchor = box            # box at the last matched detection
+        self.anchor_frame = frame
+        self.first_seen = now
+        self.hits = 1
+        self.misses = 0
+
+    def as_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "track_id": self.track_id,
+            "label": self.label,
+            "confidence": self.confidence,
+            "box": [round(float(v), 1) for v in self.box],
+            "dwell_seconds": round(now - self.first_seen, 1),
+        }
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU of every box in a (n x 4, xyxy) with every box in b (m x 4)."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.where(union > 0, union, 1), 0.0)
+
+class IoUTracker:
+    """
+    Lightweight multi-object tracker for one camera stream.
+    step() is called once per frame: every track moves by its constant
+    velocity, and on frames that ran detection the detections are matched
+    to the predicted boxes greedily by IoU (same label only). A match keeps
+    the track's id and first-seen time; unmatched detections start new
+    tracks; a track no detection matches for more than `max_misses`
+    detection rounds is dropped. Tracks coast through those misses, so a
+    person the model loses for a frame or two doesn't make alerts flicker.
+    """
+
+    def __init__(self, max_misses: int):
+        self.max_misses = max(0, max_misses)
+        self.tracks: List[Track] = []
+        self.frame = 0
+        self._ids = itertools.count(1)
+
+    def step(self, now: float, boxes: Optional[List[List[float]]] = None,
+             confidences: Optional[List[float]] = None, labels: Optional[List[str]] = None) -> List[Track]:
+        """Advance one frame; pass the frame's detections when it ran the model. Returns the live tracks."""
+        self.frame += 1
+        for track in self.tracks:
+            track.box = track.box + track.velocity
+        if boxes is None:
+            return self.tracks
+
+        detected = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        matched_tracks, matched_detections = set(), set()
+        if self.tracks and len(detected):
+            same_label = np.array([t.label for t in self.tracks])[:, None] == np.array(labels)[None, :]
+            scores = np.where(same_label, iou_matrix(np.stack([t.box for t in self.tracks]), detected), 0.0)
+            for flat in np.argsort(scores, axis=None)[::-1]:
+                i, j = divmod(int(flat), len(detected))
+                if scores[i, j] < _MATCH_IOU:
+                    break
+                if i in matched_tracks or j in matched_detections:
+                    continue
+                matched_tracks.add(i)
+                matched_detections.add(j)
+                self._update(self.tracks[i], detected[j], confidences[j])
+
+        survivors = []
+        for i, track in enumerate(self.tracks):
+            if i not in matched_tracks:
+                track.misses += 1
+                if track.misses > self.max_misses:
+                    continue
+            survivors.append(track)
+        for j in range(len(detected)):
+            if j not in matched_detections:
+                survivors.append(Track(next(self._ids), labels[j], detected[j], confidences[j], self.frame, now))
+        self.tracks = survivors
+        return self.tracks
+
+    def _update(self, track: Track, box: np.ndarray, confidence: float):
+        velocity = (box - track.anchor) / max(1, self.frame - track.anchor_frame)
+        track.velocity = velocity if track.hits == 1 else 0.5 * track.velocity + 0.5 * velocity
+        track.box = box
+        track.anchor = box
+        track.anchor_frame = self.frame
+        track.confidence = confidence
+        track.hits += 1
+        track.misses = 0
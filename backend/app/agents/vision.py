@@ -1,94 +1,281 @@
-from ultralytics import YOLO
+from backend.app.core.config import settings
+from backend.app.agents.vision_backends import backend_label, load_model
+from backend.app.agents.tracking import IoUTracker, Track
+from backend.app.services.micro_batch import MicroBatcher
 import cv2
 import numpy as np
 import base64
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
+import threading
 import logging
+import time
+import os
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_MOTION_PIXEL_DELTA = 25       # Grey levels a thumbnail pixel must change by to count as motion
+_SESSION_IDLE_SECONDS = 300.0  # Sessions of streams that vanished without closing are dropped
+
+class StreamSession:
+    """Per-camera state: tracker, motion reference and frames since the last detection."""
+
+    def __init__(self):
+        self.tracker = IoUTracker(max_misses=settings.VISION_TRACK_MAX_MISSES)
+        self.reference: Optional[np.ndarray] = None  # 1/8-scale grey frame at the last detection
+        self.size: Tuple[int, int] = (0, 0)          # frame width, height
+        self.since_detection = 0
+        self.frames = 0
+        self.detections = 0
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    def motion(self, thumbnail: np.ndarray) -> float:
+        """Share of thumbnail pixels that changed since the last detection (1.0 when there is none)."""
+        if self.reference is None or self.reference.shape != thumbnail.shape:
+            return 1.0
+        return float(np.count_nonzero(cv2.absdiff(thumbnail, self.reference) > _MOTION_PIXEL_DELTA)) / thumbnail.size
+
 class VisionAgent:
     """
     Advanced Computer Vision Agent powered by YOLOv8.
     Handles real-time object detection, safety monitoring, and visual analytics.
+    Frames from concurrent requests share model calls: `scheduler` groups
+    them into micro-batches (VISION_BATCH_SIZE frames or VISION_BATCH_WAIT_MS,
+    whichever comes first) and runs one batched inference per group.
+    The runtime (PyTorch, ONNX Runtime, OpenVINO), input size and INT8
+    variant come from settings; detections keep the same schema on all.
+    Frames that name a session (one per camera stream) only run the model
+    every VISION_DETECT_EVERY frames or when the scene moved; in between,
+    the session's tracker carries the boxes forward with stable track ids.
     """
     
-    def __init__(self, model_name: str = "yolov8n.pt"):
+    def __init__(self, model_name: Optional[str] = None, backend: Optional[str] = None,
+                 imgsz: Optional[int] = None, int8: Optional[bool] = None):
         """
         Initialize YOLO model. Uses Nano (n) model for CPU speed, 
         or move to Large (l/x) for GPU accuracy if available.
         """
+        self.model_name = model_name or settings.VISION_MODEL
+        self.backend = backend or settings.VISION_BACKEND
+        self.imgsz = imgsz or settings.VISION_IMGSZ
+        self.int8 = settings.VISION_INT8 if int8 is None else int8
+        self.backend_label = backend_label(self.backend, self.int8)
+        self.model_label = os.path.splitext(os.path.basename(self.model_name))[0].replace("yolo", "YOLO")
         try:
-            logger.info(f"👁️ Loading Vision Model: {model_name}...")
-            self.model = YOLO(model_name)  # Auto-downloads weights on first run
+            logger.info(f"👁️ Loading Vision Model: {self.model_name} ({self.backend_label}, {self.imgsz}px)...")
+            self.model = load_model(self.model_name, self.backend, self.imgsz, self.int8,
+                                    settings.VISION_EXPORT_DIR, settings.VISION_INT8_CALIBRATION)
             logger.info("✅ Vision Model Loaded Successfully")
         except Exception as e:
             logger.error(f"❌ Failed to load Vision Model: {e}")
             self.model = None
+        self.scheduler = MicroBatcher(self._infer_batch, settings.VISION_BATCH_SIZE,
+                                      settings.VISION_BATCH_WAIT_MS, name="vision")
+        self.sessions: Dict[str, StreamSession] = {}
+        self._sessions_lock = threading.Lock()
+
+    def _infer_batch(self, frames: List[np.ndarray]) -> List[Any]:
+        """One model call for the whole batch; a Results object per frame, in order."""
+        return list(self.model(frames, imgsz=self.imgsz, verbose=False))
+
+    def _detections(self, results) -> Tuple[List[List[float]], List[float], List[str]]:
+        """Boxes, confidences and labels (one tensor -> list conversion per field, not per box)."""
+        boxes = results.boxes
+        labels = [self.model.names[int(cls_id)] for cls_id in boxes.cls.tolist()]
+        confidences = [round(conf, 2) for conf in boxes.conf.tolist()]
+        return boxes.xyxy.tolist(), confidences, labels  # [x1, y1, x2, y2] per box
+
+    def _encode(self, annotated_frame: np.ndarray, scale: float, quality: Optional[int]) -> bytes:
+        if scale < 1.0:
+            annotated_frame = cv2.resize(annotated_frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        
+        # Add timestamp & system status overlay
+        cv2.putText(annotated_frame, "VISION CONTROL ACTIVE", (20, 40), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        
+        # Encode back to JPEG
+        _, buffer = cv2.imencode('.jpg', annotated_frame,
+                                 [cv2.IMWRITE_JPEG_QUALITY, quality or settings.VISION_JPEG_QUALITY])
+        return buffer.tobytes()
 
-    def detect_objects(self, image_bytes: bytes) -> Tuple[Dict[str, Any], bytes]:
+    def detect_objects(self, image_bytes: bytes, output: str = "annotated", scale: float = 1.0,
+                       quality: Optional[int] = None, session: Optional[str] = None,
+                       detect_every: Optional[int] = None) -> Tuple[Dict[str, Any], Optional[bytes]]:
         """
         Perform inference on a single image frame.
         Returns:
             - Analysis Dict: Counts, detected classes, confidence scores.
             - Processed Image: Frame with bounding boxes drawn (JPEG bytes).
+        output:
+            - "annotated": analysis + annotated JPEG, resized by `scale` and
+              encoded at `quality` (default VISION_JPEG_QUALITY).
+            - "detections": analysis only; no plotting or JPEG encoding.
+            - "boxes": frame size and [x1, y1, x2, y2, confidence, label]
+              rows only, for clients that draw their own overlay.
+        Only "annotated" returns an image; the others return None.
+        With a `session`, the frame goes through that stream's tracker (see track_frame).
         """
+        original = image_bytes if output == "annotated" else None
         if not self.model:
-            return {"error": "Model not loaded"}, image_bytes
+            return {"error": "Model not loaded"}, original
+        if session is not None:
+            return self.track_frame(image_bytes, session, output, scale, quality, detect_every)
 
         # Convert bytes to OpenCV Image
         nparr = np.frombuffer(image_bytes, np.uint8)
         frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 
         if frame is None:
-            return {"error": "Invalid image data"}, image_bytes
+            return {"error": "Invalid image data"}, original
 
-        # Run Inference
-        results = self.model(frame, verbose=False)[0]
+        # Run Inference (batched with concurrent callers' frames)
+        results = self.scheduler.submit(frame).result()
 
         # Extract Analytics
-        detections = []
+        coords, confidences, labels = self._detections(results)
         counts = {}
-        
-        for box in results.boxes:
-            cls_id = int(box.cls[0])
-            label = self.model.names[cls_id]
-            conf = float(box.conf[0])
-            
-            # Count objects
+        for label in labels:
             counts[label] = counts.get(label, 0) + 1
-            
-            # Store details
-            detections.append({
-                "label": label,
-                "confidence": round(conf, 2),
-                "box": box.xyxy[0].tolist()  # [x1, y1, x2, y2]
-            })
+        safety_alert = "person" in counts  # Example rule: alert if person seen
+
+        if output == "boxes":
+            h, w = frame.shape[:2]
+            return {
+                "status": "active",
+                "width": w,
+                "height": h,
+                "boxes": [[*(round(v, 1) for v in box), conf, label]
+                          for box, conf, label in zip(coords, confidences, labels)],
+                "total_detections": len(labels),
+                "safety_alert": safety_alert,
+            }, None
+
+        analysis_result = {
+            "status": "active",
+            "model": self.model_label,
+            "backend": self.backend_label,
+            "object_counts": counts,
+            "total_detections": len(labels),
+            "detections": [  # Detailed list for frontend
+                {"label": label, "confidence": conf, "box": box}
+                for label, conf, box in zip(labels, confidences, coords)
+            ],
+            "safety_alert": safety_alert
+        }
+        if output == "detections":
+            return analysis_result, None
 
         # Draw Advanced HUD (Heads-Up Display)
         annotated_frame = results.plot()  # Ultralytics built-in plotter is fast & clean
-        
-        # Add timestamp & system status overlay
-        h, w = annotated_frame.shape[:2]
-        cv2.putText(annotated_frame, "VISION CONTROL ACTIVE", (20, 40), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-        
-        # Encode back to JPEG
-        _, buffer = cv2.imencode('.jpg', annotated_frame)
-        processed_bytes = buffer.tobytes()
+        return analysis_result, self._encode(annotated_frame, scale, quality)
+
+    def session(self, key: str) -> StreamSession:
+        now = time.monotonic()
+        with self._sessions_lock:
+            for stale in [k for k, s in self.sessions.items() if now - s.last_used > _SESSION_IDLE_SECONDS]:
+                del self.sessions[stale]
+            session = self.sessions.get(key)
+            if session is None:
+                session = self.sessions[key] = StreamSession()
+            session.last_used = now
+            return session
+
+    def end_session(self, key: str):
+        with self._sessions_lock:
+            self.sessions.pop(key, None)
+
+    def track_frame(self, image_bytes: bytes, key: str, output: str = "annotated", scale: float = 1.0,
+                    quality: Optional[int] = None,
+                    detect_every: Optional[int] = None) -> Tuple[Dict[str, Any], Optional[bytes]]:
+        """
+        One frame of a camera stream. A 1/8-scale greyscale decode (a few
+        percent of a full one) is compared with the frame of the last
+        detection; the model only runs when more than VISION_MOTION_THRESHOLD
+        of it changed or `detect_every` (VISION_DETECT_EVERY) frames have
+        passed. Other frames are answered from the tracker's predicted boxes,
+        and full decoding is skipped unless an annotated frame is wanted.
+        Detections carry track_id and dwell_seconds; the safety alert
+        follows the tracks, so it holds while a person is briefly missed.
+        """
+        original = image_bytes if output == "annotated" else None
+        session = self.session(key)
+        nparr = np.frombuffer(image_bytes, np.uint8)
+        with session.lock:
+            thumbnail = cv2.imdecode(nparr, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+            if thumbnail is None:
+                return {"error": "Invalid image data"}, original
+            motion = session.motion(thumbnail)
+            every = detect_every or settings.VISION_DETECT_EVERY
+            detect = session.since_detection + 1 >= every or motion > settings.VISION_MOTION_THRESHOLD
+            frame = None
+            if detect or output == "annotated":
+                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                if frame is None:
+                    return {"error": "Invalid image data"}, original
+            now = time.monotonic()
+            session.frames += 1
+            if detect:
+                # Batched with concurrent callers' frames, like untracked ones
+                coords, confidences, labels = self._detections(self.scheduler.submit(frame).result())
+                tracks = session.tracker.step(now, coords, confidences, labels)
+                session.reference = thumbnail
+                session.size = (frame.shape[1], frame.shape[0])
+                session.since_detection = 0
+                session.detections += 1
+            else:
+                tracks = session.tracker.step(now)
+                session.since_detection += 1
+            tracking = {
+                "detected": detect,
+                "motion": round(motion, 4),
+                "frames_since_detection": session.since_detection,
+                "detect_every": every,
+                "active_tracks": len(tracks),
+                "inference_ratio": round(session.detections / session.frames, 3),
+            }
+
+        counts = {}
+        for track in tracks:
+            counts[track.label] = counts.get(track.label, 0) + 1
+        safety_alert = "person" in counts  # Example rule: alert while a person is tracked
+
+        if output == "boxes":
+            w, h = session.size
+            return {
+                "status": "active",
+                "width": w,
+                "height": h,
+                "boxes": [[*t["box"], t["confidence"], t["label"], t["track_id"], t["dwell_seconds"]]
+                          for t in (track.as_dict(now) for track in tracks)],
+                "total_detections": len(tracks),
+                "safety_alert": safety_alert,
+                "tracking": tracking,
+            }, None
 
         analysis_result = {
             "status": "active",
-            "model": "YOLOv8n",
+            "model": self.model_label,
+            "backend": self.backend_label,
             "object_counts": counts,
-            "total_detections": len(detections),
-            "detections": detections,  # Detailed list for frontend
-            "safety_alert": "person" in counts  # Example rule: alert if person seen
+            "total_detections": len(tracks),
+            "detections": [track.as_dict(now) for track in tracks],
+            "safety_alert": safety_alert,
+            "tracking": tracking,
         }
+        if output == "detections":
+            return analysis_result, None
+        return analysis_result, self._encode(self._draw_tracks(frame, tracks, now), scale, quality)
+
+    def _draw_tracks(self, frame: np.ndarray, tracks: List[Track], now: float) -> np.ndarray:
+        from ultralytics.utils.plotting import Annotator, colors
 
-        return analysis_result, processed_bytes
+        annotator = Annotator(frame)
+        for track in tracks:
+            label = f"{track.label} #{track.track_id} {now - track.first_seen:.0f}s"
+            annotator.box_label(track.box.tolist(), label, color=colors(track.track_id, True))
+        return annotator.result()
 
 # Singleton instance
 vision_engine = VisionAgent()
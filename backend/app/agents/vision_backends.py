@@ -0,0 +1,127 @@
+from ultralytics import YOLO
+from typing import Iterator, List, Optional
+import numpy as np
+import logging
+import shutil
+import glob
+import os
+
+logger = logging.getLogger(__name__)
+
+# torch: the .pt weights through PyTorch. onnx / openvino: the same weights
+# exported once (cached in the export dir) and run by ONNX Runtime or OpenVINO
+# on CPU. ultralytics drives all three, so results keep one schema.
+VISION_BACKENDS = ("torch", "onnx", "openvino")
+
+def backend_label(backend: str, int8: bool) -> str:
+    return f"{backend}-int8" if int8 and backend != "torch" else backend
+
+def exported_path(weights: str, backend: str, imgsz: int, int8: bool, export_dir: str) -> str:
+    name = f"{os.path.splitext(os.path.basename(weights))[0]}_{imgsz}{'_int8' if int8 else ''}"
+    if backend == "onnx":
+        return os.path.join(export_dir, f"{name}.onnx")
+    return os.path.join(export_dir, f"{name}_openvino_model")
+
+def _calibration_images(data: str) -> List[str]:
+    from ultralytics.data.utils import check_det_dataset
+    dataset = check_det_dataset(data)  # downloads small datasets such as coco8 on first use
+    roots = dataset["val"] if isinstance(dataset["val"], list) else [dataset["val"]]
+    images = []
+    for root in roots:
+        for ext in ("jpg", "jpeg", "png", "bmp"):
+            images.extend(glob.glob(os.path.join(root, "**", f"*.{ext}"), recursive=True))
+    if not images:
+        raise ValueError(f"No calibration images found for {data!r}")
+    return sorted(images)
+
+class _CalibrationReader:
+    """onnxruntime CalibrationDataReader: letterboxed images, preprocessed exactly as ultralytics feeds the model."""
+
+    def __init__(self, input_name: str, images: List[str], imgsz: int):
+        self.input_name = input_name
+        self.images = images
+        self.imgsz = imgsz
+        self._iter: Optional[Iterator[str]] = None
+
+    def get_next(self):
+        import cv2
+        from ultralytics.data.augment import LetterBox
+
+        if self._iter is None:
+            self._iter = iter(self.images)
+        path = next(self._iter, None)
+        if path is None:
+            return None
+        image = LetterBox((self.imgsz, self.imgsz), auto=False)(image=cv2.imread(path))
+        tensor = np.ascontiguousarray(image[..., ::-1].transpose(2, 0, 1))[None].astype(np.float32) / 255
+        return {self.input_name: tensor}
+
+    def rewind(self):
+        self._iter = None
+
+def _quantize_onnx(source: str, target: str, head: str, imgsz: int, calibration_data: str):
+    """
+    Static INT8 (QDQ, per-channel) quantisation of an exported ONNX model.
+    The detection head (`head` node prefix) stays float: quantising the
+    box decoding wrecks coordinates for little speed.
+    """
+    import onnx
+    import onnxruntime
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    model = onnx.load(source)
+    input_name = onnxruntime.InferenceSession(source, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    excluded = [node.name for node in model.graph.node if node.name.startswith(head)]
+    quantize_static(
+        source,
+        target,
+        _CalibrationReader(input_name, _calibration_images(calibration_data), imgsz),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        op_types_to_quantize=["Conv", "MatMul"],
+        nodes_to_exclude=excluded,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+    # ultralytics reads class names, stride and imgsz from the model metadata
+    quantised = onnx.load(target)
+    del quantised.metadata_props[:]
+    quantised.metadata_props.extend(model.metadata_props)
+    onnx.save(quantised, target)
+
+def export_model(weights: str, backend: str, imgsz: int, int8: bool, export_dir: str,
+                 calibration_data: str) -> str:
+    """Path of the exported model for this configuration, exporting (and quantising) it on first use."""
+    target = exported_path(weights, backend, imgsz, int8, export_dir)
+    if os.path.exists(target):
+        return target
+    os.makedirs(export_dir, exist_ok=True)
+    logger.info(f"📦 Exporting {weights} for {backend_label(backend, int8)} at {imgsz}px (one-off)")
+    model = YOLO(weights)
+    # Dynamic batch axis so micro-batches run as one call
+    if backend == "onnx":
+        produced = model.export(format="onnx", imgsz=imgsz, dynamic=True, simplify=True)
+        if int8:
+            head = f"/model.{len(model.model.model) - 1}/"
+            _quantize_onnx(produced, target, head, imgsz, calibration_data)
+            os.remove(produced)
+        else:
+            shutil.move(produced, target)
+    elif backend == "openvino":
+        produced = model.export(format="openvino", imgsz=imgsz, dynamic=True, int8=int8, data=calibration_data)
+        shutil.move(produced, target)
+    else:
+        raise ValueError(f"Unknown vision backend {backend!r} (expected one of {VISION_BACKENDS})")
+    logger.info(f"✅ Exported {target}")
+    return target
+
+def load_model(weights: str, backend: str, imgsz: int, int8: bool, export_dir: str,
+               calibration_data: str) -> YOLO:
+    if backend not in VISION_BACKENDS:
+        raise ValueError(f"Unknown vision backend {backend!r} (expected one of {VISION_BACKENDS})")
+    if backend == "torch":
+        if int8:
+            logger.warning("⚠️ VISION_INT8 only applies to the onnx and openvino backends; using float weights")
+        return YOLO(weights)
+    return YOLO(export_model(weights, backend, imgsz, int8, export_dir, calibration_data), task="detect")
@@ -1,27 +1,40 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from backend.app.schemas.ai import InvoiceAnalysisRequest, AIAnalysisResult, db
-from backend.app.agents.extractor import InvoiceParserAgent
-from backend.app.agents.security import SecurityAgent
-from backend.app.agents.decision import DecisionAgent
-from backend.app.agents.vision import vision_engine
-from typing import List, Dict, Any
-import PyPDF2
-import io
+from backend.app.services.invoice_pipeline import (
+    analyze_text,
+    analyze_file,
+    decision_record,
+    init_batch_worker,
+    process_batch_item,
+    release_duplicate_claim,
+)
+from backend.app.api.responses import compact_view, decision_response, dumps, full_view, wants_compact
+from backend.app.services.document import DocumentContext, OCR_AVAILABLE, pytesseract
+from backend.app.services.text_cache import text_cache
+from backend.app.services.admission import admission
+from backend.app.services.metrics import metrics
+from backend.app.services.duplicate_index import duplicate_index
+from backend.app.services.erp_mock import erp_system
+from backend.app.services.erp_client import erp_gateway
+from backend.app.services.master_data import MasterDataError
+from backend.app.services.decision_replay import replay_decisions
+from backend.app.agents.decision import BATCH_COLUMNS, decision_features
+from backend.app.services.vision_worker import vision_workers
+from backend.app.core.config import settings
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import deque
+from typing import Callable, List, Dict, Any, Literal, Optional
+from datetime import datetime
+import multiprocessing
+import itertools
+import asyncio
 import logging
 import base64
-import csv
-
-# --- File Handling Imports ---
-try:
-    from PIL import Image
-    import pytesseract
-    from pdf2image import convert_from_bytes
-    import openpyxl
-    from docx import Document
-    OCR_AVAILABLE = True
-except ImportError:
-    OCR_AVAILABLE = False
-    pytesseract = None
+import hmac
+import time
+import os
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -29,214 +42,293 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/v1", tags=["Autonomous Pipeline"])
 
-extractor = InvoiceParserAgent()
-security = SecurityAgent()
-decision_engine = DecisionAgent()
+# --- Batch Process Pool ---
+# Created lazily on the first batch request. Workers are spawned (not forked)
+# so they only import the invoice pipeline, never the vision stack.
+_process_pool: Optional[ProcessPoolExecutor] = None
 
-def extract_text_from_file(file_contents: bytes, filename: str) -> str:
+def _batch_worker_count() -> int:
+    return settings.BATCH_WORKERS or os.cpu_count() or 1
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        workers = _batch_worker_count()
+        logger.info(f"⚙️ Starting batch process pool ({workers} workers)")
+        _process_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_batch_worker,
+        )
+    return _process_pool
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+
+def _discard_process_pool(broken: ProcessPoolExecutor):
+    """Drop a pool whose worker died (BrokenProcessPool); the next batch starts a fresh one."""
+    global _process_pool
+    if _process_pool is broken:
+        logger.error("❌ Batch worker died - restarting the process pool")
+        _process_pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def _release_unsaved(future: asyncio.Future):
     """
-    Universal Text Extractor for PDF, Images, Excel, Word, and Text.
+    Done-callback for a batch item whose outcome will never be saved (the
+    client went away mid-stream): give back the duplicate fingerprint and
+    near-duplicate entry its worker recorded, so a re-upload isn't rejected.
     """
-    ext = filename.lower().split('.')[-1]
-    logger.info(f"📂 Extracting text from .{ext} file")
-    
-    # ── 1. PDF HANDLING ──────────────────────────────────────────────────────
-    if ext == 'pdf':
-        text = ""
-        # Try PyPDF2 first
-        try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_contents))
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        except Exception as e:
-            logger.warning(f"PyPDF2 failed: {e}")
-            
-        # If PyPDF2 failed or returned little text, use OCR
-        if len(text.strip()) < 50 and OCR_AVAILABLE:
-            logger.info("🔍 PDF text scanty - switching to OCR")
-            try:
-                images = convert_from_bytes(file_contents)
-                text = ""
-                for img in images:
-                    text += pytesseract.image_to_string(img) + "\n"
-            except Exception as e:
-                logger.error(f"OCR failed: {e}")
-                
-        return text
-
-    # ── 2. IMAGE HANDLING (JPG, PNG, WEBP) ───────────────────────────────────
-    elif ext in ['jpg', 'jpeg', 'png', 'webp', 'bmp', 'tiff']:
-        if not OCR_AVAILABLE:
-            raise HTTPException(400, "OCR libraries not installed. Cannot process images.")
-        try:
-            image = Image.open(io.BytesIO(file_contents))
-            return pytesseract.image_to_string(image)
-        except Exception as e:
-            raise HTTPException(400, f"Image OCR failed: {str(e)}")
+    if future.cancelled() or future.exception() is not None:
+        return
+    outcome = future.result()
+    context = outcome.get("context")
+    if outcome["status"] == "ok" and context:
+        asyncio.get_running_loop().run_in_executor(
+            None, release_duplicate_claim,
+            outcome["result"]["processed_invoice"], context["fingerprint"], context["is_duplicate"])
 
-    # ── 3. WORD DOCUMENTS (DOCX) ─────────────────────────────────────────────
-    elif ext == 'docx':
-        try:
-            doc = Document(io.BytesIO(file_contents))
-            return "\n".join([p.text for p in doc.paragraphs])
-        except Exception as e:
-            raise HTTPException(400, f"DOCX read failed: {str(e)}")
+def _save_decision(payload: Dict[str, Any], context: Optional[Dict[str, Any]] = None):
+    features = None
+    if context is not None:
+        features = dict(zip(BATCH_COLUMNS, decision_features(payload["processed_invoice"], context)))
+    with metrics.timer("invoice_stage_seconds", stage="db_write"):
+        db.save_decision(
+            invoice_id=payload["processed_invoice"].get('invoice_number', 'UNK'),
+            payload=payload,
+            context=context,
+            features=features,
+        )
 
-    # ── 4. EXCEL SPREADSHEETS (XLSX) ─────────────────────────────────────────
-    elif ext == 'xlsx':
-        try:
-            wb = openpyxl.load_workbook(io.BytesIO(file_contents), data_only=True)
-            text = ""
-            for sheet in wb.sheetnames:
-                ws = wb[sheet]
-                for row in ws.values:
-                    # Convert row cells to string and join
-                    row_text = " ".join([str(cell) for cell in row if cell is not None])
-                    text += row_text + "\n"
-            return text
-        except Exception as e:
-            raise HTTPException(400, f"Excel read failed: {str(e)}")
-
-    # ── 5. PLAIN TEXT / CSV ──────────────────────────────────────────────────
-    elif ext in ['txt', 'csv', 'md', 'log']:
-        try:
-            return file_contents.decode('utf-8', errors='ignore')
-        except Exception as e:
-            raise HTTPException(400, f"Text read failed: {str(e)}")
+def _analyze_and_save(analyze: Callable[..., AIAnalysisResult], *args) -> Dict[str, Any]:
+    """Blocking part of a single-document request; runs on the pipeline pool."""
+    analysis_result = analyze(*args)
+    record = decision_record(analysis_result)
+    _save_decision_or_release(record, analysis_result.security_context)
+    return record
+
+def _save_decision_or_release(payload: Dict[str, Any], context: Dict[str, Any]):
+    """Save the decision; if that fails, free its duplicate fingerprint so a retry isn't rejected."""
+    try:
+        _save_decision(payload, context)
+    except BaseException:
+        release_duplicate_claim(payload["processed_invoice"], context["fingerprint"], context["is_duplicate"])
+        raise
 
-    else:
-        raise HTTPException(400, f"Unsupported file extension: .{ext}")
+def _count_error(endpoint: str, error: Exception):
+    label = f"http_{error.status_code}" if isinstance(error, HTTPException) else type(error).__name__
+    metrics.inc("invoice_errors_total", endpoint=endpoint, error=label)
 
 @router.post("/process-invoice", response_model=AIAnalysisResult)
-async def process_invoice(payload: InvoiceAnalysisRequest):
-    """Core AI Pipeline (Text Input)"""
+async def process_invoice(
+    payload: InvoiceAnalysisRequest,
+    view: Optional[Literal["full", "compact"]] = None,
+    accept: Optional[str] = Header(None),
+):
+    """
+    Core AI Pipeline (Text Input)
+    `view=compact` (or Accept: application/vnd.invoice.compact+json) returns
+    decision, score and flag/suggestion codes without the prose.
+    """
     
     logger.info(f"📝 Processing text invoice ({len(payload.raw_text)} chars)")
+    started = time.perf_counter()
     
     try:
-        extracted_data = extractor.extract(payload.raw_text)
-        logger.info(f"💾 Extracted: {extracted_data}")
-        
-        fingerprint = security.fingerprint(
-            vendor=extracted_data.get('vendor_name', ''),
-            inv_id=extracted_data.get('invoice_number', ''),
-            amount=extracted_data.get('amount', 0)
-        )
-        is_duplicate = security.check_duplicate(fingerprint)
-        vendor_trust = security.verify_vendor(extracted_data.get('vendor_name', ''))
+        record = await admission.run(_analyze_and_save, analyze_text, payload.raw_text)
         
-        security_context = {
-            "is_duplicate": is_duplicate,
-            "vendor_status": vendor_trust.get('status'),
-            "vendor_score": vendor_trust.get('score'),
-            "fingerprint": fingerprint
-        }
-
-        analysis_result = decision_engine.evaluate(extracted_data, security_context)
-        
-        db.save_decision(
-            invoice_id=extracted_data.get('invoice_number', 'UNK'),
-            payload=analysis_result.dict()
-        )
-        
-        logger.info(f"✅ Decision: {analysis_result.decision} ({analysis_result.confidence_score})")
-        return analysis_result
+        logger.info(f"✅ Decision: {record['decision']} ({record['confidence_score']})")
+        return decision_response(record, wants_compact(view, accept))
         
+    except HTTPException as e:
+        _count_error("process-invoice", e)
+        raise
     except Exception as e:
+        _count_error("process-invoice", e)
         logger.error(f"❌ Error: {str(e)}")
         raise HTTPException(500, f"Processing failed: {str(e)}")
+    finally:
+        metrics.observe("invoice_request_seconds", time.perf_counter() - started, endpoint="process-invoice")
 
 @router.post("/process-invoice-file", response_model=AIAnalysisResult)
-async def process_invoice_file(file: UploadFile = File(...)):
+async def process_invoice_file(
+    file: UploadFile = File(...),
+    view: Optional[Literal["full", "compact"]] = None,
+    accept: Optional[str] = Header(None),
+):
     """
     AI Pipeline with Universal File Support
     Handles PDF, Images, Excel, Word, Text, CSV
+    Response views as for /process-invoice.
     """
     
     if not file.filename:
         raise HTTPException(400, "No filename provided")
     
     logger.info(f"📄 Processing file: {file.filename}")
+    started = time.perf_counter()
     
     try:
         contents = await file.read()
         logger.info(f"📦 File size: {len(contents)} bytes")
         
-        # Universal Text Extraction
-        raw_text = extract_text_from_file(contents, file.filename)
-        
-        logger.info(f"📝 Extracted {len(raw_text)} chars")
-        logger.info(f"📝 Preview: {raw_text[:200]}")
-        
-        # Extract invoice data
-        extracted_data = extractor.extract(raw_text)
-        logger.info(f"💾 Extracted: {extracted_data}")
-        
-        if extracted_data.get('amount', 0) == 0:
-            logger.warning("⚠️ Amount = 0 (unusual format)")
-        
-        from backend.app.services.erp_mock import erp_system
-        
-        # Extract Metadata for Forensics
-        file_metadata = {}
-        try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(contents))
-            file_metadata = {key.strip('/'): value for key, value in pdf_reader.metadata.items()} if pdf_reader.metadata else {}
-        except:
-            pass
-            
-        # Security & ERP pipeline
-        fingerprint = security.fingerprint(
-            vendor=extracted_data.get('vendor_name', ''),
-            inv_id=extracted_data.get('invoice_number', ''),
-            amount=extracted_data.get('amount', 0)
-        )
-        is_duplicate = security.check_duplicate(fingerprint)
-        vendor_trust = security.verify_vendor(extracted_data.get('vendor_name', ''))
-        
-        # New Validations
-        gst_validation = security.verify_gstin(extracted_data.get('gstin', ''))
-        digital_forensics = security.analyze_digital_footprint(file_metadata)
-        
-        # Bank Verification (3-Way Match critical step)
-        bank_validation = security.verify_bank_details(vendor_trust.get('data'), extracted_data)
-        
-        # ERP Validation
-        erp_check = {"valid": False, "message": "No PO found"}
-        if extracted_data.get('po_number'):
-            erp_check = erp_system.check_po(extracted_data.get('po_number'))
-        
-        security_context = {
-            "is_duplicate": is_duplicate,
-            "vendor_status": vendor_trust.get('status'),
-            "vendor_score": vendor_trust.get('score'),
-            "fingerprint": fingerprint,
-            "erp_validation": erp_check,
-            "gst_validation": gst_validation,
-            "digital_forensics": digital_forensics,
-            "bank_validation": bank_validation
-        }
-
-        analysis_result = decision_engine.evaluate(extracted_data, security_context)
-        
-        db.save_decision(
-            invoice_id=extracted_data.get('invoice_number', 'UNK'),
-            payload=analysis_result.dict()
-        )
+        doc = DocumentContext(contents, file.filename)
+        record = await admission.run(_analyze_and_save, analyze_file, doc)
         
-        logger.info(f"✅ Decision: {analysis_result.decision} (confidence: {analysis_result.confidence_score})")
-        return analysis_result
+        logger.info(f"✅ Decision: {record['decision']} (confidence: {record['confidence_score']})")
+        return decision_response(record, wants_compact(view, accept))
         
-    except HTTPException:
+    except HTTPException as e:
+        _count_error("process-invoice-file", e)
         raise
     except Exception as e:
+        _count_error("process-invoice-file", e)
         logger.error(f"❌ Error: {str(e)}", exc_info=True)
         raise HTTPException(500, f"Processing failed: {str(e)}")
+    finally:
+        metrics.observe("invoice_request_seconds", time.perf_counter() - started, endpoint="process-invoice-file")
+
+@router.post("/process-invoices-batch")
+async def process_invoices_batch(
+    files: List[UploadFile] = File(default=[]),
+    texts: List[str] = Form(default=[]),
+    view: Optional[Literal["full", "compact"]] = None,
+    accept: Optional[str] = Header(None),
+):
+    """
+    Bulk AI Pipeline (month-end close).
+    Accepts many files and/or raw texts in one multipart request, fans the
+    extraction, security checks and decision out to a process pool sized to
+    the CPU cores, and streams one NDJSON line per document in input order
+    (files first, then texts). Each line's "result" follows the response
+    view, as for /process-invoice.
+    """
+    items: List[Dict[str, Any]] = []
+    for f in files:
+        if not f.filename:
+            raise HTTPException(400, "No filename provided")
+        items.append({"filename": f.filename, "contents": await f.read()})
+    for t in texts:
+        items.append({"text": t})
+
+    if not items:
+        raise HTTPException(400, "No files or texts provided")
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(413, f"Batch too large: {len(items)} items (max {settings.BATCH_MAX_ITEMS})")
+
+    sources = [item.get("filename", "text") for item in items]
+    render = compact_view if wants_compact(view, accept) else full_view
+    logger.info(f"📚 Processing batch of {len(items)} documents")
+    # Keep a bounded window in flight so thousands of documents aren't all
+    # pickled onto the pool queue at once.
+    window = _batch_worker_count() * 2
+
+    def submit(loop: asyncio.AbstractEventLoop, item: Dict[str, Any]):
+        pool = get_process_pool()
+        try:
+            return pool, loop.run_in_executor(pool, process_batch_item, item)
+        except BrokenProcessPool:
+            _discard_process_pool(pool)
+            pool = get_process_pool()
+            return pool, loop.run_in_executor(pool, process_batch_item, item)
+
+    async def stream_results():
+        loop = asyncio.get_running_loop()
+        pending: deque = deque()  # (pool, future) in input order
+        next_item = 0
+        counts: Dict[str, int] = {}
+
+        try:
+            for index in range(len(items)):
+                while next_item < len(items) and len(pending) < window:
+                    pending.append(submit(loop, items[next_item]))
+                    items[next_item] = None  # release the upload bytes once handed off
+                    next_item += 1
+
+                pool, future = pending.popleft()
+                try:
+                    outcome = await future
+                except BrokenProcessPool as e:
+                    # A worker died: every item in flight on that pool is lost, later ones go to a fresh pool
+                    _discard_process_pool(pool)
+                    _count_error("process-invoices-batch", e)
+                    outcome = {"status": "error", "status_code": 500, "error": "Processing failed: batch worker crashed"}
+                metrics.replay(outcome.pop("metrics", []))
+                context = outcome.pop("context", None)
+                if outcome["status"] == "ok":
+                    try:
+                        await asyncio.to_thread(_save_decision_or_release, outcome["result"], context)
+                    except Exception as e:
+                        _count_error("process-invoices-batch", e)
+                        logger.error(f"❌ Batch decision not saved: {e}")
+                        outcome = {"status": "error", "status_code": 500, "error": f"Saving decision failed: {str(e)}"}
+                line: Dict[str, Any] = {"index": index, "source": sources[index], **outcome}
+
+                if outcome["status"] == "ok":
+                    result = outcome["result"]
+                    counts[result["decision"]] = counts.get(result["decision"], 0) + 1
+                    line["result"] = render(result)
+                else:
+                    counts["ERROR"] = counts.get("ERROR", 0) + 1
+
+                yield dumps(line) + b"\n"
+        finally:
+            # Stream abandoned (client disconnected): items still in flight finish in
+            # the workers, but their decisions will never be saved
+            for _, future in pending:
+                future.add_done_callback(_release_unsaved)
+
+        logger.info(f"✅ Batch complete: {counts}")
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+def _local_iso(value: Optional[datetime]) -> Optional[str]:
+    """Query bound in the same form as stored timestamps (naive local time)."""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.isoformat()
 
 @router.get("/decision-logs", response_model=List[dict])
-async def get_logs():
-    """Return all decision logs"""
-    log_data = db.get_logs()
+def get_logs(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    decision: Optional[str] = None,
+    vendor: Optional[str] = None,
+    invoice_id: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    fields: Literal["full", "summary"] = "full",
+):
+    """
+    Decision logs, newest first.
+    Filters: decision, vendor (case-insensitive), invoice_id, since
+    (inclusive) / until (exclusive). `fields=summary` returns only the
+    summary columns. When more rows exist, the X-Next-Cursor header holds the
+    cursor for the next page.
+    """
+    try:
+        log_data, next_cursor = db.query_logs(
+            limit=limit,
+            cursor=cursor,
+            decision=decision,
+            vendor=vendor,
+            invoice_id=invoice_id,
+            since=_local_iso(since),
+            until=_local_iso(until),
+            summary=fields == "summary",
+        )
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if fields == "full":
+        log_data = [full_view(payload) for payload in log_data]
     logger.info(f"📊 Returning {len(log_data)} logs")
     return log_data
 
@@ -261,21 +353,92 @@ def health_check():
         "capabilities": {
             "text_pdf": True,
             "scanned_pdf": tesseract_installed
-        }
+        },
+        "text_cache": text_cache.stats(),
+        "pipeline": admission.stats(),
+        "duplicate_index": duplicate_index.stats(),
+        "master_data": erp_system.master.stats(),
+        "erp": erp_gateway.stats(),
+        "vision": vision_workers.stats()
     }
 
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus scrape endpoint: stage latency histograms, decisions, errors"""
+    pipeline = admission.stats()
+    metrics.set("invoice_pipeline_jobs", pipeline["in_flight"], state="running")
+    metrics.set("invoice_pipeline_jobs", pipeline["queued"], state="queued")
+    metrics.set("invoice_db_pending_writes", db.pending_writes())
+    metrics.set("inference_queue_depth", vision_workers.queue_depth(), scheduler="vision")
+    for event, value in text_cache.stats().items():
+        if event in ("memory_hits", "disk_hits", "misses", "stores", "evictions"):
+            metrics.set("invoice_text_cache_events_total", value, event=event)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def _require_admin(token: Optional[str]):
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(403, "Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if not hmac.compare_digest((token or "").encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(401, "Invalid admin token")
+
+@router.post("/admin/reload-master-data")
+def reload_master_data(
+    force: bool = Query(False, description="Accept an export that shrinks the vendor or PO set sharply"),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Reload vendor master + POs from the ERP export files and swap them in.
+    Requests in flight finish on the previous snapshot. Batch workers pick
+    the change up through their own file watcher.
+    """
+    _require_admin(x_admin_token)
+    try:
+        stats = erp_system.master.reload(force=force)
+    except MasterDataError as e:
+        raise HTTPException(422, f"Master data reload refused: {e}")
+    logger.info(f"📇 Master data reloaded: {stats['vendors']} vendors, {stats['purchase_orders']} POs")
+    return stats
+
+@router.get("/admin/decision-replay")
+def decision_replay(
+    approve_threshold: float = Query(..., ge=0, le=1),
+    review_threshold: float = Query(..., ge=0, le=1),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    vendor: Optional[str] = None,
+    x_admin_token: Optional[str] = Header(None),
+):
+    """
+    Threshold what-if: re-score stored decisions with the proposed
+    thresholds and report how approve/review/reject counts would change.
+    Reads the stored decision features only; nothing is re-extracted or
+    re-checked against the ERP.
+    """
+    _require_admin(x_admin_token)
+    if review_threshold > approve_threshold:
+        raise HTTPException(400, "review_threshold must not exceed approve_threshold")
+    return replay_decisions(
+        approve_threshold,
+        review_threshold,
+        since=_local_iso(since),
+        until=_local_iso(until),
+        vendor=vendor,
+    )
+
 @router.get("/debug/extract-text")
 async def debug_extract(file: UploadFile = File(...)):
     """Debug: See exact extracted text"""
     contents = await file.read()
     
     try:
-        raw_text = extract_text_with_ocr_fallback(contents)
+        doc = DocumentContext(contents, file.filename or "")
+        raw_text = doc.text()
         return {
             "filename": file.filename,
             "total_chars": len(raw_text),
             "extracted_text": raw_text,
-            "method_used": "OCR" if len(raw_text) > 100 else "PyPDF2"
+            "method_used": doc.method,
+            "cache": doc.cache_status
         }
     except HTTPException as e:
         return {
@@ -286,29 +449,143 @@ async def debug_extract(file: UploadFile = File(...)):
 
 # --- VISION AI ENDPOINTS (Advanced Visual Control) ---
 
+def _vision_status(analysis: Dict[str, Any]) -> Dict[str, str]:
+    # Determine safety status (example: Person detected = Alert)
+    is_safe = not analysis.get("safety_alert", False)
+    return {
+        "system_status": "MONITORING" if is_safe else "ALERT",
+        "threat_level": "LOW" if is_safe else "HIGH"
+    }
+
+# What a vision response carries (see VisionAgent.detect_objects):
+# annotated = analysis + annotated JPEG, detections = analysis only,
+# boxes = frame size and box rows only. Skipping the image saves the
+# plotting and JPEG encoding, most of a frame's CPU after inference.
+VisionOutput = Literal["annotated", "detections", "boxes"]
+_stream_ids = itertools.count(1)
+
 @router.post("/vision/analyze-frame")
-async def analyze_frame(file: UploadFile = File(...)):
+async def analyze_frame(
+    file: UploadFile = File(...),
+    output: VisionOutput = "annotated",
+    scale: float = Query(1.0, gt=0, le=1, description="Resize factor for the annotated frame"),
+    quality: Optional[int] = Query(None, ge=1, le=100, description="JPEG quality of the annotated frame"),
+):
     """
     Real-Time Vision Analysis Endpoint.
     Accepts raw video frame -> Runs YOLOv8 -> Returns analysis + annotated image.
+    `annotated_frame_base64` is only present for output=annotated.
     """
     try:
         contents = await file.read()
         
-        # Run Vision Agent
-        analysis_data, annotated_image = vision_engine.detect_objects(contents)
+        # Run Vision Agent in the vision worker processes; concurrent frames share batched model calls
+        analysis_data, annotated_image = await asyncio.wrap_future(
+            vision_workers.submit(contents, output=output, scale=scale, quality=quality))
         
-        # Determine safety status (example: Person detected = Alert)
-        is_safe = not analysis_data.get("safety_alert", False)
-        
-        return {
-            "analysis": analysis_data,
-            "annotated_frame_base64": base64.b64encode(annotated_image).decode('utf-8'),
-            "system_status": "MONITORING" if is_safe else "ALERT",
-            "threat_level": "LOW" if is_safe else "HIGH"
-        }
+        response = {"analysis": analysis_data, **_vision_status(analysis_data)}
+        if annotated_image is not None:
+            response["annotated_frame_base64"] = base64.b64encode(annotated_image).decode('utf-8')
+        return response
         
+    except HTTPException:
+        raise
+    except TimeoutError as e:
+        logger.error(f"Vision Error: {e}")
+        raise HTTPException(504, f"Vision AI timed out: {str(e)}")
     except Exception as e:
         logger.error(f"Vision Error: {e}")
         raise HTTPException(500, f"Vision AI Failed: {str(e)}")
 
+
+@router.websocket("/vision/stream")
+async def vision_stream(
+    websocket: WebSocket,
+    output: VisionOutput = "annotated",
+    scale: float = Query(1.0, gt=0, le=1),
+    quality: Optional[int] = Query(None, ge=1, le=100),
+    track: bool = True,
+    detect_every: Optional[int] = Query(None, ge=1, le=300, description="Default: VISION_DETECT_EVERY"),
+):
+    """
+    Persistent per-camera vision session.
+    The client sends JPEG frames as binary messages. For each frame it
+    analyses, the server sends a JSON text message (frame number,
+    detections, status, frames dropped so far) followed by the annotated
+    JPEG as a binary message (output=annotated only). output, scale and
+    quality are query parameters of the connection, as on analyze-frame.
+    Only the newest unanswered frame is kept: frames that arrive while the
+    model is busy replace it and are counted as dropped, so latency stays
+    at about one inference however fast the camera sends.
+    With track=true (the default) the stream has a tracking session in its
+    vision worker: the model runs every `detect_every` frames or when the
+    scene moves, and detections carry stable track ids and dwell times
+    (see VisionAgent.track_frame).
+    """
+    await websocket.accept()
+    latest: Dict[str, Any] = {}
+    frame_ready = asyncio.Event()
+    counts = {"received": 0, "processed": 0, "dropped": 0, "detected": 0}
+    session = f"stream-{next(_stream_ids)}" if track else None
+
+    async def analyse_frames():
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            seq, contents, received_at = latest.pop("frame")
+            message: Dict[str, Any] = {"frame": seq}
+            try:
+                analysis_data, annotated_image = await asyncio.wrap_future(
+                    vision_workers.submit(contents, output=output, scale=scale, quality=quality,
+                                          session=session, detect_every=detect_every))
+            except HTTPException as e:
+                if e.status_code == 429:  # workers saturated: treat like any other dropped frame
+                    counts["dropped"] += 1
+                    metrics.inc("vision_stream_frames_total", outcome="dropped")
+                    continue
+                message.update(type="error", error=e.detail)
+                annotated_image = None
+            except Exception as e:
+                logger.error(f"Vision Stream Error: {e}")
+                message.update(type="error", error=f"Vision AI Failed: {str(e)}")
+                annotated_image = None
+            else:
+                counts["processed"] += 1
+                if "tracking" in analysis_data:
+                    detected = analysis_data["tracking"]["detected"]
+                    counts["detected"] += detected
+                    metrics.inc("vision_stream_inference_total", outcome="detected" if detected else "tracked")
+                message.update(type="detections", analysis=analysis_data, **_vision_status(analysis_data))
+            metrics.inc("vision_stream_frames_total", outcome="error" if message["type"] == "error" else "processed")
+            message.update(dropped=counts["dropped"], latency_ms=round((time.perf_counter() - received_at) * 1000, 1))
+            await websocket.send_text(dumps(message).decode())
+            if annotated_image is not None:
+                await websocket.send_bytes(annotated_image)
+
+    worker = asyncio.create_task(analyse_frames())
+    try:
+        while True:
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                break
+            contents = received.get("bytes")
+            if not contents:
+                continue  # text messages (keep-alives) carry no frame
+            counts["received"] += 1
+            if "frame" in latest:
+                counts["dropped"] += 1
+                metrics.inc("vision_stream_frames_total", outcome="dropped")
+            latest["frame"] = (counts["received"], contents, time.perf_counter())
+            frame_ready.set()
+            if worker.done():
+                worker.result()  # surface a send failure instead of reading frames nobody answers
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Vision Stream Error: {e}")
+    finally:
+        worker.cancel()
+        if session is not None:
+            vision_workers.end_session(session)  # before awaiting: a cancelled handler stops at the first await
+        await asyncio.gather(worker, return_exceptions=True)
+        logger.info(f"🎥 Vision stream closed: {counts}")
@@ -0,0 +1,56 @@
+from fastapi.responses import JSONResponse
+from backend.app.agents.suggestions import render_suggestions
+from typing import Any, Dict, Optional
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Accept header (or ?view=compact) selecting the compact decision body
+COMPACT_MEDIA_TYPE = "application/vnd.invoice.compact+json"
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON; orjson when installed (several times faster than json)."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: same JSON, encoded with dumps()."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+def wants_compact(view: Optional[str], accept: Optional[str]) -> bool:
+    if view:
+        return view == "compact"
+    return bool(accept) and COMPACT_MEDIA_TYPE in accept
+
+def full_view(record: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decision record (invoice_pipeline.decision_record, or a stored payload)
+    with its suggestion codes rendered into the full Suggestion list.
+    Records stored before suggestion codes existed are returned as they are.
+    """
+    if "suggestion_codes" not in record:
+        return record
+    body = {key: value for key, value in record.items() if key != "suggestion_codes"}
+    body["suggestions"] = render_suggestions((s["code"], s["params"]) for s in record["suggestion_codes"])
+    return body
+
+def compact_view(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Decision, score, flag codes and suggestion codes with their parameters; no prose."""
+    return {
+        "invoice_number": record["processed_invoice"].get("invoice_number"),
+        "decision": record["decision"],
+        "confidence_score": record["confidence_score"],
+        "fraud_flags": [{"code": f["code"], "severity": f["severity"]} for f in record["fraud_flags"]],
+        "suggestions": record.get("suggestion_codes", []),
+    }
+
+def decision_response(record: Dict[str, Any], compact: bool) -> FastJSONResponse:
+    if compact:
+        return FastJSONResponse(compact_view(record), media_type=COMPACT_MEDIA_TYPE)
+    return FastJSONResponse(full_view(record))
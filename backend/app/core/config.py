@@ -15,6 +15,96 @@ class Settings(BaseSettings):
     CONFIDENCE_THRESHOLD_APPROVED: float = 0.85
     CONFIDENCE_THRESHOLD_REVIEW: float = 0.50
 
+    # Decision Store (SQLite)
+    DB_BACKGROUND_WRITES: bool = False  # Queue decision inserts, commit them in batches off the request path
+    DB_WRITE_BATCH: int = 200           # Max decisions per transaction
+    DB_WRITE_INTERVAL_MS: int = 50      # How long a queued write waits for others to group with
+
+    # Duplicate Detection (fingerprint index)
+    DUPLICATE_DB_PATH: str = "fingerprints.db"
+    DUPLICATE_BLOOM_CAPACITY: int = 10_000_000  # Grows to 2x the stored count at warm-up if larger
+    DUPLICATE_BLOOM_ERROR_RATE: float = 0.001   # False positives fall through to SQLite
+    DUPLICATE_BLOOM_REFRESH_SECONDS: float = 2.0  # How often the filter folds in other processes' fingerprints
+
+    # Near-Duplicate Detection (MinHash/LSH)
+    NEAR_DUP_ENABLED: bool = True
+    NEAR_DUP_DB_PATH: str = "near_duplicates.db"  # Kept next to invoices.db
+    NEAR_DUP_THRESHOLD: float = 0.85    # Estimated Jaccard similarity that counts as a near-duplicate
+    NEAR_DUP_BANDS: int = 16            # LSH bands x rows = MinHash permutations
+    NEAR_DUP_ROWS: int = 8
+    NEAR_DUP_MAX_CHARS: int = 20000     # Document text shingled per invoice
+    NEAR_DUP_MAX_CANDIDATES: int = 500  # Bucket matches scored per lookup, most recent first
+    NEAR_DUP_AMOUNT_TOLERANCE: float = 0.01  # Relative amount gap a same-date match may have when the invoice numbers differ
+
+    # Vendor Master Matching
+    VENDOR_MATCH_THRESHOLD: float = 0.6  # Minimum index score to treat a vendor as known
+
+    # ERP Master Data (vendor master + purchase orders)
+    ERP_VENDOR_FILE: str = ""           # Nightly export: .csv, .ndjson/.jsonl or SQLite (.db, table `vendors`); empty = demo data
+    ERP_PO_FILE: str = ""               # Same formats (SQLite table `purchase_orders`); empty = demo data
+    ERP_RELOAD_POLL_SECONDS: float = 5  # Check the files for changes this often (0 = reload via admin endpoint only)
+    ERP_MAX_INVALID_RATIO: float = 0.01  # Refuse an export with more bad rows than this
+    ERP_MIN_RETAINED_RATIO: float = 0.5  # Refuse an export that shrinks a dataset below this fraction (truncated file)
+
+    # Remote ERP (SAP / Oracle gateway). Empty = look up the local master data above
+    ERP_BASE_URL: str = ""
+    ERP_TIMEOUT_SECONDS: float = 2.0    # Whole-request deadline per upstream call
+    ERP_MAX_CONNECTIONS: int = 20       # Pooled keep-alive connections per process
+    ERP_PO_CACHE_TTL: float = 300       # Seconds a PO answer is reused
+    ERP_VENDOR_CACHE_TTL: float = 900   # Seconds a vendor answer is reused
+    ERP_NEGATIVE_CACHE_TTL: float = 30  # Seconds a "not found" answer is reused
+    ERP_CACHE_ENTRIES: int = 50_000     # Per lookup kind, least recently used dropped first
+    ERP_BREAKER_FAILURES: int = 5       # Consecutive failures that open the circuit
+    ERP_BREAKER_RESET_SECONDS: float = 30  # Fail fast this long before a trial call
+
+    # Admin Endpoints
+    ADMIN_TOKEN: str = ""               # Required in X-Admin-Token for /v1/admin/* (empty = admin endpoints disabled)
+
+    # Vision
+    VISION_BATCH_SIZE: int = 8          # Max frames per batched YOLO call
+    VISION_BATCH_WAIT_MS: float = 5.0   # Longest a frame waits for others to join its batch
+    VISION_WORKERS: int = 1             # Inference processes (the API process never loads the model)
+    VISION_SHM_SLOTS: int = 16          # Frames in flight at once; more get 429
+    VISION_SHM_SLOT_BYTES: int = 1_048_576  # Max JPEG frame size (same again for the annotated frame)
+    VISION_TIMEOUT_SECONDS: float = 30.0    # Covers model load on the first frame
+    VISION_MODEL: str = "yolov8n.pt"    # Weights (downloaded on first run)
+    VISION_BACKEND: str = "torch"       # torch | onnx | openvino (CPU runtimes; exported once into VISION_EXPORT_DIR)
+    VISION_IMGSZ: int = 640             # Model input size; lower trades accuracy for speed (multiple of 32)
+    VISION_INT8: bool = False           # INT8-quantised export (onnx / openvino only)
+    VISION_INT8_CALIBRATION: str = "coco8.yaml"  # Dataset whose images calibrate the INT8 export
+    VISION_EXPORT_DIR: str = "vision_models"
+    VISION_JPEG_QUALITY: int = 95       # Annotated frame JPEG quality when the request sets none (OpenCV default)
+    VISION_DETECT_EVERY: int = 5        # Stream sessions: run the model at least every N frames...
+    VISION_MOTION_THRESHOLD: float = 0.01   # ...or when more than this share of the scene changed
+    VISION_TRACK_MAX_MISSES: int = 3    # Detection rounds a track coasts unmatched before it is dropped
+
+    # Logging
+    LOG_PAYLOADS: bool = False      # Log extracted invoice fields per request (debug only: contains invoice data)
+
+    # Text Extraction
+    STREAM_EARLY_EXIT: bool = False  # Stop reading pages once key fields are settled
+
+    # OCR (scanned PDFs)
+    OCR_DPI: int = 200              # Render resolution for scanned pages
+    OCR_MAX_PAGES: int = 50         # Pages OCR'd per document (0 = no cap)
+    OCR_WORKERS: int = 0            # Parallel page workers (0 = one per CPU core)
+    OCR_MEMORY_LIMIT_MB: int = 512  # Rendered-page memory ceiling per request
+
+    # Extracted-Text Cache (keyed by SHA-256 of the upload)
+    TEXT_CACHE_ENABLED: bool = True
+    TEXT_CACHE_PATH: str = "text_cache.db"
+    TEXT_CACHE_MEMORY_MB: int = 64      # In-process LRU tier
+    TEXT_CACHE_DISK_MB: int = 1024      # SQLite tier, oldest entries evicted beyond this
+    TEXT_CACHE_MAX_ENTRY_MB: int = 16   # Larger documents are streamed but not cached
+
+    # Request Pipeline (blocking stages run off the event loop)
+    PIPELINE_WORKERS: int = 0       # Concurrent invoice jobs (0 = one per CPU core)
+    PIPELINE_MAX_QUEUE: int = 32    # Jobs allowed to wait; beyond this -> 429 + Retry-After
+
+    # Batch Processing
+    BATCH_WORKERS: int = 0          # Process pool size (0 = one per CPU core)
+    BATCH_MAX_ITEMS: int = 5000     # Max documents per batch request
+
     class Config:
         env_file = ".env"
         extra = "ignore"
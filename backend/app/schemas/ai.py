@@ -1,27 +1,89 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 
 # --- DATABASE SCHEMA (In-Memory Persistence for MVP) ---
 # A real product needs to store data. If we don't have a live DB connection,
 # we use a robust JSON store.
 
+from backend.app.core.config import settings
+from backend.app.agents.decision import BATCH_COLUMNS
+import threading
+import logging
 import sqlite3
+import queue
+import atexit
+import base64
 import json
+import time
 import os
 
 # --- DATABASE SCHEMA (SQLite Persistence for MVP) ---
 # This is a REAL local database. Data survives backend restarts.
 # Perfect bridge between "In-Memory" and "Cloud SQL".
 
+logger = logging.getLogger(__name__)
+
+_STOP = object()  # Tells the background writer to drain and exit
+
+# Columns returned by the summary projection (no payload JSON decoding)
+SUMMARY_COLUMNS = ("id", "invoice_id", "vendor", "amount", "currency", "decision", "confidence", "timestamp")
+
+# Inputs DecisionAgent.evaluate_batch() scores, stored per decision (decision_features
+# table) so a threshold change can be replayed over history without OCR or ERP calls.
+# Floats are REAL; flags, counts and the vendor status code are INTEGER.
+FEATURE_COLUMNS = tuple(
+    (name, "REAL" if isinstance(default, float) else "INTEGER") for name, default in BATCH_COLUMNS.items()
+)
+
+def encode_cursor(timestamp: str, row_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([timestamp, row_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(timestamp), int(row_id)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
 class SQLiteDB:
-    def __init__(self, db_path="invoices.db"):
+    """
+    Decision store.
+    - One connection per thread, kept open (no connect/close per request)
+    - WAL journal: readers never block the writer and vice versa
+    - Optional background writer: save_decision() only enqueues, and a single
+      thread commits the queued rows in grouped transactions. close() (app
+      shutdown, or interpreter exit) drains the queue before returning.
+    """
+
+    def __init__(self, db_path="invoices.db", background_writes: Optional[bool] = None):
         self.db_path = db_path
+        self.background_writes = settings.DB_BACKGROUND_WRITES if background_writes is None else background_writes
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._conn_lock = threading.Lock()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._write_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+        self._closed = False
         self._init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False only so close() can close it from another thread
+            conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # WAL + NORMAL: durable across app crashes, not power loss
+            conn.execute("PRAGMA busy_timeout=10000")
+            self._local.conn = conn
+            with self._conn_lock:
+                self._connections.append(conn)
+        return conn
+
     def _init_db(self):
         """Create tables if they don't exist"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self._connect()
         cursor = conn.cursor()
         
         # Decisions Table
@@ -32,15 +94,66 @@ class SQLiteDB:
                 decision TEXT NOT NULL,
                 confidence REAL,
                 payload TEXT,  -- Full JSON dump
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                vendor TEXT COLLATE NOCASE,  -- Summary columns, copied out of the payload
+                amount REAL,
+                currency TEXT,
+                context TEXT  -- Security context JSON the decision was made with
             )
         ''')
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS decision_features (
+                decision_id INTEGER PRIMARY KEY,  -- decisions.id
+                {", ".join(f"{name} {decl}" for name, decl in FEATURE_COLUMNS)}
+            )
+        ''')
+
+        # Older databases: add the summary columns and fill them from the payload
+        columns = {row[1] for row in cursor.execute('PRAGMA table_info(decisions)')}
+        added = False
+        for column, decl in (("vendor", "TEXT COLLATE NOCASE"), ("amount", "REAL"), ("currency", "TEXT")):
+            if column not in columns:
+                cursor.execute(f'ALTER TABLE decisions ADD COLUMN {column} {decl}')
+                added = True
+        if added:
+            try:
+                cursor.execute('''
+                    UPDATE decisions SET
+                        vendor = json_extract(payload, '$.processed_invoice.vendor_name'),
+                        amount = json_extract(payload, '$.processed_invoice.amount'),
+                        currency = json_extract(payload, '$.processed_invoice.currency')
+                ''')
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Database Migration Warning: summary backfill skipped ({e})")
+        if "context" not in columns:
+            cursor.execute('ALTER TABLE decisions ADD COLUMN context TEXT')
+        # Feature columns added later are NULL (the BATCH_COLUMNS default) for older decisions
+        stored = {row[1] for row in cursor.execute('PRAGMA table_info(decision_features)')}
+        for name, decl in FEATURE_COLUMNS:
+            if name not in stored:
+                cursor.execute(f'ALTER TABLE decision_features ADD COLUMN {name} {decl}')
+
+        # Every index ends in (timestamp, id) so filtered pages are index range scans
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_decisions_time ON decisions(timestamp, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_decisions_decision ON decisions(decision, timestamp, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_decisions_vendor ON decisions(vendor, timestamp, id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_decisions_invoice ON decisions(invoice_id, timestamp, id)')
         conn.commit()
-        conn.close()
 
-    def save_decision(self, invoice_id: str, payload: dict):
+    def save_decision(
+        self,
+        invoice_id: str,
+        payload: dict,
+        context: Optional[Dict[str, Any]] = None,
+        features: Optional[Dict[str, Any]] = None,
+    ):
         """
         Persist decision to SQLite database.
+        `context` is the security context the decision was made with and
+        `features` its FEATURE_COLUMNS values; with them stored the decision
+        can be replayed (iter_features). Raises if the row can't be written.
+        With background writes on, the row is queued and committed shortly
+        after by the writer thread instead.
         """
         timestamp = datetime.now().isoformat()
         
@@ -50,51 +163,257 @@ class SQLiteDB:
             "timestamp": timestamp,
             **payload
         }
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        invoice = payload.get('processed_invoice') or {}
+        row = (
+            invoice_id,
+            payload.get('decision', 'UNKNOWN'),
+            payload.get('confidence_score', 0.0),
+            json.dumps(full_record),
+            timestamp,
+            invoice.get('vendor_name'),
+            invoice.get('amount'),
+            invoice.get('currency'),
+            json.dumps(context, default=str) if context is not None else None,
+            features,
+        )
+
+        with self._write_lock:
+            if self.background_writes and not self._closed:
+                self._start_writer()
+                self._queue.put(row)
+                return full_record
+
+        self._insert_rows(self._connect(), [row])
+        return full_record
+
+    def _insert(self, rows: List[tuple]):
+        """
+        Commit rows in one transaction. If the group fails, each row is
+        retried in a transaction of its own, so one bad row (or a transient
+        lock) doesn't take the rest of the batch down with it.
+        """
+        conn = self._connect()
         try:
-            cursor.execute('''
-                INSERT INTO decisions (invoice_id, decision, confidence, payload, timestamp)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                invoice_id, 
-                payload.get('decision', 'UNKNOWN'),
-                payload.get('confidence_score', 0.0),
-                json.dumps(full_record),
-                timestamp
-            ))
-            conn.commit()
+            self._insert_rows(conn, rows)
+            return
         except Exception as e:
-            print(f"Database Error: {e}")
-        finally:
-            conn.close()
-            
-        return full_record
+            if len(rows) == 1:
+                logger.error(f"❌ Database Error: {e} (decision {rows[0][0]} not saved)")
+                return
+            logger.warning(f"⚠️ Database Error: {e} - retrying {len(rows)} decision(s) one at a time")
+        lost = 0
+        for row in rows:
+            try:
+                self._insert_rows(conn, [row])
+            except Exception as e:
+                lost += 1
+                logger.error(f"❌ Database Error: {e} (decision {row[0]} not saved)")
+        if lost:
+            logger.error(f"❌ {lost} of {len(rows)} decision(s) not saved")
+
+    @staticmethod
+    def _insert_rows(conn: sqlite3.Connection, rows: List[tuple]):
+        with conn:  # one transaction for the whole group
+            feature_rows = []
+            for *row, features in rows:
+                decision_id = conn.execute('''
+                    INSERT INTO decisions (invoice_id, decision, confidence, payload, timestamp, vendor, amount, currency, context)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', row).lastrowid
+                if features:
+                    feature_rows.append((decision_id, *(features.get(name) for name, _ in FEATURE_COLUMNS)))
+            if feature_rows:
+                conn.executemany(
+                    f'INSERT INTO decision_features (decision_id, {", ".join(name for name, _ in FEATURE_COLUMNS)}) '
+                    f'VALUES ({", ".join("?" * (len(FEATURE_COLUMNS) + 1))})',
+                    feature_rows)
+
+    def _start_writer(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="decision-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    def _write_loop(self):
+        batch_size = max(1, settings.DB_WRITE_BATCH)
+        interval = settings.DB_WRITE_INTERVAL_MS / 1000
+        stopping = False
+        while not stopping:
+            items = [self._queue.get()]
+            # Give concurrent requests a moment to join this transaction
+            deadline = time.monotonic() + interval
+            while len(items) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if _STOP in items:
+                stopping = True
+                # Nothing can be enqueued after the stop marker, so this drains everything
+                while True:
+                    try:
+                        items.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+            rows = [item for item in items if item is not _STOP]
+            for start in range(0, len(rows), batch_size):
+                self._insert(rows[start:start + batch_size])
+            for _ in items:
+                self._queue.task_done()
+
+    def pending_writes(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self):
+        """Block until every queued decision is committed."""
+        if self._writer is not None:
+            self._queue.join()
+
+    def close(self):
+        """Drain the write queue, stop the writer and close every connection."""
+        with self._write_lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._writer is not None:
+                self._queue.put(_STOP)
+        if self._writer is not None:
+            self._writer.join()
+        with self._conn_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._connections.clear()
+        # Late callers get fresh connections and synchronous writes
+        self._local = threading.local()
 
     def get_logs(self):
         """
-        Retrieve all logs, newest first.
+        Retrieve the latest 50 logs, newest first.
         """
-        conn = sqlite3.connect(self.db_path)
-        # Return results as dictionaries
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        logs = []
+        return self.query_logs(limit=50)[0]
+
+    def query_logs(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        decision: Optional[str] = None,
+        vendor: Optional[str] = None,
+        invoice_id: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        summary: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of logs, newest first, plus the cursor for the next page
+        (None on the last page).
+        Keyset pagination on (timestamp, id): every page costs the same no
+        matter how far back it is. `since` is inclusive, `until` exclusive
+        (ISO timestamps). `summary` returns SUMMARY_COLUMNS straight from
+        the row instead of decoding the full payload JSON.
+        Raises ValueError for a malformed cursor.
+        """
+        where, params = [], []
+        if decision:
+            where.append('decision = ?')
+            params.append(decision.upper())
+        if vendor:
+            where.append('vendor = ?')  # NOCASE column
+            params.append(vendor)
+        if invoice_id:
+            where.append('invoice_id = ?')
+            params.append(invoice_id)
+        if since:
+            where.append('timestamp >= ?')
+            params.append(since)
+        if until:
+            where.append('timestamp < ?')
+            params.append(until)
+        if cursor:
+            where.append('(timestamp, id) < (?, ?)')
+            params.extend(decode_cursor(cursor))
+
+        columns = ", ".join(SUMMARY_COLUMNS) if summary else "id, timestamp, payload"
+        sql = f'SELECT {columns} FROM decisions'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY timestamp DESC, id DESC LIMIT ?'
+        params.append(limit + 1)  # one extra row tells us whether there is a next page
+
+        conn = self._connect()
         try:
-            cursor.execute('SELECT payload FROM decisions ORDER BY timestamp DESC LIMIT 50')
-            rows = cursor.fetchall()
-            for row in rows:
-                if row['payload']:
-                    logs.append(json.loads(row['payload']))
+            rows = conn.execute(sql, params).fetchall()
         except Exception as e:
-            print(f"Database Fetch Error: {e}")
-        finally:
-            conn.close()
-            
-        return logs
+            logger.error(f"❌ Database Fetch Error: {e}")
+            return [], None
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(last[SUMMARY_COLUMNS.index("timestamp")] if summary else last[1], last[0])
+
+        if summary:
+            return [dict(zip(SUMMARY_COLUMNS, row)) for row in rows], next_cursor
+        return [json.loads(payload) for _, _, payload in rows if payload], next_cursor
+
+    def iter_features(
+        self,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        vendor: Optional[str] = None,
+        chunk_size: int = 100_000,
+    ):
+        """
+        Stored FEATURE_COLUMNS rows (tuples in that order, NULL as None),
+        `chunk_size` at a time, oldest decision first. Unfiltered it reads
+        only the narrow decision_features table; filters join decisions
+        through its (vendor|timestamp, id) indexes, never its payloads.
+        """
+        names = ", ".join(f"f.{name}" for name, _ in FEATURE_COLUMNS)
+        where, params = [], []
+        if vendor:
+            where.append('d.vendor = ?')  # NOCASE column
+            params.append(vendor)
+        if since:
+            where.append('d.timestamp >= ?')
+            params.append(since)
+        if until:
+            where.append('d.timestamp < ?')
+            params.append(until)
+        sql = f'SELECT {names} FROM decision_features f'
+        if where:
+            sql += ' JOIN decisions d ON d.id = f.decision_id WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY f.decision_id'
+
+        rows = self._connect().execute(sql, params)
+        while True:
+            chunk = rows.fetchmany(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def count_decisions(self, since: Optional[str] = None, until: Optional[str] = None,
+                        vendor: Optional[str] = None) -> int:
+        where, params = [], []
+        if vendor:
+            where.append('vendor = ?')
+            params.append(vendor)
+        if since:
+            where.append('timestamp >= ?')
+            params.append(since)
+        if until:
+            where.append('timestamp < ?')
+            params.append(until)
+        sql = 'SELECT COUNT(*) FROM decisions'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        return self._connect().execute(sql, params).fetchone()[0]
 
 # Singleton instance for the app
 db = SQLiteDB()
@@ -121,3 +440,7 @@ class AIAnalysisResult(BaseModel):
     reasoning: str
     recommendation: str       # Primary actionable next step
     suggestions: List[Suggestion] = []  # Rich AI suggestions list
+    # (code, params) behind each suggestion; responses render the prose from these on demand
+    suggestion_codes: List[Tuple[str, Dict[str, Any]]] = Field(default=[], exclude=True)
+    # Security context the decision was made with; stored for replay, never serialised
+    security_context: Optional[Dict[str, Any]] = Field(default=None, exclude=True)
@@ -0,0 +1,90 @@
+from fastapi import HTTPException
+from backend.app.core.config import settings
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, Callable, Dict
+import asyncio
+import logging
+import math
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+class AdmissionController:
+    """
+    Runs blocking pipeline stages (PyPDF2, Tesseract, openpyxl, regex
+    extraction, SQLite) on a bounded thread pool so the event loop stays free
+    for other requests, /v1/health included.
+    At most `max_concurrency` jobs run at once and at most `max_queue` wait
+    for a slot; anything beyond that is turned away immediately with 429 and
+    a Retry-After estimated from the queue depth and recent job durations.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="pipeline")
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+        self._avg_seconds = 1.0  # EMA of job duration, seeds Retry-After
+
+    def retry_after(self) -> int:
+        waves = (self.queued + 1) / self.max_concurrency
+        return max(1, math.ceil(waves * self._avg_seconds))
+
+    @asynccontextmanager
+    async def slot(self):
+        if self._slots.locked() and self.queued >= self.max_queue:
+            self.rejected += 1
+            retry = self.retry_after()
+            logger.warning(f"🚦 Pipeline saturated ({self.in_flight} running, {self.queued} queued) - retry in {retry}s")
+            raise HTTPException(
+                429,
+                "Server busy: invoice pipeline queue is full. Please retry.",
+                headers={"Retry-After": str(retry)},
+            )
+
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+            self.in_flight -= 1
+            self._slots.release()
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Admit, then run func(*args, **kwargs) on the pipeline pool."""
+        async with self.slot():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, partial(func, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "avg_job_seconds": round(self._avg_seconds, 3),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+# Singleton
+admission = AdmissionController(
+    max_concurrency=settings.PIPELINE_WORKERS or os.cpu_count() or 1,
+    max_queue=settings.PIPELINE_MAX_QUEUE,
+)
@@ -0,0 +1,107 @@
+from backend.app.agents.decision import DecisionAgent, BATCH_COLUMNS
+from backend.app.schemas.ai import SQLiteDB, FEATURE_COLUMNS, db
+from backend.app.core.config import settings
+from typing import Any, Dict, Optional
+import numpy as np
+import argparse
+import logging
+import json
+import time
+
+logger = logging.getLogger(__name__)
+
+DECISIONS = ("APPROVED", "NEEDS_REVIEW", "REJECTED")
+
+def _columns(rows: list) -> Dict[str, np.ndarray]:
+    """evaluate_batch() columns from stored feature rows; NULLs take the BATCH_COLUMNS default."""
+    matrix = np.array(rows, dtype=np.float64)  # None -> nan
+    columns = {}
+    for i, (name, _) in enumerate(FEATURE_COLUMNS):
+        column = matrix[:, i]
+        missing = np.isnan(column)
+        if missing.any():
+            column = np.where(missing, float(BATCH_COLUMNS[name]), column)
+        columns[name] = column
+    return columns
+
+def _counts(decisions: np.ndarray) -> Dict[str, int]:
+    return {decision: int(np.count_nonzero(decisions == decision)) for decision in DECISIONS}
+
+def replay_decisions(
+    approve_threshold: float,
+    review_threshold: float,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    vendor: Optional[str] = None,
+    store: Optional[SQLiteDB] = None,
+    chunk_size: int = 100_000,
+) -> Dict[str, Any]:
+    """
+    What-if analysis for decision thresholds.
+    Streams the stored decision features (no OCR, no ERP, no payload
+    decoding) through DecisionAgent.evaluate_batch twice per chunk: with
+    the configured thresholds and with the proposed ones. Reports the
+    approve/review/reject counts of both, the change, and how many
+    invoices move between each pair of decisions. Decisions saved before
+    features were recorded can't be replayed and are counted as skipped.
+    """
+    store = store or db
+    agent = DecisionAgent()
+    started = time.perf_counter()
+
+    current = dict.fromkeys(DECISIONS, 0)
+    proposed = dict.fromkeys(DECISIONS, 0)
+    transitions: Dict[str, int] = {}
+    replayed = 0
+
+    for rows in store.iter_features(since=since, until=until, vendor=vendor, chunk_size=chunk_size):
+        columns = _columns(rows)
+        before = agent.evaluate_batch(columns)["decision"]
+        after = agent.evaluate_batch(columns, approve_threshold, review_threshold)["decision"]
+        replayed += len(rows)
+        for decision, count in _counts(before).items():
+            current[decision] += count
+        for decision, count in _counts(after).items():
+            proposed[decision] += count
+        moved = before != after
+        if moved.any():
+            pairs, counts = np.unique(np.char.add(np.char.add(before[moved].astype(str), "->"),
+                                                  after[moved].astype(str)), return_counts=True)
+            for pair, count in zip(pairs.tolist(), counts.tolist()):
+                transitions[pair] = transitions.get(pair, 0) + count
+
+    total = store.count_decisions(since=since, until=until, vendor=vendor)
+    seconds = time.perf_counter() - started
+    logger.info(f"🔁 Replayed {replayed} decisions in {seconds:.2f}s")
+    return {
+        "replayed": replayed,
+        "skipped_without_features": max(0, total - replayed),
+        "thresholds": {
+            "current": {"approve": settings.CONFIDENCE_THRESHOLD_APPROVED,
+                        "review": settings.CONFIDENCE_THRESHOLD_REVIEW},
+            "proposed": {"approve": approve_threshold, "review": review_threshold},
+        },
+        "current": current,
+        "proposed": proposed,
+        "change": {decision: proposed[decision] - current[decision] for decision in DECISIONS},
+        "transitions": dict(sorted(transitions.items())),
+        "seconds": round(seconds, 3),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay stored decisions with alternate thresholds")
+    parser.add_argument("--approve", type=float, required=True, help="proposed approve threshold")
+    parser.add_argument("--review", type=float, required=True, help="proposed review threshold")
+    parser.add_argument("--since", help="ISO timestamp, inclusive")
+    parser.add_argument("--until", help="ISO timestamp, exclusive")
+    parser.add_argument("--vendor")
+    parser.add_argument("--db", default="invoices.db", help="decision database")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    report = replay_decisions(args.approve, args.review, args.since, args.until, args.vendor,
+                              store=SQLiteDB(args.db, background_writes=False))
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
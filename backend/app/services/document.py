@@ -0,0 +1,277 @@
+from fastapi import HTTPException
+from backend.app.services.ocr import PDF_OCR_AVAILABLE, iter_ocr_pages
+from backend.app.services.text_cache import text_cache
+from backend.app.core.config import settings
+from functools import cached_property
+from typing import Dict, Any, Iterator, List, Optional
+import PyPDF2
+from itertools import islice
+import hashlib
+import io
+import logging
+
+# --- File Handling Imports ---
+try:
+    from PIL import Image
+    import pytesseract
+    import openpyxl
+    from docx import Document
+    OCR_AVAILABLE = True
+except ImportError:
+    OCR_AVAILABLE = False
+    pytesseract = None
+
+logger = logging.getLogger(__name__)
+
+def _iter_pdf_pages(doc: "DocumentContext", start: int = 0, method: Optional[str] = None) -> Iterator[str]:
+    """
+    Text layer page by page. Pages are held back only until the text is
+    known not to be "scanty"; if the whole layer stays under 50 chars the
+    OCR pages are streamed instead, exactly like the old all-at-once reader.
+    One chunk per page, so `start` (pages already read, by `method`)
+    resumes at that page without decoding the earlier ones again.
+    """
+    if start and method == "ocr":
+        # The text layer was already found scanty: straight to the remaining scanned pages
+        if OCR_AVAILABLE and PDF_OCR_AVAILABLE:
+            doc.method = "ocr"
+            try:
+                yield from iter_ocr_pages(doc.contents, first_page=start + 1)
+            except Exception as e:
+                logger.error(f"OCR failed: {e}")
+        return
+
+    doc.method = "text_layer"
+    held: List[str] = []
+    streaming = start > 0  # pages before `start` were yielded, so the layer isn't scanty
+    # Try PyPDF2 first (the handle is shared with metadata forensics)
+    try:
+        pdf_reader = doc.pdf_reader  # None (already logged) if the file doesn't parse
+        pages = pdf_reader.pages if pdf_reader is not None else []
+        for index in range(start, len(pages)):
+            page_text = pages[index].extract_text() + "\n"
+            if streaming:
+                yield page_text
+                continue
+            held.append(page_text)
+            if len("".join(held).strip()) >= 50:
+                streaming = True
+                yield from held
+                held = []
+    except Exception as e:
+        logger.warning(f"PyPDF2 failed: {e}")
+
+    if streaming:
+        return
+
+    # If PyPDF2 failed or returned little text, use OCR
+    if OCR_AVAILABLE and PDF_OCR_AVAILABLE:
+        logger.info("🔍 PDF text scanty - switching to OCR")
+        doc.method = "ocr"
+        try:
+            yield from iter_ocr_pages(doc.contents)
+        except Exception as e:
+            logger.error(f"OCR failed: {e}")
+        return
+
+    yield from held
+
+def _iter_xlsx_rows(file_contents: bytes, rows_per_chunk: int = 500) -> Iterator[str]:
+    """Sheet rows in bounded chunks; read-only mode keeps the workbook unloaded."""
+    wb = openpyxl.load_workbook(io.BytesIO(file_contents), read_only=True, data_only=True)
+    try:
+        for sheet in wb.sheetnames:
+            ws = wb[sheet]
+            rows: List[str] = []
+            for row in ws.iter_rows(values_only=True):
+                # Convert row cells to string and join
+                rows.append(" ".join([str(cell) for cell in row if cell is not None]) + "\n")
+                if len(rows) >= rows_per_chunk:
+                    yield "".join(rows)
+                    rows = []
+            if rows:
+                yield "".join(rows)
+    finally:
+        wb.close()
+
+def _decode_pages(doc: "DocumentContext", start: int = 0, method: Optional[str] = None) -> Iterator[str]:
+    """
+    Universal Text Extractor for PDF, Images, Excel, Word, and Text.
+    Yields the text page by page (PDF) or in row chunks (XLSX) so the
+    extractor can stop reading as soon as it has what it needs. Every chunk
+    ends on a line boundary. `doc.method` is set to the decoder used:
+    "text_layer", "ocr" or "native".
+    `start` skips chunks a cached entry already holds (PDF pages read with
+    `method`): PDFs resume at that page, XLSX re-reads and skips its rows
+    (cheap, read-only). Images, DOCX and text decode to a single chunk, so
+    any `start` means it is cached and they yield nothing.
+    """
+    file_contents = doc.contents
+    ext = doc.ext
+    doc.method = "native"
+    logger.info(f"📂 Extracting text from .{ext} file")
+
+    # ── 1. PDF HANDLING ──────────────────────────────────────────────────────
+    if ext == 'pdf':
+        yield from _iter_pdf_pages(doc, start, method)
+
+    # ── 2. IMAGE HANDLING (JPG, PNG, WEBP) ───────────────────────────────────
+    elif ext in ['jpg', 'jpeg', 'png', 'webp', 'bmp', 'tiff']:
+        doc.method = "ocr"
+        if start:
+            return  # single chunk, already cached
+        if not OCR_AVAILABLE:
+            raise HTTPException(400, "OCR libraries not installed. Cannot process images.")
+        try:
+            image = Image.open(io.BytesIO(file_contents))
+            text = pytesseract.image_to_string(image)
+        except Exception as e:
+            raise HTTPException(400, f"Image OCR failed: {str(e)}")
+        yield text
+
+    # ── 3. WORD DOCUMENTS (DOCX) ─────────────────────────────────────────────
+    elif ext == 'docx':
+        if start:
+            return  # single chunk, already cached
+        try:
+            docx_doc = Document(io.BytesIO(file_contents))
+            text = "\n".join([p.text for p in docx_doc.paragraphs])
+        except Exception as e:
+            raise HTTPException(400, f"DOCX read failed: {str(e)}")
+        yield text
+
+    # ── 4. EXCEL SPREADSHEETS (XLSX) ─────────────────────────────────────────
+    elif ext == 'xlsx':
+        try:
+            yield from islice(_iter_xlsx_rows(file_contents), start, None)
+        except Exception as e:
+            raise HTTPException(400, f"Excel read failed: {str(e)}")
+
+    # ── 5. PLAIN TEXT / CSV ──────────────────────────────────────────────────
+    elif ext in ['txt', 'csv', 'md', 'log']:
+        if start:
+            return  # single chunk, already cached
+        try:
+            text = file_contents.decode('utf-8', errors='ignore')
+        except Exception as e:
+            raise HTTPException(400, f"Text read failed: {str(e)}")
+        yield text
+
+    else:
+        raise HTTPException(400, f"Unsupported file extension: .{ext}")
+
+class DocumentContext:
+    """
+    One uploaded document, parsed at most once.
+    Every stage reads from here instead of re-opening the bytes:
+    - sha256: content address for the text cache (and file fingerprinting)
+    - pdf_reader: the single PyPDF2 handle, shared by text and metadata
+    - iter_text(): cached/streamed page text; pages read are kept in `pages`
+    - metadata: PDF document info for digital forensics
+    """
+
+    def __init__(self, contents: bytes, filename: str):
+        self.contents = contents
+        self.filename = filename
+        self.ext = filename.lower().split('.')[-1]
+        self.method: Optional[str] = None   # text_layer | ocr | native
+        self.cache_status: Optional[str] = None  # hit | miss | None (cache disabled)
+        self.pages: Optional[List[str]] = []  # None once the text outgrows TEXT_CACHE_MAX_ENTRY_MB
+        self.parse_error: Optional[str] = None
+        self._text_size = 0
+        self._cache_entry: Optional[Dict[str, Any]] = None
+
+    @property
+    def is_pdf(self) -> bool:
+        return self.ext == 'pdf' or self.contents[:5] == b'%PDF-'
+
+    @cached_property
+    def sha256(self) -> str:
+        return hashlib.sha256(self.contents).hexdigest()
+
+    @cached_property
+    def pdf_reader(self) -> Optional[PyPDF2.PdfReader]:
+        if not self.is_pdf:
+            return None
+        try:
+            return PyPDF2.PdfReader(io.BytesIO(self.contents))
+        except Exception as e:
+            self.parse_error = str(e)
+            logger.warning(f"PyPDF2 failed: {e}")
+            return None
+
+    @cached_property
+    def metadata(self) -> Dict[str, Any]:
+        """Document info dictionary for forensics; empty for non-PDFs."""
+        if self._cache_entry and self._cache_entry.get("metadata") is not None:
+            return self._cache_entry["metadata"]
+        try:
+            reader = self.pdf_reader
+            if reader is None or not reader.metadata:
+                return {}
+            return {key.strip('/'): str(value) for key, value in reader.metadata.items()}
+        except Exception:
+            return {}
+
+    def iter_text(self) -> Iterator[str]:
+        """
+        Page text behind the content-addressed text cache.
+        A cached document replays its pages without touching PyPDF2 or OCR.
+        If the cached entry was cut short by an early exit and the caller
+        reads past it, decoding resumes at the next page (PDF text layer or
+        OCR; earlier pages are not decoded again) and the entry is upgraded.
+        """
+        if not settings.TEXT_CACHE_ENABLED:
+            for page in _decode_pages(self):
+                self._keep(page)
+                yield page
+            return
+
+        cached = text_cache.get(self.sha256)
+        skip = 0
+        if cached:
+            self._cache_entry = cached
+            self.method = cached["method"]
+            self.cache_status = "hit"
+            for page in cached["pages"]:
+                self._keep(page)
+                yield page
+            if cached["complete"]:
+                return
+            skip = len(cached["pages"])
+        else:
+            self.cache_status = "miss"
+
+        decoded = _decode_pages(self, skip, self.method)
+        try:
+            for page in decoded:
+                self._keep(page)
+                yield page
+        except GeneratorExit:
+            # Early exit: keep what was read, later uploads stop at the same page
+            decoded.close()
+            if self.pages and len(self.pages) > skip:
+                self._store(complete=False)
+            raise
+        if self.pages is not None:
+            self._store(complete=True)
+
+    def text(self) -> str:
+        """Whole-document text (debugging, callers that need the raw string)."""
+        return "".join(self.iter_text())
+
+    def _keep(self, page: str):
+        if self.pages is None:
+            return
+        self.pages.append(page)
+        self._text_size += len(page)
+        if self._text_size > settings.TEXT_CACHE_MAX_ENTRY_MB * 1024 * 1024:
+            # Too big to cache; stop holding text so memory stays bounded
+            self.pages = None
+
+    def _store(self, complete: bool):
+        text_cache.put(self.sha256, self.pages, self.method, complete, metadata=self.metadata)
+
+def extract_text_from_file(file_contents: bytes, filename: str) -> str:
+    """Whole-document text for raw bytes."""
+    return DocumentContext(file_contents, filename).text()
@@ -0,0 +1,214 @@
+from backend.app.core.config import settings
+from typing import Any, Dict, Iterable, Optional
+import numpy as np
+import threading
+import sqlite3
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+
+_MASK64 = (1 << 64) - 1
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over SHA-256 fingerprints.
+    The fingerprints are already uniformly distributed, so the k bit
+    positions come straight from their first 16 bytes (double hashing)
+    instead of re-hashing. Bulk adds are vectorised with numpy.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(1, capacity)
+        self.size = max(64, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.count = 0
+
+    def _positions(self, digest: bytes) -> Iterable[int]:
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        return (((h1 + i * h2) & _MASK64) % self.size for i in range(self.hashes))
+
+    def add_many(self, digests: bytes):
+        """Add a run of concatenated 32-byte digests."""
+        words = np.frombuffer(digests, dtype="<u8").reshape(-1, 4)
+        h1, h2 = words[:, 0], words[:, 1] | np.uint64(1)
+        size = np.uint64(self.size)
+        for i in range(self.hashes):
+            pos = (h1 + np.uint64(i) * h2) % size  # uint64 wraps like the scalar & _MASK64
+            np.bitwise_or.at(self.bits, (pos >> np.uint64(3)).astype(np.intp),
+                             (np.uint8(1) << (pos & np.uint64(7)).astype(np.uint8)))
+        self.count += len(words)
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(digest))
+
+class DuplicateIndex:
+    """
+    Persistent store of invoice fingerprints (SecurityAgent.fingerprint).
+    - SQLite table with a UNIQUE fingerprint column: claim() is a single
+      INSERT OR IGNORE, so of two concurrent uploads of the same invoice
+      (threads or batch worker processes) exactly one gets through.
+      release() gives a claim back when the request that made it failed.
+    - In-memory Bloom filter in front of it: seen() answers "never seen"
+      from memory (no SQL, no lock), so a new invoice costs only claim()'s
+      insert, and answers "seen" for a re-upload with a read instead of the
+      write lock. claim() adds its own fingerprints to the filter. Those
+      claimed by other processes are folded in every `refresh_seconds` with
+      an id-range scan (rows get increasing ids); until then seen() may miss
+      them, which only means claim() is the one to find the duplicate.
+    The filter is warmed from the table at startup (warm()); until then
+    seen() answers False and claim() decides on its own.
+    """
+
+    def __init__(self, db_path: str = "fingerprints.db", capacity: int = 10_000_000, error_rate: float = 0.001,
+                 refresh_seconds: float = 2.0):
+        self.db_path = db_path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh_seconds = refresh_seconds
+        self.bloom: Optional[BloomFilter] = None
+        self._high_water = 0  # largest row id already in the filter
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()        # guards the filter and high-water mark
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self.counters = {"claims": 0, "duplicates": 0, "releases": 0, "bloom_negatives": 0, "db_lookups": 0}
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                id INTEGER PRIMARY KEY,            -- insertion order, for incremental filter refresh
+                fingerprint BLOB NOT NULL UNIQUE,  -- raw 32-byte SHA-256
+                invoice_id TEXT,
+                first_seen REAL NOT NULL
+            )
+        ''')
+        conn.commit()
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.counters[key] += 1
+
+    @staticmethod
+    def _fill(bloom: BloomFilter, conn: sqlite3.Connection, after_id: int, batch: int = 200_000) -> int:
+        """Add rows with id > after_id to the filter; returns the last id added."""
+        cursor = conn.execute('SELECT id, fingerprint FROM fingerprints WHERE id > ? ORDER BY id', (after_id,))
+        while True:
+            rows = cursor.fetchmany(batch)
+            if not rows:
+                return after_id
+            bloom.add_many(b"".join(fp for _, fp in rows))
+            after_id = rows[-1][0]
+
+    def _catch_up(self, conn: sqlite3.Connection):
+        """
+        Every `refresh_seconds`, fold rows added since the last refresh (any
+        process) into the filter. Lookups never wait for it: if another
+        thread is refreshing, they use the filter as it is.
+        """
+        now = time.monotonic()
+        if now < self._next_refresh or not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_refresh = now + self.refresh_seconds
+            self._high_water = self._fill(self.bloom, conn, self._high_water)
+        finally:
+            self._lock.release()
+
+    def warm(self):
+        """Build the Bloom filter from the table. Safe to run in a background thread."""
+        started = time.perf_counter()
+        conn = self._connect()
+        total = conn.execute('SELECT COUNT(*) FROM fingerprints').fetchone()[0]
+        # Leave head-room so the false-positive rate holds as the table grows
+        bloom = BloomFilter(max(self.capacity, total * 2), self.error_rate)
+        # Built off to the side: a half-filled filter would give false negatives
+        high_water = self._fill(bloom, conn, 0)
+        with self._lock:
+            self.bloom = bloom
+            self._high_water = self._fill(bloom, conn, high_water)
+            self._next_refresh = time.monotonic() + self.refresh_seconds
+        logger.info(f"🧮 Duplicate index warmed: {total} fingerprints in {time.perf_counter() - started:.1f}s "
+                    f"({self.bloom.bits.nbytes // (1024 * 1024)} MB filter)")
+
+    def seen(self, fingerprint: str) -> bool:
+        """
+        Read-only pre-check: has this fingerprint been claimed before?
+        False can be wrong (filter not warm, or claimed elsewhere since the
+        last refresh); claim() stays the authority.
+        """
+        if self.bloom is None:
+            return False
+        digest = bytes.fromhex(fingerprint)
+        conn = self._connect()
+        self._catch_up(conn)
+        if digest not in self.bloom:
+            self._count("bloom_negatives")
+            return False
+        self._count("db_lookups")
+        return conn.execute('SELECT 1 FROM fingerprints WHERE fingerprint = ?', (digest,)).fetchone() is not None
+
+    def claim(self, fingerprint: str, invoice_id: Optional[str] = None) -> bool:
+        """
+        Atomically record the fingerprint if absent.
+        True if this call recorded it (first sighting), False if it was
+        already on file (duplicate).
+        """
+        digest = bytes.fromhex(fingerprint)
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                'INSERT OR IGNORE INTO fingerprints (fingerprint, invoice_id, first_seen) VALUES (?, ?, ?)',
+                (digest, invoice_id, time.time())
+            )
+        self._count("claims")
+        # On file either way; don't wait for the next refresh to answer its re-upload
+        if self.bloom is not None:
+            with self._lock:
+                self.bloom.add_many(digest)
+        if cursor.rowcount == 0:
+            self._count("duplicates")
+            return False
+        return True
+
+    def release(self, fingerprint: str):
+        """
+        Drop a fingerprint claimed by a request that then failed, so its
+        retry isn't taken for a duplicate. The filter keeps the bits (it
+        can't remove), which only costs that fingerprint a SQLite lookup.
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM fingerprints WHERE fingerprint = ?', (bytes.fromhex(fingerprint),))
+        self._count("releases")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                **self.counters,
+                "bloom_ready": self.bloom is not None,
+                "bloom_entries": self.bloom.count if self.bloom else 0,
+                "bloom_capacity": self.bloom.capacity if self.bloom else 0,
+            }
+
+# Singleton
+duplicate_index = DuplicateIndex(
+    db_path=settings.DUPLICATE_DB_PATH,
+    capacity=settings.DUPLICATE_BLOOM_CAPACITY,
+    error_rate=settings.DUPLICATE_BLOOM_ERROR_RATE,
+    refresh_seconds=settings.DUPLICATE_BLOOM_REFRESH_SECONDS,
+)
@@ -0,0 +1,308 @@
+from backend.app.core.config import settings
+from backend.app.services.metrics import metrics
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import threading
+import asyncio
+import logging
+import time
+import httpx
+
+logger = logging.getLogger(__name__)
+
+class ERPUnavailable(Exception):
+    """Upstream ERP failed, timed out or is cut off by the circuit breaker."""
+
+class CircuitOpen(ERPUnavailable):
+    """Failing fast: the breaker is open."""
+
+class TTLCache:
+    """Bounded LRU of lookup results, each valid for its own TTL. Used from the client's event loop only."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def put(self, key: str, value: Any, ttl: float):
+        if ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; open fails
+    fast for `reset_seconds`, then half-open lets one trial call through:
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"🔌 ERP circuit open after {self.failures} failure(s); "
+                               f"failing fast for {self.reset_seconds:.0f}s")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+class AsyncERPClient:
+    """
+    Async client for the remote ERP (PO and vendor master lookups).
+    - One pooled httpx.AsyncClient (keep-alive connections, hard timeouts).
+    - Per-kind TTL caches; "not found" answers are cached briefly too.
+    - Singleflight: concurrent lookups of the same key share one upstream
+      call, so 50 invoices against one PO cost one request.
+    - Circuit breaker: after repeated failures calls fail fast with
+      ERPUnavailable instead of each waiting out the timeout.
+    Results use the same shapes as EnterpriseResourcePlanner.check_po /
+    validate_vendor. All state lives on the event loop the client is used
+    from; see ERPGateway for blocking callers.
+
+    Upstream contract:
+        GET /purchase-orders/{po_number} -> 200 {po_number, vendor, budget, status, created_date} | 404
+        GET /vendors/match?name=...      -> 200 {name, score, data: {...}} | 404
+    """
+
+    def __init__(self, base_url: str, timeout: float = 2.0, max_connections: int = 20,
+                 po_ttl: float = 300, vendor_ttl: float = 900, negative_ttl: float = 30,
+                 cache_entries: int = 50_000, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.ttl = {"po": po_ttl, "vendor": vendor_ttl}
+        self.negative_ttl = negative_ttl
+        self.cache = {"po": TTLCache(cache_entries), "vendor": TTLCache(cache_entries)}
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self._inflight: Dict[str, "asyncio.Future"] = {}
+        self._http: Optional[httpx.AsyncClient] = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _get(self, kind: str, path: str, params: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
+        """JSON body, or None on 404. Raises ERPUnavailable on anything else."""
+        if not self.breaker.allow():
+            raise CircuitOpen("circuit open")
+        started = time.perf_counter()
+        try:
+            # Overall deadline: httpx's timeout applies per phase (pool wait, connect, read)
+            response = await asyncio.wait_for(self._client().get(path, params=params), self.timeout)
+            if response.status_code == 404:
+                body = None
+            else:
+                response.raise_for_status()
+                body = response.json()
+        except (httpx.HTTPError, asyncio.TimeoutError, ValueError) as e:
+            self.breaker.record_failure()
+            reason = f"no answer within {self.timeout}s" if isinstance(e, asyncio.TimeoutError) else f"{type(e).__name__}: {e}"
+            raise ERPUnavailable(reason) from e
+        finally:
+            metrics.observe("invoice_erp_call_seconds", time.perf_counter() - started, kind=kind)
+        self.breaker.record_success()
+        return body
+
+    async def _fetch_and_cache(self, kind: str, cache_key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        value, found_upstream = await fetch()
+        self.cache[kind].put(cache_key, value, self.ttl[kind] if found_upstream else self.negative_ttl)
+        return value
+
+    def _finished(self, cache_key: str, task: "asyncio.Task"):
+        self._inflight.pop(cache_key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every waiter gave up
+
+    async def _lookup(self, kind: str, key: str, fetch: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """(result, source) where source is hit | coalesced | miss."""
+        cache_key = f"{kind}:{key}"
+        found, value = self.cache[kind].get(cache_key)
+        if found:
+            return value, "hit"
+        task = self._inflight.get(cache_key)
+        source = "coalesced"
+        if task is None:
+            # The upstream call is its own task: a caller giving up doesn't cancel it for the others
+            task = asyncio.ensure_future(self._fetch_and_cache(kind, cache_key, fetch))
+            task.add_done_callback(lambda done: self._finished(cache_key, done))
+            self._inflight[cache_key] = task
+            source = "miss"
+        return await asyncio.shield(task), source
+
+    async def check_po(self, po_number: str) -> Tuple[Dict[str, Any], str]:
+        key = po_number.strip().upper()
+
+        async def fetch():
+            body = await self._get("po", f"/purchase-orders/{key}")
+            if body is None:
+                return {"valid": False, "message": f"PO {key} not found in ERP."}, False
+            details = {k: body.get(k) for k in ("vendor", "budget", "status", "created_date")}
+            if details["status"] != "OPEN":
+                return {"valid": False, "message": f"PO {key} is {details['status']} (cannot accept invoices)."}, True
+            return {"valid": True, "message": "PO Validated successfully.", "details": details}, True
+
+        return await self._lookup("po", key, fetch)
+
+    async def validate_vendor(self, vendor_name: str) -> Tuple[Dict[str, Any], str]:
+        key = " ".join(vendor_name.lower().split())
+
+        async def fetch():
+            body = await self._get("vendor", "/vendors/match", params={"name": vendor_name})
+            if body is None:
+                return {"exists": False, "message": f"Vendor '{vendor_name}' not found in ERP Master Data."}, False
+            return {"exists": True, "data": body.get("data"), "name": body.get("name"), "score": body.get("score")}, True
+
+        return await self._lookup("vendor", key, fetch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "base_url": self.base_url,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "cached_pos": len(self.cache["po"]),
+            "cached_vendors": len(self.cache["vendor"]),
+            "in_flight": len(self._inflight),
+        }
+
+class ERPGateway:
+    """
+    What the pipeline calls for ERP lookups. Pipeline stages are blocking
+    code on worker threads, so with a remote ERP configured the async client
+    runs on one background event loop per process and callers block on the
+    result; every thread's lookups meet on that loop, which is what lets
+    singleflight and the caches work across concurrent requests.
+    Without ERP_BASE_URL lookups go to the in-process master data.
+    Upstream failures degrade to "not validated" answers (PO invalid,
+    vendor unknown) so invoices fall to review instead of erroring.
+    """
+
+    def __init__(self, client: Optional[AsyncERPClient] = None):
+        self.client = client
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def _event_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="erp-client", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def _call(self, kind: str, lookup: Callable[[], Awaitable[Tuple[Dict[str, Any], str]]],
+              unavailable: Dict[str, Any]) -> Dict[str, Any]:
+        future = asyncio.run_coroutine_threadsafe(lookup(), self._event_loop())
+        try:
+            # The client enforces its own timeout; this only guards against a wedged loop
+            result, source = future.result(timeout=self.client.timeout * 2 + 1)
+        except (ERPUnavailable, TimeoutError) as e:
+            future.cancel()
+            metrics.inc("invoice_erp_lookups_total", kind=kind, source="unavailable")
+            if not isinstance(e, CircuitOpen):  # the breaker already logged when it opened
+                logger.warning(f"⚠️ ERP {kind} lookup unavailable: {e}")
+            return {**unavailable, "erp_unavailable": True}
+        metrics.inc("invoice_erp_lookups_total", kind=kind, source=source)
+        return result
+
+    def check_po(self, po_number: str) -> Dict[str, Any]:
+        if not po_number:
+            return {"valid": False, "message": "No PO Number provided"}
+        if self.client is None:
+            from backend.app.services.erp_mock import erp_system
+            return erp_system.check_po(po_number)
+        return self._call("po", lambda: self.client.check_po(po_number),
+                          {"valid": False, "message": f"PO {po_number} could not be checked: ERP unavailable."})
+
+    def validate_vendor(self, vendor_name: str) -> Dict[str, Any]:
+        if not vendor_name:
+            return {"exists": False, "message": "No vendor name provided."}
+        if self.client is None:
+            from backend.app.services.erp_mock import erp_system
+            return erp_system.validate_vendor(vendor_name)
+        return self._call("vendor", lambda: self.client.validate_vendor(vendor_name),
+                          {"exists": False, "message": f"Vendor '{vendor_name}' could not be checked: ERP unavailable."})
+
+    def close(self):
+        if self._loop is None:
+            return
+        if self.client is not None:
+            asyncio.run_coroutine_threadsafe(self.client.close(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+    def stats(self) -> Dict[str, Any]:
+        if self.client is None:
+            return {"mode": "local"}
+        return {"mode": "remote", **self.client.stats()}
+
+metrics.describe("invoice_erp_lookups_total", "counter",
+                 "ERP lookups by kind (po, vendor) and source (hit, coalesced, miss, unavailable).")
+metrics.describe("invoice_erp_call_seconds", "histogram", "Upstream ERP request latency, by kind.")
+
+# Singleton
+erp_gateway = ERPGateway(
+    AsyncERPClient(
+        base_url=settings.ERP_BASE_URL,
+        timeout=settings.ERP_TIMEOUT_SECONDS,
+        max_connections=settings.ERP_MAX_CONNECTIONS,
+        po_ttl=settings.ERP_PO_CACHE_TTL,
+        vendor_ttl=settings.ERP_VENDOR_CACHE_TTL,
+        negative_ttl=settings.ERP_NEGATIVE_CACHE_TTL,
+        cache_entries=settings.ERP_CACHE_ENTRIES,
+        failure_threshold=settings.ERP_BREAKER_FAILURES,
+        reset_seconds=settings.ERP_BREAKER_RESET_SECONDS,
+    ) if settings.ERP_BASE_URL else None
+)
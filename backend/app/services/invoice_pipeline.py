@@ -0,0 +1,242 @@
+from fastapi import HTTPException
+from backend.app.schemas.ai import AIAnalysisResult
+from backend.app.agents.extractor import InvoiceParserAgent
+from backend.app.agents.security import SecurityAgent
+from backend.app.agents.decision import DecisionAgent
+from backend.app.services.erp_client import erp_gateway
+from backend.app.services.document import DocumentContext
+from backend.app.services.duplicate_index import duplicate_index
+from backend.app.services.near_duplicate import near_duplicate_index
+from backend.app.services.metrics import metrics
+from backend.app.core.config import settings
+from typing import Dict, Any, Iterable, Iterator, List
+import threading
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Agents are stateless, so one set per process is enough. This module is
+# deliberately free of vision imports so batch workers stay lightweight.
+extractor = InvoiceParserAgent()
+security = SecurityAgent()
+decision_engine = DecisionAgent()
+
+def _timed_pages(pages: Iterable[str], spent: List[float]) -> Iterator[str]:
+    """Pass pages through, adding the time spent producing them to spent[0]."""
+    iterator = iter(pages)
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                page = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                spent[0] += time.perf_counter() - started
+            yield page
+    finally:
+        close = getattr(iterator, "close", None)
+        if close:
+            close()
+
+def _claims_fingerprint(extracted_data: Dict[str, Any]) -> bool:
+    # No invoice number read: the fingerprint would match every other unreadable invoice
+    invoice_number = extracted_data.get('invoice_number')
+    return bool(invoice_number) and invoice_number != "UNK-000"
+
+def _check_duplicate(fingerprint: str, extracted_data: Dict[str, Any]) -> bool:
+    if not _claims_fingerprint(extracted_data):
+        return False
+    with metrics.timer("invoice_stage_seconds", stage="duplicate_lookup"):
+        return security.check_duplicate(fingerprint, invoice_id=extracted_data['invoice_number'])
+
+def release_duplicate_claim(extracted_data: Dict[str, Any], fingerprint: str, is_duplicate: bool):
+    """
+    Give back the fingerprint _check_duplicate claimed (and the entry
+    _near_duplicates recorded) for a request that failed before its decision
+    was saved; otherwise the retry would be rejected as a duplicate of the
+    failed attempt.
+    """
+    if is_duplicate:
+        return  # nothing was claimed by this request
+    try:
+        if _claims_fingerprint(extracted_data):
+            security.release_duplicate(fingerprint)
+        if _records_near_duplicate(extracted_data):
+            near_duplicate_index.discard(extracted_data)
+    except Exception as e:
+        logger.error(f"❌ Could not release duplicate fingerprint: {e}")
+
+def _records_near_duplicate(extracted_data: Dict[str, Any]) -> bool:
+    if not settings.NEAR_DUP_ENABLED:
+        return False
+    # Nothing identifying: every unreadable document would look alike
+    return extracted_data.get('invoice_number') not in (None, "", "UNK-000") or bool(extracted_data.get('amount'))
+
+def _near_duplicates(raw_text: str, extracted_data: Dict[str, Any], is_duplicate: bool) -> List[Dict[str, Any]]:
+    """Earlier invoices this one closely resembles (re-scans, edited copies)."""
+    if is_duplicate or not _records_near_duplicate(extracted_data):
+        return []  # exact duplicates are already caught; don't index the copy
+    with metrics.timer("invoice_stage_seconds", stage="near_duplicate_lookup"):
+        return near_duplicate_index.check_and_add(raw_text, extracted_data, settings.NEAR_DUP_THRESHOLD)
+
+def _verify_vendor(vendor_name: str) -> Dict[str, Any]:
+    with metrics.timer("invoice_stage_seconds", stage="vendor_lookup"):
+        return security.verify_vendor(vendor_name)
+
+def _decide(extracted_data: Dict[str, Any], security_context: Dict[str, Any]) -> AIAnalysisResult:
+    with metrics.timer("invoice_stage_seconds", stage="decision"):
+        result = decision_engine.evaluate(extracted_data, security_context, render=False)
+    metrics.inc("invoice_decisions_total", decision=result.decision)
+    result.security_context = security_context  # persisted with the decision for replay
+    return result
+
+def decision_record(result: AIAnalysisResult) -> Dict[str, Any]:
+    """
+    What is stored and sent back for a decision: the result with its
+    suggestions as codes + parameters ("suggestion_codes") instead of
+    rendered prose. api/responses.py turns it into the full or compact body.
+    """
+    record = result.dict(exclude={"suggestions"})
+    record["suggestion_codes"] = [{"code": code, "params": params} for code, params in result.suggestion_codes]
+    return record
+
+def analyze_text(raw_text: str) -> AIAnalysisResult:
+    """
+    Text pipeline: extraction -> duplicate & vendor checks -> decision.
+    Used by /v1/process-invoice.
+    """
+    with metrics.timer("invoice_stage_seconds", stage="extract"):
+        extracted_data = extractor.extract(raw_text)
+    if settings.LOG_PAYLOADS:
+        logger.info(f"💾 Extracted: {extracted_data}")
+
+    fingerprint = security.fingerprint(
+        vendor=extracted_data.get('vendor_name', ''),
+        inv_id=extracted_data.get('invoice_number', ''),
+        amount=extracted_data.get('amount', 0)
+    )
+    is_duplicate = _check_duplicate(fingerprint, extracted_data)
+    try:
+        near_duplicates = _near_duplicates(raw_text, extracted_data, is_duplicate)
+        vendor_trust = _verify_vendor(extracted_data.get('vendor_name', ''))
+
+        security_context = {
+            "is_duplicate": is_duplicate,
+            "near_duplicates": near_duplicates,
+            "vendor_status": vendor_trust.get('status'),
+            "vendor_score": vendor_trust.get('score'),
+            "fingerprint": fingerprint
+        }
+
+        return _decide(extracted_data, security_context)
+    except BaseException:
+        release_duplicate_claim(extracted_data, fingerprint, is_duplicate)
+        raise
+
+def analyze_file(doc: DocumentContext) -> AIAnalysisResult:
+    """
+    File pipeline: text extraction -> field extraction -> security, GST,
+    forensics, bank & ERP checks -> decision.
+    Used by /v1/process-invoice-file. The upload is parsed once; every stage
+    reads from the same DocumentContext.
+    """
+    # Universal Text Extraction, streamed straight into the parser.
+    # Reading and parsing interleave, so page reads are timed separately.
+    reading = [0.0]
+    started = time.perf_counter()
+    extracted_data, pages_read, stopped_early = extractor.extract_stream(
+        _timed_pages(doc.iter_text(), reading),
+        early_exit=settings.STREAM_EARLY_EXIT,
+    )
+    metrics.observe("invoice_text_extraction_seconds", reading[0],
+                    method=doc.method or "none", cache=doc.cache_status or "off")
+    metrics.observe("invoice_stage_seconds", time.perf_counter() - started - reading[0], stage="extract")
+
+    logger.info(f"📝 Read {pages_read} page(s) via {doc.method}{' (early exit)' if stopped_early else ''}")
+    if settings.LOG_PAYLOADS:
+        logger.info(f"💾 Extracted: {extracted_data}")
+
+    if extracted_data.get('amount', 0) == 0:
+        logger.warning("⚠️ Amount = 0 (unusual format)")
+
+    # Metadata for Forensics (same PDF handle as the text layer, or cached)
+    file_metadata = doc.metadata
+
+    # Security & ERP pipeline
+    fingerprint = security.fingerprint(
+        vendor=extracted_data.get('vendor_name', ''),
+        inv_id=extracted_data.get('invoice_number', ''),
+        amount=extracted_data.get('amount', 0)
+    )
+    is_duplicate = _check_duplicate(fingerprint, extracted_data)
+    try:
+        # Pages read so far (early exit reads the same leading pages on a re-scan)
+        near_duplicates = _near_duplicates("".join(doc.pages or []), extracted_data, is_duplicate)
+        vendor_trust = _verify_vendor(extracted_data.get('vendor_name', ''))
+
+        # New Validations
+        gst_validation = security.verify_gstin(extracted_data.get('gstin', ''))
+        digital_forensics = security.analyze_digital_footprint(file_metadata)
+
+        # Bank Verification (3-Way Match critical step)
+        bank_validation = security.verify_bank_details(vendor_trust.get('data'), extracted_data,
+                                                       master_unavailable=vendor_trust.get('status') == 'UNVERIFIED')
+
+        # ERP Validation
+        erp_check = {"valid": False, "message": "No PO found"}
+        if extracted_data.get('po_number'):
+            with metrics.timer("invoice_stage_seconds", stage="erp_lookup"):
+                erp_check = erp_gateway.check_po(extracted_data.get('po_number'))
+
+        security_context = {
+            "is_duplicate": is_duplicate,
+            "near_duplicates": near_duplicates,
+            "vendor_status": vendor_trust.get('status'),
+            "vendor_score": vendor_trust.get('score'),
+            "fingerprint": fingerprint,
+            "document_sha256": doc.sha256,
+            "erp_validation": erp_check,
+            "gst_validation": gst_validation,
+            "digital_forensics": digital_forensics,
+            "bank_validation": bank_validation
+        }
+
+        return _decide(extracted_data, security_context)
+    except BaseException:
+        release_duplicate_claim(extracted_data, fingerprint, is_duplicate)
+        raise
+
+def init_batch_worker():
+    """Process-pool initializer: each worker warms its own duplicate Bloom filter, as main.py does."""
+    threading.Thread(target=duplicate_index.warm, name="duplicate-warm", daemon=True).start()
+
+def process_batch_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Process-pool entry point for /v1/process-invoices-batch.
+    Takes {"filename", "contents"} or {"text"} and returns a plain dict so the
+    result pickles cleanly back to the API process. Never raises: failures are
+    reported per item so one bad document doesn't sink the batch.
+    Stage metrics recorded in the worker ride back under "metrics" for the
+    API process to replay.
+    """
+    with metrics.capture() as events:
+        outcome = _process_batch_item(item)
+    outcome["metrics"] = events
+    return outcome
+
+def _process_batch_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        if item.get("contents") is not None:
+            result = analyze_file(DocumentContext(item["contents"], item["filename"]))
+        else:
+            result = analyze_text(item["text"])
+        return {"status": "ok", "result": decision_record(result), "context": result.security_context}
+    except HTTPException as e:
+        metrics.inc("invoice_errors_total", endpoint="process-invoices-batch", error=f"http_{e.status_code}")
+        return {"status": "error", "status_code": e.status_code, "error": e.detail}
+    except Exception as e:
+        metrics.inc("invoice_errors_total", endpoint="process-invoices-batch", error=type(e).__name__)
+        logger.error(f"❌ Batch item failed: {e}", exc_info=True)
+        return {"status": "error", "status_code": 500, "error": f"Processing failed: {str(e)}"}
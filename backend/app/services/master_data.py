@@ -0,0 +1,367 @@
+from backend.app.services.vendor_index import VendorIndex
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import threading
+import sqlite3
+import logging
+import itertools
+import json
+import time
+import csv
+import sys
+import os
+
+logger = logging.getLogger(__name__)
+
+_NDJSON_CHUNK = 10_000  # lines per json.loads call
+
+class MasterDataError(ValueError):
+    """A master data file that can't be loaded (unreadable, wrong columns, too many bad rows)."""
+
+class VendorRecord:
+    __slots__ = ("name", "id", "payment_terms", "risk_score", "bank_account", "ifsc", "email")
+
+    def __init__(self, name: str, id: str, payment_terms: str, risk_score: int,
+                 bank_account: str, ifsc: str, email: str):
+        self.name = name
+        self.id = id
+        self.payment_terms = payment_terms
+        self.risk_score = risk_score
+        self.bank_account = bank_account
+        self.ifsc = ifsc
+        self.email = email
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The ERP 'data' payload (a fresh dict, so callers can't alter the shared record)."""
+        return {
+            "id": self.id,
+            "payment_terms": self.payment_terms,
+            "risk_score": self.risk_score,
+            "bank_account": self.bank_account,
+            "ifsc": self.ifsc,
+            "email": self.email,
+        }
+
+class PurchaseOrder:
+    __slots__ = ("po_number", "vendor", "budget", "status", "created_date")
+
+    def __init__(self, po_number: str, vendor: str, budget: float, status: str, created_date: str):
+        self.po_number = po_number
+        self.vendor = vendor
+        self.budget = budget
+        self.status = status
+        self.created_date = created_date
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "vendor": self.vendor,
+            "budget": self.budget,
+            "status": self.status,
+            "created_date": self.created_date,
+        }
+
+_intern = sys.intern
+
+# Builders run once per exported row, so fields are read inline rather than through helpers.
+# Only values that repeat across rows (terms, IFSC branches, statuses, dates, vendor names
+# referenced by POs) are interned; ids, accounts and emails are unique anyway.
+def _vendor_from_row(row: Dict[str, Any]) -> VendorRecord:
+    get = row.get
+    name = str(get("name") or "").strip()
+    if not name:
+        raise ValueError("missing name")
+    risk = int(float(get("risk_score") or 0))
+    if not 0 <= risk <= 100:
+        raise ValueError(f"risk_score {risk} outside 0-100")
+    return VendorRecord(
+        name=_intern(name),
+        id=str(get("id") or "").strip(),
+        payment_terms=_intern(str(get("payment_terms") or "").strip()),
+        risk_score=risk,
+        bank_account=str(get("bank_account") or "").strip(),
+        ifsc=_intern(str(get("ifsc") or "").strip().upper()),
+        email=str(get("email") or "").strip(),
+    )
+
+def _po_from_row(row: Dict[str, Any]) -> PurchaseOrder:
+    get = row.get
+    po_number = str(get("po_number") or "").strip().upper()
+    if not po_number:
+        raise ValueError("missing po_number")
+    budget = float(get("budget") or 0)
+    if budget < 0:
+        raise ValueError(f"negative budget {budget}")
+    status = str(get("status") or "").strip().upper()
+    if not status:
+        raise ValueError("missing status")
+    return PurchaseOrder(
+        po_number=po_number,
+        vendor=_intern(str(get("vendor") or "").strip()),
+        budget=budget,
+        status=_intern(status),
+        created_date=_intern(str(get("created_date") or "").strip()),
+    )
+
+# Other columns are optional (empty / 0 when absent)
+VENDOR_REQUIRED = ("name", "risk_score")
+PO_REQUIRED = ("po_number", "vendor", "status")
+
+def read_rows(path: str, table: str) -> Tuple[Tuple[str, ...], Iterator[Any]]:
+    """
+    (column names, row dicts) from a CSV, NDJSON (.ndjson / .jsonl) or SQLite
+    (.db / .sqlite, rows from `table`) export. NDJSON column names come from
+    the first object; a corrupt line comes through as a ValueError so it
+    counts as one bad row instead of failing the load.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        handle = open(path, newline="", encoding="utf-8-sig")
+        reader = csv.DictReader(handle)
+        columns = tuple(c.strip() for c in reader.fieldnames or ())
+        reader.fieldnames = list(columns)
+
+        def csv_rows():
+            with handle:
+                yield from reader
+        return columns, csv_rows()
+
+    if ext in (".ndjson", ".jsonl"):
+        handle = open(path, encoding="utf-8")
+        first = ""
+        for first in handle:
+            if first.strip():
+                break
+        try:
+            head = json.loads(first) if first.strip() else {}
+        except ValueError:
+            head = {}
+
+        def ndjson_rows():
+            with handle:
+                lines = iter(handle)
+                chunk = [first] if first.strip() else []
+                while True:
+                    chunk.extend(line for line in itertools.islice(lines, _NDJSON_CHUNK) if line.strip())
+                    if not chunk:
+                        return
+                    yield from _decode_lines(chunk)
+                    chunk = []
+        return tuple(head) if isinstance(head, dict) else (), ndjson_rows()
+
+    if ext in (".db", ".sqlite", ".sqlite3"):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        cursor = conn.execute(f"SELECT * FROM {table}")
+        columns = tuple(d[0] for d in cursor.description)
+
+        def sqlite_rows():
+            try:
+                for row in cursor:
+                    yield dict(zip(columns, row))
+            finally:
+                conn.close()
+        return columns, sqlite_rows()
+
+    raise MasterDataError(f"Unsupported master data format '{ext}' ({path})")
+
+def _decode_lines(lines: List[str]) -> List[Any]:
+    """Decode NDJSON lines with one json.loads per chunk; per line only if the chunk has a bad one."""
+    try:
+        decoded = json.loads("[" + ",".join(lines) + "]")
+        if len(decoded) == len(lines):
+            return decoded
+    except ValueError:
+        pass
+    rows: List[Any] = []
+    for line in lines:
+        try:
+            rows.append(json.loads(line))
+        except ValueError as e:
+            rows.append(e)
+    return rows
+
+def _load(rows: Iterable[Any], build: Callable[[Dict[str, Any]], Any], key: str,
+          label: str, max_invalid_ratio: float) -> Dict[str, Any]:
+    """Convert rows to records keyed by `key`; bad rows are counted and skipped, later duplicates win."""
+    records: Dict[str, Any] = {}
+    invalid: List[str] = []
+    total = 0
+    for total, row in enumerate(rows, start=1):
+        try:
+            if isinstance(row, Exception):
+                raise row
+            record = build(row)
+        except (TypeError, ValueError, AttributeError) as e:
+            invalid.append(f"row {total}: {e}")
+            continue
+        records[getattr(record, key)] = record
+    if invalid:
+        logger.warning(f"⚠️ {label}: skipped {len(invalid)} of {total} rows (first: {'; '.join(invalid[:3])})")
+    if total and len(invalid) > total * max_invalid_ratio:
+        raise MasterDataError(f"{label}: {len(invalid)} of {total} rows invalid")
+    return records
+
+class MasterData:
+    """One immutable snapshot of the vendor master and PO book, with its vendor match index."""
+
+    def __init__(self, vendors: Dict[str, VendorRecord], purchase_orders: Dict[str, PurchaseOrder], source: str,
+                 vendor_index: Optional[VendorIndex] = None):
+        self.vendors = vendors
+        self.purchase_orders = purchase_orders
+        self.vendor_index = vendor_index if vendor_index is not None else VendorIndex(vendors)
+        self.source = source
+        self.loaded_at = time.time()
+
+def _load_file(path: str, table: str, columns: Tuple[str, ...], build: Callable, key: str,
+               max_invalid_ratio: float) -> Dict[str, Any]:
+    try:
+        found, rows = read_rows(path, table)
+        missing = [c for c in columns if c not in found]
+        if missing:
+            raise MasterDataError(f"{path}: missing columns {', '.join(missing)}")
+        return _load(rows, build, key, path, max_invalid_ratio)
+    except (OSError, sqlite3.Error, csv.Error, UnicodeDecodeError) as e:
+        raise MasterDataError(f"{path}: {e}") from e
+
+class MasterDataStore:
+    """
+    Vendor master + PO book, loaded from ERP export files and hot-swapped.
+    - Formats: CSV, NDJSON or SQLite (tables `vendors` / `purchase_orders`),
+      one file per dataset. Without a file the built-in rows are used.
+    - reload() builds a complete new MasterData (records, vendor index) off
+      to the side and publishes it with one reference assignment. A dataset
+      whose file hasn't changed is carried over as is (an hourly PO export
+      doesn't rebuild the vendor index). Readers
+      take `store.current` once per lookup, so in-flight requests finish on
+      the snapshot they started with and never wait for a load.
+    - A load is refused (and the current data kept) if a file can't be read,
+      lacks required columns, has more than `max_invalid_ratio` bad rows, or
+      would shrink a dataset below `min_retained_ratio` of its current size
+      (a truncated export); force=True skips the shrink check.
+    - watch() polls the files' mtime/size and reloads on change. It runs in
+      every process that uses the store, batch workers included.
+    """
+
+    def __init__(self, vendor_path: str = "", po_path: str = "",
+                 default_vendors: Iterable[Dict[str, Any]] = (), default_pos: Iterable[Dict[str, Any]] = (),
+                 max_invalid_ratio: float = 0.01, min_retained_ratio: float = 0.5):
+        self.vendor_path = vendor_path
+        self.po_path = po_path
+        self.max_invalid_ratio = max_invalid_ratio
+        self.min_retained_ratio = min_retained_ratio
+        self._default_vendors = list(default_vendors)
+        self._default_pos = list(default_pos)
+        self._reload_lock = threading.Lock()  # one load at a time; readers never take it
+        self._watcher: Optional[threading.Thread] = None
+        self.reloads = {"ok": 0, "failed": 0, "unchanged": 0}
+        self.last_error: Optional[str] = None
+        self._seen = self._file_signature()  # file state of the last load attempt
+        self._loaded = (object(), object())   # file state the current snapshot was built from (nothing yet)
+        self.current = MasterData({}, {}, "empty")
+        try:
+            self.current = self._build(self._seen)
+            self._loaded = self._seen
+        except MasterDataError as e:
+            # Start empty rather than on stale demo rows: every vendor is NEW, every PO unknown
+            logger.error(f"❌ Master data not loaded, starting empty: {e}")
+            self.last_error = str(e)
+
+    def _file_signature(self) -> Tuple:
+        signature = []
+        for path in (self.vendor_path, self.po_path):
+            try:
+                st = os.stat(path) if path else None
+                signature.append((st.st_mtime_ns, st.st_size) if st else None)
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _build(self, signature: Tuple, full: bool = True) -> MasterData:
+        """New snapshot; unless `full`, datasets whose file is unchanged since the last load are reused."""
+        started = time.perf_counter()
+        old = self.current
+        reuse_vendors = not full and signature[0] == self._loaded[0]
+        reuse_pos = not full and signature[1] == self._loaded[1]
+        if reuse_vendors:
+            vendors = old.vendors
+        elif self.vendor_path:
+            vendors = _load_file(self.vendor_path, "vendors", VENDOR_REQUIRED, _vendor_from_row, "name",
+                                 self.max_invalid_ratio)
+        else:
+            vendors = _load(self._default_vendors, _vendor_from_row, "name", "vendors", 0.0)
+        if reuse_pos:
+            pos = old.purchase_orders
+        elif self.po_path:
+            pos = _load_file(self.po_path, "purchase_orders", PO_REQUIRED, _po_from_row, "po_number",
+                             self.max_invalid_ratio)
+        else:
+            pos = _load(self._default_pos, _po_from_row, "po_number", "purchase orders", 0.0)
+        source = " + ".join(p for p in (self.vendor_path, self.po_path) if p) or "built-in"
+        data = MasterData(vendors, pos, source, vendor_index=old.vendor_index if reuse_vendors else None)
+        logger.info(f"📇 Master data loaded from {source}: {len(vendors)} vendors, {len(pos)} POs "
+                    f"in {time.perf_counter() - started:.1f}s")
+        return data
+
+    def _check_shrink(self, new: MasterData):
+        old = self.current
+        for label, before, after in (("vendors", len(old.vendors), len(new.vendors)),
+                                     ("purchase orders", len(old.purchase_orders), len(new.purchase_orders))):
+            if after < before * self.min_retained_ratio:
+                raise MasterDataError(f"{label} would drop from {before} to {after}; reload with force to accept")
+
+    def reload(self, force: bool = False, only_if_changed: bool = False) -> Dict[str, Any]:
+        """
+        Load the files and swap them in. Raises MasterDataError (current data
+        untouched) on a bad load. only_if_changed (the watcher) skips files
+        already tried and re-reads only the dataset that changed.
+        """
+        with self._reload_lock:
+            signature = self._file_signature()
+            if only_if_changed and signature == self._seen:
+                self.reloads["unchanged"] += 1
+                return self.stats()
+            # Don't retry the same broken files every poll; the next change triggers another attempt
+            self._seen = signature
+            try:
+                data = self._build(signature, full=not only_if_changed)
+                if not force:
+                    self._check_shrink(data)
+            except MasterDataError as e:
+                self.reloads["failed"] += 1
+                self.last_error = str(e)
+                logger.error(f"❌ Master data reload refused: {e}")
+                raise
+            self.current = data
+            self._loaded = signature
+            self.reloads["ok"] += 1
+            self.last_error = None
+            return self.stats()
+
+    def _poll(self, interval: float):
+        while True:
+            time.sleep(interval)
+            if self._file_signature() == self._seen:
+                continue
+            try:
+                self.reload(only_if_changed=True)
+            except MasterDataError:
+                pass  # already logged; keep serving the previous snapshot
+            except Exception as e:
+                logger.error(f"❌ Master data watcher error: {e}", exc_info=True)
+
+    def watch(self, interval: float):
+        """Start the background file watcher (no-op without files or when already running)."""
+        if interval <= 0 or self._watcher is not None or not (self.vendor_path or self.po_path):
+            return
+        self._watcher = threading.Thread(target=self._poll, args=(interval,), name="master-data-watch", daemon=True)
+        self._watcher.start()
+
+    def stats(self) -> Dict[str, Any]:
+        data = self.current
+        return {
+            "source": data.source,
+            "vendors": len(data.vendors),
+            "purchase_orders": len(data.purchase_orders),
+            "loaded_at": data.loaded_at,
+            "reloads": dict(self.reloads),
+            "last_error": self.last_error,
+            "watching": self._watcher is not None,
+        }
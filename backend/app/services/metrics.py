@@ -0,0 +1,149 @@
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import threading
+import bisect
+import time
+
+# Latency buckets (seconds): sub-ms regex work up to multi-page OCR
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and histograms rendered as Prometheus text
+    (served by /v1/metrics). Thread-safe; label sets are created on first use.
+    Batch workers live in other processes, so they record inside `capture()`
+    and the API process `replay()`s the events it gets back with each result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._meta: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, List[float]]] = {}  # bucket counts + [overflow, sum, count]
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._local = threading.local()
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self._meta[name] = (kind, help_text)
+        if kind == "histogram":
+            self._buckets[name] = buckets
+            self._histograms.setdefault(name, {})
+        elif kind == "counter":
+            self._counters.setdefault(name, {})
+        else:
+            self._gauges.setdefault(name, {})
+
+    def _captured(self, event: tuple) -> bool:
+        events = getattr(self._local, "events", None)
+        if events is None:
+            return False
+        events.append(event)
+        return True
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        if self._captured(("inc", name, value, labels)):
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        """Gauge value, or a counter mirrored from a component that keeps its own tally."""
+        store = self._counters if self._meta.get(name, ("gauge",))[0] == "counter" else self._gauges
+        with self._lock:
+            store.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        if self._captured(("observe", name, seconds, labels)):
+            return
+        key = _label_key(labels)
+        buckets = self._buckets.get(name, DEFAULT_BUCKETS)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                counts = series[key] = [0.0] * (len(buckets) + 3)
+            # Stored per bucket, made cumulative at render time; past the last
+            # bound, bisect lands on the overflow slot (only counted in +Inf)
+            counts[bisect.bisect_left(buckets, seconds)] += 1
+            counts[-2] += seconds
+            counts[-1] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @contextmanager
+    def capture(self) -> Iterator[List[tuple]]:
+        """Buffer this thread's inc/observe calls instead of recording them."""
+        previous = getattr(self._local, "events", None)
+        self._local.events = events = []
+        try:
+            yield events
+        finally:
+            self._local.events = previous
+
+    def replay(self, events: List[tuple]):
+        for kind, name, value, labels in events:
+            getattr(self, kind)(name, value, **labels)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for name, (kind, help_text) in self._meta.items():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "histogram":
+                    buckets = self._buckets[name]
+                    for key, counts in self._histograms[name].items():
+                        running = 0.0
+                        for bound, n in zip(buckets, counts):
+                            running += n
+                            lines.append(f"{name}_bucket{_format_labels(key, ('le', repr(bound)))} {_format_value(running)}")
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {_format_value(counts[-1])}")
+                        lines.append(f"{name}_sum{_format_labels(key)} {repr(counts[-2])}")
+                        lines.append(f"{name}_count{_format_labels(key)} {_format_value(counts[-1])}")
+                else:
+                    series = self._counters[name] if kind == "counter" else self._gauges[name]
+                    for key, value in series.items():
+                        lines.append(f"{name}{_format_labels(key)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+# Singleton
+metrics = MetricsRegistry()
+
+metrics.describe("invoice_stage_seconds", "histogram",
+                 "Pipeline stage latency (extract, duplicate_lookup, vendor_lookup, erp_lookup, decision, db_write).")
+metrics.describe("invoice_text_extraction_seconds", "histogram",
+                 "Time spent reading document text, by method (text_layer, ocr, native) and cache status.")
+metrics.describe("invoice_ocr_page_seconds", "histogram", "Render + Tesseract time per scanned page.")
+metrics.describe("invoice_ocr_pages_total", "counter", "Scanned pages OCR'd.")
+metrics.describe("invoice_request_seconds", "histogram", "End-to-end request latency by endpoint.")
+metrics.describe("invoice_decisions_total", "counter", "Decisions made, by outcome.")
+metrics.describe("invoice_errors_total", "counter", "Failed documents, by endpoint and error class.")
+metrics.describe("invoice_pipeline_jobs", "gauge", "Single-document jobs running or queued on the pipeline pool.")
+metrics.describe("invoice_db_pending_writes", "gauge", "Decisions queued for the background SQLite writer.")
+metrics.describe("invoice_text_cache_events_total", "counter", "Text cache hits, misses, stores and evictions.")
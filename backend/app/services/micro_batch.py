@@ -0,0 +1,122 @@
+from backend.app.services.metrics import metrics
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+import logging
+import queue
+import time
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+class MicroBatcher:
+    """
+    Collects work submitted from many threads into micro-batches and runs
+    `handler(items) -> results` (one result per item, same order) once per
+    batch on a single scheduler thread.
+    A batch closes when it holds `max_batch` items or `max_wait_ms` after
+    its first item arrived, whichever comes first, so a lone request waits
+    at most `max_wait_ms` and a busy one shares a model call with its
+    neighbours. submit() returns a Future for that item's own result; a
+    handler exception fails every item of its batch.
+    """
+
+    def __init__(self, handler: Callable[[List[Any]], List[Any]], max_batch: int, max_wait_ms: float,
+                 name: str = "micro-batch"):
+        self.handler = handler
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.batches = 0
+        self.items = 0
+        self.last_batch_size = 0
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"{self.name} is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._queue.put((item, future))
+        return future
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def _collect(self) -> Tuple[List[Tuple[Any, Future]], bool]:
+        first = self._queue.get()
+        if first is _STOP:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                self._queue.put(_STOP)  # finish this batch, stop on the next pass
+                break
+            batch.append(entry)
+        return batch, False
+
+    def _run(self):
+        while True:
+            batch, stopping = self._collect()
+            if stopping:
+                return
+            # Callers that gave up (cancelled futures) don't take a slot in the model call
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            self.last_batch_size = len(batch)
+            metrics.observe("inference_batch_size", len(batch), scheduler=self.name)
+            try:
+                with metrics.timer("inference_batch_seconds", scheduler=self.name):
+                    results = self.handler([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name} handler returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                logger.error(f"❌ {self.name} batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "last_batch_size": self.last_batch_size,
+        }
+
+    def close(self):
+        """Run what is already queued, then stop the scheduler thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(_STOP)
+        if thread is not None:
+            thread.join()
+
+metrics.describe("inference_batch_size", "histogram", "Items per batched model call, by scheduler.",
+                 buckets=(1, 2, 4, 8, 16, 32, 64))
+metrics.describe("inference_batch_seconds", "histogram", "Batched model call latency, by scheduler.")
@@ -0,0 +1,119 @@
+from backend.app.core.config import settings
+from backend.app.services.metrics import metrics
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from collections import deque
+from typing import Deque, Dict, Any, Iterator, Optional, Tuple
+import logging
+import math
+import os
+import re
+import tempfile
+import time
+
+# --- OCR Imports ---
+try:
+    import pytesseract
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    PDF_OCR_AVAILABLE = True
+except ImportError:
+    PDF_OCR_AVAILABLE = False
+
+# Pages are recognised in parallel, so each tesseract process should stay
+# single-threaded instead of oversubscribing the cores.
+os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE_RE = re.compile(r"([\d.]+)\s*x\s*([\d.]+)\s*pts")
+_LETTER_PTS = (612.0, 792.0)
+
+# Shared across requests; poppler and tesseract both run as subprocesses,
+# so threads are enough to keep every core busy.
+_ocr_pool: Optional[ThreadPoolExecutor] = None
+
+def _worker_count() -> int:
+    return settings.OCR_WORKERS or os.cpu_count() or 1
+
+def get_ocr_pool() -> ThreadPoolExecutor:
+    global _ocr_pool
+    if _ocr_pool is None:
+        _ocr_pool = ThreadPoolExecutor(max_workers=_worker_count(), thread_name_prefix="ocr")
+    return _ocr_pool
+
+def _page_size_pts(info: Dict[str, Any]) -> Tuple[float, float]:
+    """First page size from pdfinfo ("612 x 792 pts (letter)"), letter if unknown."""
+    m = _PAGE_SIZE_RE.search(str(info.get("Page size", "")))
+    return (float(m.group(1)), float(m.group(2))) if m else _LETTER_PTS
+
+def _page_bytes(width_pts: float, height_pts: float, dpi: int) -> int:
+    # 8-bit grayscale raster, x2 for the copy pytesseract writes out
+    return int(width_pts / 72 * dpi) * int(height_pts / 72 * dpi) * 2
+
+def plan_ocr(info: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    (dpi, pages_in_flight) that keep one request's rendered pages under
+    OCR_MEMORY_LIMIT_MB. DPI is only lowered when a single page would not
+    fit on its own.
+    """
+    width, height = _page_size_pts(info)
+    dpi = settings.OCR_DPI
+    budget = settings.OCR_MEMORY_LIMIT_MB * 1024 * 1024
+    per_page = _page_bytes(width, height, dpi)
+    if per_page > budget:
+        dpi = max(72, int(dpi * math.sqrt(budget / per_page)))
+        logger.warning(f"⚠️ Page too large for OCR memory limit - rendering at {dpi} DPI")
+        per_page = _page_bytes(width, height, dpi)
+    return dpi, max(1, min(_worker_count(), budget // per_page))
+
+def _ocr_page(path: str, page_no: int, dpi: int) -> Tuple[str, float]:
+    """(page text, seconds spent rendering and recognising it)"""
+    started = time.perf_counter()
+    images = convert_from_path(path, dpi=dpi, first_page=page_no, last_page=page_no, grayscale=True)
+    try:
+        return "".join(pytesseract.image_to_string(img) + "\n" for img in images), time.perf_counter() - started
+    finally:
+        for img in images:
+            img.close()
+
+def iter_ocr_pages(file_contents: bytes, first_page: int = 1) -> Iterator[str]:
+    """
+    OCR a scanned PDF one page at a time, in page order.
+    Pages are rendered and recognised in parallel on the shared OCR pool,
+    but only as many as the memory plan allows are in flight at once, and
+    at most OCR_MAX_PAGES are read. Closing the generator early (extractor
+    early exit) cancels the pages not yet started. `first_page` (1-based)
+    resumes a document whose earlier pages are already known.
+    """
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    pending: Deque[Future] = deque()
+    try:
+        # Written once; every page render reads the same file
+        with os.fdopen(fd, "wb") as f:
+            f.write(file_contents)
+
+        info = pdfinfo_from_path(path)
+        total = int(info.get("Pages", 0))
+        pages = min(total, settings.OCR_MAX_PAGES) if settings.OCR_MAX_PAGES else total
+        if pages < total:
+            logger.warning(f"⚠️ OCR capped at {pages} of {total} pages")
+
+        dpi, in_flight = plan_ocr(info)
+        logger.info(f"🔍 OCR {max(0, pages - first_page + 1)} page(s) at {dpi} DPI, {in_flight} in parallel")
+
+        pool = get_ocr_pool()
+        next_page = first_page
+        while next_page <= pages or pending:
+            while next_page <= pages and len(pending) < in_flight:
+                pending.append(pool.submit(_ocr_page, path, next_page, dpi))
+                next_page += 1
+            text, seconds = pending.popleft().result()
+            # Recorded on the consuming thread so batch workers can capture it
+            metrics.observe("invoice_ocr_page_seconds", seconds)
+            metrics.inc("invoice_ocr_pages_total")
+            yield text
+    finally:
+        for future in pending:
+            future.cancel()
+        # Let pages already rendering finish before their input disappears
+        wait(pending)
+        os.unlink(path)
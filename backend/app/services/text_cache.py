@@ -0,0 +1,218 @@
+from backend.app.core.config import settings
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+import threading
+import sqlite3
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Eviction frees this fraction of the disk limit, and the size estimate is
+# re-counted after this process writes as much (other workers share the file)
+_DISK_HEADROOM = 0.1
+
+class TextCache:
+    """
+    Content-addressed cache for extracted document text.
+    Keyed by the SHA-256 of the uploaded bytes, so a re-upload of the same
+    PDF skips PyPDF2/OCR entirely.
+    - Tier 1: in-process LRU, bounded by total text size.
+    - Tier 2: SQLite file shared by all workers, evicted oldest-access-first
+      once it grows past its size limit. The size is a running estimate
+      (startup total plus this process's writes), re-counted only when it
+      passes the limit or after a tenth of the limit has been written.
+    Entries hold the page chunks, the method used ("text_layer", "ocr",
+    "native"), the PDF metadata used by forensics, and whether the whole
+    document was read (early exit stores only the pages that were needed).
+    """
+
+    def __init__(self, db_path: str = "text_cache.db", memory_mb: int = 64, disk_mb: int = 1024):
+        self.db_path = db_path
+        self.memory_limit = memory_mb * 1024 * 1024
+        self.disk_limit = disk_mb * 1024 * 1024
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._memory_size = 0
+        self._disk_size = 0   # estimated total of text_cache.size
+        self._unsynced = 0    # bytes this process wrote since _disk_size was counted
+        self._lock = threading.Lock()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS text_cache (
+                    digest TEXT PRIMARY KEY,
+                    method TEXT,
+                    complete INTEGER NOT NULL,
+                    pages TEXT NOT NULL,   -- JSON list of page chunks
+                    metadata TEXT,         -- JSON PDF document info (forensics)
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_text_cache_access ON text_cache(last_access)')
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(text_cache)')}
+            if 'metadata' not in columns:
+                conn.execute('ALTER TABLE text_cache ADD COLUMN metadata TEXT')
+            conn.commit()
+            self._disk_size = self._disk_total(conn)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _entry_size(pages: List[str]) -> int:
+        return sum(len(p) for p in pages)
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.counters[key] += n
+
+    def _remember(self, digest: str, entry: Dict[str, Any]):
+        """Insert into the LRU tier, dropping least-recently-used entries over the limit."""
+        if entry["size"] > self.memory_limit:
+            return
+        with self._lock:
+            old = self._memory.pop(digest, None)
+            if old:
+                self._memory_size -= old["size"]
+            self._memory[digest] = entry
+            self._memory_size += entry["size"]
+            while self._memory_size > self.memory_limit:
+                _, dropped = self._memory.popitem(last=False)
+                self._memory_size -= dropped["size"]
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._memory.get(digest)
+            if entry:
+                self._memory.move_to_end(digest)
+                self.counters["memory_hits"] += 1
+                return entry
+
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                'SELECT method, complete, pages, size, metadata FROM text_cache WHERE digest = ?', (digest,)
+            ).fetchone()
+            if row:
+                conn.execute('UPDATE text_cache SET last_access = ? WHERE digest = ?', (time.time(), digest))
+                conn.commit()
+        except Exception as e:
+            logger.warning(f"Text cache read failed: {e}")
+            row = None
+        finally:
+            conn.close()
+
+        if not row:
+            self._count("misses")
+            return None
+
+        entry = {
+            "method": row[0],
+            "complete": bool(row[1]),
+            "pages": json.loads(row[2]),
+            "size": row[3],
+            "metadata": json.loads(row[4]) if row[4] else None,
+        }
+        self._remember(digest, entry)
+        self._count("disk_hits")
+        return entry
+
+    def put(
+        self,
+        digest: str,
+        pages: List[str],
+        method: Optional[str],
+        complete: bool,
+        metadata: Optional[Dict[str, Any]] = None,
+    ):
+        entry = {
+            "method": method,
+            "complete": complete,
+            "pages": list(pages),
+            "size": self._entry_size(pages),
+            "metadata": metadata,
+        }
+        self._remember(digest, entry)
+
+        conn = self._connect()
+        try:
+            conn.execute('''
+                INSERT OR REPLACE INTO text_cache (digest, method, complete, pages, metadata, size, last_access)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                digest, method, int(complete), json.dumps(entry["pages"]),
+                json.dumps(metadata) if metadata is not None else None,
+                entry["size"], time.time()
+            ))
+            evicted = self._evict(conn, entry["size"])
+            conn.commit()
+        except Exception as e:
+            logger.warning(f"Text cache write failed: {e}")
+            return
+        finally:
+            conn.close()
+
+        self._count("stores")
+        if evicted:
+            self._count("evictions", evicted)
+
+    @staticmethod
+    def _disk_total(conn: sqlite3.Connection) -> int:
+        return conn.execute('SELECT COALESCE(SUM(size), 0) FROM text_cache').fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection, added: int) -> int:
+        """
+        Account for `added` bytes. Once the disk tier may be over its limit,
+        count it (one scan) and delete oldest-accessed rows until it is
+        back under the limit with headroom to spare.
+        """
+        headroom = int(self.disk_limit * _DISK_HEADROOM)
+        with self._lock:
+            self._disk_size += added
+            self._unsynced += added
+            if self._disk_size <= self.disk_limit and self._unsynced <= headroom:
+                return 0
+            self._unsynced = 0
+        total = self._disk_total(conn)
+        evicted = 0
+        if total > self.disk_limit:
+            target = self.disk_limit - headroom
+            while total > target:
+                oldest = conn.execute('SELECT digest, size FROM text_cache ORDER BY last_access LIMIT 64').fetchall()
+                if not oldest:
+                    break
+                for digest, size in oldest:
+                    conn.execute('DELETE FROM text_cache WHERE digest = ?', (digest,))
+                    total -= size
+                    evicted += 1
+                    if total <= target:
+                        break
+        with self._lock:
+            self._disk_size = total
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            return {
+                **self.counters,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+            }
+
+# Singleton
+text_cache = TextCache(
+    db_path=settings.TEXT_CACHE_PATH,
+    memory_mb=settings.TEXT_CACHE_MEMORY_MB,
+    disk_mb=settings.TEXT_CACHE_DISK_MB,
+)
@@ -0,0 +1,170 @@
+from collections import defaultdict
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+import math
+import re
+
+_NON_ALNUM_RE = re.compile(r"[^0-9a-z&]+")
+
+# Spelling variants of legal forms, so "Zomato Ltd" meets "Zomato Limited"
+_TOKEN_ALIASES = {
+    "ltd": "limited", "pvt": "private", "co": "company", "corp": "corporation",
+    "inc": "incorporated", "llc": "limited", "&": "and",
+}
+_ALIAS_RE = re.compile(r"\b(?:ltd|pvt|co|corp|inc|llc)\b|&")
+# Spelled-out legal forms: they say nothing about which vendor it is
+_LEGAL_FORMS = frozenset({"limited", "private", "company", "corporation", "incorporated"})
+
+def _alias(match: "re.Match") -> str:
+    return f" {_TOKEN_ALIASES[match.group()]} "
+
+def normalise_vendor(name: str) -> str:
+    """Lower-case [0-9a-z] tokens separated by single spaces, legal forms spelled out."""
+    return " ".join(_ALIAS_RE.sub(_alias, _NON_ALNUM_RE.sub(" ", name.lower())).split())
+
+def core_name(normalised: str) -> str:
+    """Normalised name without its legal forms ("globex incorporated" -> "globex")."""
+    return " ".join(t for t in normalised.split() if t not in _LEGAL_FORMS)
+
+def _pad(normalised: str) -> str:
+    return f"  {normalised} "
+
+def trigrams(normalised: str) -> Set[str]:
+    padded = _pad(normalised)
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def _gram_code(gram: str) -> int:
+    # Normalised text is ASCII, so a trigram packs into 24 bits
+    return (ord(gram[0]) << 16) | (ord(gram[1]) << 8) | ord(gram[2])
+
+class VendorIndex:
+    """
+    Prebuilt lookup structure over vendor master names.
+    - exact: normalised name -> entry
+    - tokens / grams below index the core name (legal forms dropped), so
+      "Globex Corporation" meets "Globex Inc" and a bare "Ltd" or "Corp"
+      matches nothing
+    - tokens: inverted index token -> entries, with IDF weights
+    - grams: inverted index trigram -> entries, as sorted numpy arrays
+      (CSR layout, built in one vectorised pass)
+    lookup() gathers candidates from the postings of the query's trigrams
+    and tokens (postings longer than `max_posting` are skipped: grams like
+    "lim" say nothing), keeps the `shortlist` with most shared trigrams and
+    scores those:
+        score = 0.5 * trigram Dice + 0.5 * IDF-weighted token containment
+    (containment in either direction, so "Flipkart" still finds "Flipkart
+    India Private Limited"). Cost depends on posting lengths, not on the
+    size of the master.
+    """
+
+    def __init__(self, names: Iterable[str], max_posting: int = 5000, shortlist: int = 64):
+        self.max_posting = max_posting
+        self.shortlist = shortlist
+        self.names: List[str] = []
+        self._tokens: List[Tuple[str, ...]] = []
+        self._exact: Dict[str, int] = {}
+        token_postings: Dict[str, List[int]] = defaultdict(list)
+        padded: List[str] = []
+
+        for name in names:
+            norm = normalise_vendor(name)
+            if not norm or norm in self._exact:
+                continue
+            entry = len(self.names)
+            self.names.append(name)
+            self._exact[norm] = entry
+            core = core_name(norm) or norm  # a name that is all legal form is still indexed
+            tokens = tuple(dict.fromkeys(core.split()))
+            self._tokens.append(tokens)
+            for token in tokens:
+                token_postings[token].append(entry)
+            padded.append(_pad(core))
+
+        total = max(1, len(self.names))
+        self._idf = {t: math.log(1 + total / len(p)) for t, p in token_postings.items()}
+        self._unknown_idf = math.log(1 + total)
+        self._token_postings = {t: array("i", p) for t, p in token_postings.items()}
+        self._build_grams(padded)
+
+    def _build_grams(self, padded: List[str]):
+        """Trigram postings for all entries at once: unique (entry, gram) pairs sorted by gram."""
+        lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+        text = np.frombuffer("".join(padded).encode("ascii"), dtype=np.uint8).astype(np.int64)
+        entry_of = np.repeat(np.arange(len(padded), dtype=np.int64), lengths)
+        offset = np.arange(len(text)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        # Windows starting in the last two characters of a name would run into the next one
+        starts = np.nonzero(offset <= np.repeat(lengths, lengths) - 3)[0]
+        codes = (text[starts] << 16) | (text[starts + 1] << 8) | text[starts + 2]
+        # One sort orders by gram, then entry; adjacent repeats are a gram occurring twice in a name
+        pairs = np.sort((codes << 32) | entry_of[starts])
+        pairs = pairs[np.append(True, pairs[1:] != pairs[:-1])] if len(pairs) else pairs
+        codes, entries = pairs >> 32, pairs & 0xFFFFFFFF
+        self._gram_counts = np.bincount(entries, minlength=len(padded)).astype(np.int32)
+        self._gram_entries = entries.astype(np.int32)
+        first = np.nonzero(np.append(True, codes[1:] != codes[:-1]))[0] if len(codes) else np.zeros(0, np.int64)
+        self._gram_keys = codes[first]
+        self._gram_bounds = np.append(first, len(codes))
+
+    def _gram_postings(self, q_grams: Set[str]) -> List[np.ndarray]:
+        codes = np.array(sorted(_gram_code(g) for g in q_grams), dtype=np.int64)
+        slots = np.searchsorted(self._gram_keys, codes)
+        postings = []
+        for code, slot in zip(codes, slots):
+            if slot < len(self._gram_keys) and self._gram_keys[slot] == code:
+                postings.append(self._gram_entries[self._gram_bounds[slot]:self._gram_bounds[slot + 1]])
+        return postings
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _weight(self, tokens: Iterable[str]) -> float:
+        return sum(self._idf.get(t, self._unknown_idf) for t in tokens)
+
+    def lookup(self, name: str) -> Tuple[Optional[str], float]:
+        """
+        (best matching master name, score 0..1); (None, 0.0) if nothing
+        shares a trigram or token, or the name is only legal forms.
+        """
+        norm = normalise_vendor(name or "")
+        if not norm:
+            return None, 0.0
+        exact = self._exact.get(norm)
+        if exact is not None:
+            return self.names[exact], 1.0
+        core = core_name(norm)
+        if not core:
+            return None, 0.0
+
+        q_grams = trigrams(core)
+        q_tokens = set(core.split())
+
+        shared: Dict[int, int] = {}
+        candidates: List[int] = []
+        postings = self._gram_postings(q_grams) if self.names else []
+        usable = [p for p in postings if len(p) <= self.max_posting]
+        # Only common grams (very short name): fall back to the rarest few
+        usable = usable or sorted(postings, key=len)[:3]
+        if usable:
+            entries, counts = np.unique(np.concatenate(usable), return_counts=True)
+            top = np.argsort(-counts, kind="stable")[:self.shortlist]
+            shared = dict(zip(entries.tolist(), counts.tolist()))
+            candidates = entries[top].tolist()
+        for token in q_tokens:
+            posting = self._token_postings.get(token)
+            if posting is not None and len(posting) <= self.max_posting:
+                candidates.extend(posting[:self.shortlist])
+
+        q_weight = self._weight(q_tokens)
+        best, best_score = None, 0.0
+        for entry in set(candidates):
+            dice = 2 * shared.get(entry, 0) / (len(q_grams) + self._gram_counts[entry])
+            e_tokens = self._tokens[entry]
+            common = self._weight(q_tokens.intersection(e_tokens))
+            containment = max(common / q_weight, common / self._weight(e_tokens))
+            score = 0.5 * min(dice, 1.0) + 0.5 * containment
+            if score > best_score:
+                best, best_score = entry, score
+        if best is None:
+            return None, 0.0
+        return self.names[best], round(best_score, 3)
@@ -0,0 +1,375 @@
+from fastapi import HTTPException
+from backend.app.core.config import settings
+from backend.app.services.metrics import metrics
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import multiprocessing
+import threading
+import itertools
+import logging
+import queue
+import time
+import os
+
+logger = logging.getLogger(__name__)
+
+# This module runs in the API process and must never import the vision stack
+# (ultralytics, torch, cv2): backend.app.agents.vision is imported only inside
+# the worker processes it spawns.
+
+_RESTART_BACKOFF_SECONDS = 5.0
+_END_SESSION = "end-session"
+
+def _worker_main(worker_id: int, shm_name: str, slots: int, slot_bytes: int,
+                 requests: "multiprocessing.Queue", responses: "multiprocessing.Queue"):
+    """
+    Vision worker process: loads the model once, then answers frame
+    requests. Each request names a shared-memory slot holding the JPEG;
+    the annotated JPEG goes back into the same slot's output half (or
+    through the queue if it doesn't fit). Frames are handled on a thread
+    pool so concurrent ones meet in the agent's micro-batches. Stream
+    sessions live here too: the pool sends all of a session's frames to
+    the same worker.
+    """
+    from backend.app.agents.vision import vision_engine
+
+    # Spawned children share the API process's resource tracker, which unlinks the segment
+    shm = shared_memory.SharedMemory(name=shm_name)
+    owners = _owners(shm, slots)
+    pool = ThreadPoolExecutor(max_workers=max(2, settings.VISION_BATCH_SIZE * 2), thread_name_prefix="vision-frame")
+    parent = multiprocessing.parent_process()
+
+    def handle(request_id: int, slot: int, length: int, options: Dict[str, Any]):
+        start = _slot_offset(slots, slot_bytes, slot)
+        try:
+            analysis, annotated = vision_engine.detect_objects(bytes(shm.buf[start:start + length]), **options)
+        except Exception as e:
+            responses.put((request_id, slot, worker_id, None, None, f"{type(e).__name__}: {e}"))
+            return
+        size, inline = None, None  # detections / boxes output carry no image
+        if annotated is not None:
+            # Only write into the slot while the API still holds it for this request
+            if len(annotated) <= slot_bytes and owners[slot] == request_id:
+                shm.buf[start + slot_bytes:start + slot_bytes + len(annotated)] = annotated
+                size = len(annotated)
+            else:
+                size, inline = -1, annotated
+        analysis["worker"] = {"id": worker_id, "pid": os.getpid(), **vision_engine.scheduler.stats()}
+        responses.put((request_id, slot, worker_id, size, (analysis, inline), None))
+
+    responses.put((0, -1, worker_id, None, None, None))  # ready
+    try:
+        while True:
+            try:
+                message = requests.get(timeout=1)
+            except queue.Empty:
+                if parent is not None and not parent.is_alive():
+                    return
+                continue
+            if message is None:
+                return
+            if message[0] == _END_SESSION:
+                vision_engine.end_session(message[1])
+                continue
+            pool.submit(handle, *message)
+    finally:
+        pool.shutdown(wait=True)
+        vision_engine.scheduler.close()
+        del owners
+        shm.close()
+
+def _slot_offset(slots: int, slot_bytes: int, slot: int) -> int:
+    # [owner ids: slots x int64][slot 0 in | slot 0 out][slot 1 in | slot 1 out]...
+    return slots * 8 + slot * 2 * slot_bytes
+
+def _owners(shm: shared_memory.SharedMemory, slots: int) -> np.ndarray:
+    return np.ndarray((slots,), dtype=np.int64, buffer=shm.buf[:slots * 8])
+
+class VisionWorkerPool:
+    """
+    Client for the vision worker processes.
+    - Frames travel through one shared-memory segment split into `slots`
+      fixed-size slots (JPEG in, annotated JPEG out); the queues only carry
+      (request id, slot, length) and the detection dict.
+    - submit() claims a free slot (429 when all are busy, 413 when the
+      frame doesn't fit) and returns a Future; a listener thread resolves
+      it when a worker answers.
+    - Each worker has its own request queue. Frames go to the worker with
+      the fewest unanswered ones, except that all frames of a stream
+      session go to the worker holding that session's tracker.
+    - Requests unanswered after `timeout` seconds fail; their slots are
+      only reused once the late answer arrives or their worker is restarted.
+    - Workers are spawned on first use and restarted if they die. A dead
+      worker's unanswered requests fail at once, and its stream sessions
+      are dropped (their next frame starts a new tracker elsewhere).
+    """
+
+    def __init__(self, workers: int, slots: int, slot_bytes: int, timeout: float):
+        self.workers = max(1, workers)
+        self.slots = max(1, slots)
+        self.slot_bytes = slot_bytes
+        self.timeout = timeout
+        self._ctx = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._shm: Optional[shared_memory.SharedMemory] = None
+        self._owners = None
+        self._free: List[int] = []
+        self._abandoned: Dict[int, Tuple[int, int]] = {}  # slot -> (request id that timed out, worker)
+        self._pending: Dict[int, Tuple[Future, int, float, int]] = {}  # request id -> (future, slot, deadline, worker)
+        self._inflight: List[int] = [0] * self.workers
+        self._sessions: Dict[str, int] = {}  # stream session -> worker
+        self._procs: List[Any] = []
+        self._ready: Dict[int, bool] = {}
+        self._spawned_at: Dict[int, float] = {}
+        self._worker_stats: Dict[int, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+        self._requests: List[Any] = []
+        self._responses = None
+        self._listener: Optional[threading.Thread] = None
+        self._closed = False   # no new frames, no restarts
+        self._stopped = False  # workers gone, listener exits
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    def _start(self):
+        """Create the segment and queues and spawn the workers (caller holds the lock)."""
+        size = _slot_offset(self.slots, self.slot_bytes, self.slots)
+        self._shm = shared_memory.SharedMemory(create=True, size=size)
+        self._owners = _owners(self._shm, self.slots)
+        self._owners[:] = 0
+        self._free = list(range(self.slots))
+        self._requests = [self._ctx.Queue() for _ in range(self.workers)]
+        self._responses = self._ctx.Queue()
+        self._procs = [self._spawn(worker_id) for worker_id in range(self.workers)]
+        self._listener = threading.Thread(target=self._listen, name="vision-listener", daemon=True)
+        self._listener.start()
+        logger.info(f"👁️ Started {self.workers} vision worker(s), {self.slots} x {self.slot_bytes // 1024} KB frame slots")
+
+    def _spawn(self, worker_id: int):
+        self._ready[worker_id] = False
+        self._spawned_at[worker_id] = time.monotonic()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self._shm.name, self.slots, self.slot_bytes, self._requests[worker_id], self._responses),
+            name=f"vision-worker-{worker_id}",
+            daemon=True,
+        )
+        proc.start()
+        return proc
+
+    def submit(self, image_bytes: bytes, output: str = "annotated", scale: float = 1.0,
+               quality: Optional[int] = None, session: Optional[str] = None,
+               detect_every: Optional[int] = None) -> Future:
+        """
+        Hand a JPEG frame to a worker; the Future yields (analysis, annotated
+        JPEG bytes or None). Options are VisionAgent.detect_objects'; call
+        end_session() once a `session` is over.
+        """
+        if len(image_bytes) > self.slot_bytes:
+            raise HTTPException(413, f"Frame too large: {len(image_bytes)} bytes (max {self.slot_bytes})")
+        with self._lock:
+            if self._closed:
+                raise HTTPException(503, "Vision workers are shut down")
+            if self._shm is None:
+                self._start()
+            if not self._free:
+                self.rejected += 1
+                raise HTTPException(429, "Vision workers are busy", headers={"Retry-After": "1"})
+            slot = self._free.pop()
+            request_id = next(self._ids)
+            self._owners[slot] = request_id
+            worker_id = self._sessions.get(session) if session is not None else None
+            if worker_id is None:
+                # Least busy, preferring workers that have loaded the model
+                worker_id = min(range(self.workers), key=lambda w: (not self._ready.get(w), self._inflight[w]))
+                if session is not None:
+                    self._sessions[session] = worker_id
+            self._inflight[worker_id] += 1
+            future: Future = Future()
+            future.set_running_or_notify_cancel()  # a caller that stops waiting can't cancel it under the listener
+            self._pending[request_id] = (future, slot, time.monotonic() + self.timeout, worker_id)
+            requests = self._requests[worker_id]  # a restart swaps the queue; this request belongs to the old one
+        start = _slot_offset(self.slots, self.slot_bytes, slot)
+        self._shm.buf[start:start + len(image_bytes)] = image_bytes
+        options = {"output": output, "scale": scale, "quality": quality,
+                   "session": session, "detect_every": detect_every}
+        requests.put((request_id, slot, len(image_bytes), options))
+        return future
+
+    def end_session(self, session: str):
+        """Free a stream session's tracker in its worker."""
+        with self._lock:
+            worker_id = self._sessions.pop(session, None)
+            if worker_id is None or self._closed:
+                return
+            requests = self._requests[worker_id]
+        requests.put((_END_SESSION, session))
+
+    def detect_objects(self, image_bytes: bytes, **options) -> Tuple[Dict[str, Any], Optional[bytes]]:
+        return self.submit(image_bytes, **options).result()
+
+    def _release(self, slot: int):
+        self._owners[slot] = 0
+        self._free.append(slot)
+
+    def _forget(self, request_id: int) -> Optional[Tuple[Future, int, float, int]]:
+        """Stop tracking a request (caller holds the lock)."""
+        entry = self._pending.pop(request_id, None)
+        if entry is not None:
+            self._inflight[entry[3]] -= 1
+        return entry
+
+    def _answer(self, message: tuple):
+        request_id, slot, worker_id, size, payload, error = message
+        if slot < 0:
+            self._ready[worker_id] = True
+            logger.info(f"✅ Vision worker {worker_id} ready")
+            return
+        annotated = None
+        if size is not None and size >= 0:
+            start = _slot_offset(self.slots, self.slot_bytes, slot) + self.slot_bytes
+            annotated = bytes(self._shm.buf[start:start + size])
+        with self._lock:
+            entry = self._forget(request_id)
+            if entry is not None or self._abandoned.get(slot, (None,))[0] == request_id:
+                self._abandoned.pop(slot, None)
+                self._release(slot)
+        if entry is None:
+            return  # timed out already
+        future = entry[0]
+        if error is not None:
+            self.failed += 1
+            future.set_exception(RuntimeError(error))
+            return
+        analysis, inline = payload
+        self._worker_stats[worker_id] = analysis.pop("worker")
+        self.completed += 1
+        future.set_result((analysis, annotated if inline is None else inline))
+
+    def _expire(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [(rid, entry) for rid, entry in self._pending.items() if entry[2] <= now]
+            for request_id, (_, slot, _, worker_id) in expired:
+                self._forget(request_id)
+                self._abandoned[slot] = (request_id, worker_id)  # the worker may still write into it
+        for request_id, (future, _, _, _) in expired:
+            self.timeouts += 1
+            future.set_exception(TimeoutError(f"Vision worker did not answer within {self.timeout}s"))
+
+    def _supervise(self):
+        for worker_id, proc in enumerate(self._procs):
+            # A worker that can't even start (bad weights, OOM) is retried every few seconds, not in a tight loop
+            if not proc.is_alive() and time.monotonic() - self._spawned_at[worker_id] >= _RESTART_BACKOFF_SECONDS:
+                logger.error(f"❌ Vision worker {worker_id} exited ({proc.exitcode}); restarting")
+                self.restarts += 1
+                with self._lock:
+                    lost = self._drop_worker(worker_id)
+                for future in lost:
+                    self.failed += 1
+                    future.set_exception(RuntimeError(f"Vision worker {worker_id} exited"))
+                self._procs[worker_id] = self._spawn(worker_id)
+
+    def _drop_worker(self, worker_id: int) -> List[Future]:
+        """
+        Forget everything a dead worker held (caller holds the lock): its
+        unanswered and abandoned frames' slots, its stream sessions and its
+        request queue, so the replacement doesn't replay frames whose
+        callers have already been failed. Returns the futures to fail.
+        """
+        lost = []
+        for request_id in [rid for rid, entry in self._pending.items() if entry[3] == worker_id]:
+            future, slot, _, _ = self._forget(request_id)
+            self._release(slot)
+            lost.append(future)
+        for slot, (_, owner) in list(self._abandoned.items()):
+            if owner == worker_id:
+                del self._abandoned[slot]
+                self._release(slot)
+        for session, owner in list(self._sessions.items()):
+            if owner == worker_id:
+                del self._sessions[session]
+        self._requests[worker_id].cancel_join_thread()  # never read again; don't block exit on it
+        self._requests[worker_id] = self._ctx.Queue()
+        return lost
+
+    def _listen(self):
+        last_check = time.monotonic()
+        while not self._stopped:
+            try:
+                self._answer(self._responses.get(timeout=0.5))
+            except queue.Empty:
+                pass
+            except (EOFError, OSError):
+                return
+            if time.monotonic() - last_check >= 0.5:
+                last_check = time.monotonic()
+                self._expire()
+                if not self._closed:
+                    self._supervise()
+
+    def queue_depth(self) -> int:
+        """Frames handed to the workers and not answered yet."""
+        return len(self._pending)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "started": self._shm is not None,
+            "workers": self.workers,
+            "workers_ready": sum(self._ready.values()),
+            "queue_depth": self.queue_depth(),
+            "inflight_per_worker": list(self._inflight),
+            "sessions": len(self._sessions),
+            "free_slots": len(self._free),
+            "slot_bytes": self.slot_bytes,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+            "schedulers": {str(k): v for k, v in sorted(self._worker_stats.items())},
+        }
+
+    def close(self):
+        """Stop the workers (they finish frames already queued) and free the segment."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._shm is None:
+            return
+        for requests in self._requests:
+            requests.put(None)
+        for proc in self._procs:
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+        self._stopped = True
+        if self._listener is not None:
+            self._listener.join(timeout=2)
+        with self._lock:
+            for future, _, _, _ in self._pending.values():
+                future.set_exception(RuntimeError("Vision workers shut down"))
+            self._pending.clear()
+            self._sessions.clear()
+        self._owners = None
+        self._shm.close()
+        self._shm.unlink()
+
+metrics.describe("inference_queue_depth", "gauge", "Frames handed to the vision workers and not answered yet.")
+metrics.describe("vision_stream_frames_total", "counter", "WebSocket camera frames, by outcome (processed, dropped, error).")
+metrics.describe("vision_stream_inference_total", "counter",
+                 "Tracked stream frames by outcome: detected (ran the model) or tracked (answered by the tracker).")
+
+# Singleton
+vision_workers = VisionWorkerPool(
+    workers=settings.VISION_WORKERS,
+    slots=settings.VISION_SHM_SLOTS,
+    slot_bytes=settings.VISION_SHM_SLOT_BYTES,
+    timeout=settings.VISION_TIMEOUT_SECONDS,
+)
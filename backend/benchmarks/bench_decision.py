@@ -0,0 +1,116 @@
+"""
+Decision scoring benchmark and parity check.
+
+Generates random (extraction, security_check) pairs covering every rule
+branch, scores them with DecisionAgent.evaluate (one by one) and with
+DecisionAgent.evaluate_batch (columnar), and reports throughput of both as
+JSON. Any invoice whose confidence or decision differs between the two
+paths is reported and the process exits non-zero, so it can gate CI.
+
+Usage:
+    python -m backend.benchmarks.bench_decision --count 20000
+"""
+from typing import Any, Dict, List, Tuple
+import argparse
+import logging
+import random
+import json
+import time
+import sys
+
+STATUSES = ["TRUSTED", "NEW", "FLAGGED", "UNVERIFIED", None]
+# Amounts either side of every threshold, PO budgets and round values
+AMOUNTS = [0, 500.0, 9999.99, 10000, 10000.01, 45000, 99999.5, 100000, 100000.01, 250000]
+
+def random_case(rng: random.Random) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    amount = rng.choice(AMOUNTS) if rng.random() < 0.5 else round(rng.uniform(0, 300000), 2)
+    po_number = rng.choice([None, "PO-1001"])
+    erp_roll = rng.random()
+    extraction = {
+        "vendor_name": "Acme Corp",
+        "invoice_number": "INV-1",
+        "amount": amount,
+        "currency": "INR",
+        "po_number": po_number,
+        "gstin": rng.choice([None, "27AAPFU0939F1ZV"]),
+        "date": rng.choice([None, "2024-03-12"]),
+    }
+    forensic_flags = [f"finding {i}" for i in range(rng.choice([0, 1, 2]))]
+    similarity = rng.choice([0.86, 0.95, 0.99])
+    security_check = {
+        "vendor_status": rng.choice(STATUSES),
+        "vendor_score": 90,
+        "is_duplicate": rng.random() < 0.1,
+        "near_duplicates": [{"invoice_id": "INV-0", "vendor": "Acme Corp", "similarity": similarity}]
+                           if rng.random() < 0.15 else [],
+        "erp_validation": {"valid": True, "details": {"budget": rng.choice([0, 15000.0, 120000.0])}}
+                          if erp_roll < 0.6 else {"valid": False, "message": "PO not found"}
+                          if erp_roll < 0.9 else {"valid": False, "message": "ERP unavailable", "erp_unavailable": True},
+        "gst_validation": rng.choice([{}, {"valid": True}, {"valid": False, "message": "bad checksum"}]),
+        "digital_forensics": {"is_suspicious": rng.random() < 0.15, "flags": forensic_flags},
+        "bank_validation": rng.choice([{}, {"match": True}, {"match": False, "reason": "account changed"},
+                                       {"match": True, "reason": "Vendor not found in Master Data"}]),
+    }
+    return extraction, security_check
+
+def run(count: int, seed: int) -> Dict[str, Any]:
+    from backend.app.agents.decision import DecisionAgent, batch_columns
+
+    rng = random.Random(seed)
+    cases = [random_case(rng) for _ in range(count)]
+    agent = DecisionAgent()
+
+    started = time.perf_counter()
+    scalar = [agent.evaluate(extraction, security_check) for extraction, security_check in cases]
+    scalar_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    columns = batch_columns(cases)
+    columns_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    batch = agent.evaluate_batch(columns)
+    batch_seconds = time.perf_counter() - started
+
+    mismatches: List[Dict[str, Any]] = []
+    for i, result in enumerate(scalar):
+        if result.confidence_score != batch["confidence"][i] or result.decision != batch["decision"][i]:
+            mismatches.append({
+                "index": i,
+                "scalar": [result.confidence_score, result.decision],
+                "batch": [float(batch["confidence"][i]), batch["decision"][i]],
+            })
+
+    decisions: Dict[str, int] = {}
+    for decision in batch["decision"]:
+        decisions[decision] = decisions.get(decision, 0) + 1
+    return {
+        "count": count,
+        "seed": seed,
+        "decisions": decisions,
+        "scalar": {"seconds": round(scalar_seconds, 4), "per_second": round(count / scalar_seconds, 1)},
+        "batch": {
+            "seconds": round(batch_seconds, 4),
+            "per_second": round(count / batch_seconds, 1) if batch_seconds else None,
+            "column_build_seconds": round(columns_seconds, 4),
+        },
+        "speedup": round(scalar_seconds / batch_seconds, 1) if batch_seconds else None,
+        "mismatches": len(mismatches),
+        "first_mismatches": mismatches[:10],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare scalar and batch decision scoring")
+    parser.add_argument("--count", type=int, default=20000, help="random invoices to score")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run(args.count, args.seed)
+    print(json.dumps(report, indent=2))
+    if report["mismatches"]:
+        print(f"❌ {report['mismatches']} invoice(s) scored differently by the batch path", file=sys.stderr)
+        sys.exit(1)
+    print("✅ Batch scoring matches DecisionAgent.evaluate", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
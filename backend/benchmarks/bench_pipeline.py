@@ -0,0 +1,228 @@
+"""
+Pipeline benchmark.
+
+Times every stage of the invoice pipeline over a synthetic corpus
+(see corpus.py) and reports throughput and p50/p95/p99 latency as JSON:
+- decode:    file bytes -> text (PyPDF2, openpyxl, python-docx, utf-8)
+- ocr:       scanned PDFs that fell through to Tesseract
+- extract:   InvoiceParserAgent.extract
+- security:  SecurityAgent fingerprint, duplicate, vendor, GST, forensics, bank checks + ERP PO lookup
+- decision:  DecisionAgent.evaluate
+- db_write:  SQLiteDB.save_decision committed synchronously (temporary database)
+- end_to_end: analyze_file + save_decision, as /v1/process-invoice-file runs it
+
+Usage:
+    python -m backend.benchmarks.bench_pipeline --count 100 --pages 3 --out bench.json
+    python -m backend.benchmarks.bench_pipeline --baseline bench.json --max-regression 0.2
+
+With --baseline, any stage whose p95 grew by more than --max-regression
+(fraction) is reported and the process exits non-zero, so it can gate CI.
+"""
+from backend.benchmarks.corpus import FORMATS, generate_corpus
+from typing import Dict, Any, List, Optional
+from collections import defaultdict
+import argparse
+import platform
+import tempfile
+import logging
+import json
+import math
+import time
+import sys
+import os
+
+STAGES = ["decode", "ocr", "extract", "security", "decision", "db_write", "end_to_end"]
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(samples: List[float]) -> Dict[str, Any]:
+    values = sorted(samples)
+    total = sum(values)
+    return {
+        "count": len(values),
+        "total_s": round(total, 4),
+        "throughput_per_s": round(len(values) / total, 2) if total else None,
+        "mean_ms": round(total / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+    }
+
+def run(count: int, formats: List[str], pages: int, seed: int, warmup: int, use_cache: bool) -> Dict[str, Any]:
+    # Imported here so --help works without the backend's dependencies
+    from backend.app.core.config import settings
+    from backend.app.schemas.ai import SQLiteDB
+    from backend.app.services.document import DocumentContext, OCR_AVAILABLE
+    from backend.app.services.ocr import PDF_OCR_AVAILABLE
+    from backend.app.services.erp_client import erp_gateway
+    from backend.app.services import duplicate_index as duplicate_module
+    from backend.app.services import invoice_pipeline as pipeline_module
+    from backend.app.services.near_duplicate import NearDuplicateIndex
+    from backend.app.services.invoice_pipeline import extractor, security, decision_engine, analyze_file
+
+    settings.TEXT_CACHE_ENABLED = use_cache
+    timings: Dict[str, List[float]] = defaultdict(list)
+    per_format: Dict[str, List[float]] = defaultdict(list)
+    generated: Dict[str, int] = defaultdict(int)
+    errors: Dict[str, int] = defaultdict(int)
+
+    def measure(doc_bytes: bytes, filename: str, bench_db: SQLiteDB) -> Dict[str, float]:
+        sample: Dict[str, float] = {}
+        # Stage by stage, on a fresh context
+        doc = DocumentContext(doc_bytes, filename)
+        t0 = time.perf_counter()
+        text = doc.text()
+        sample["ocr" if doc.method == "ocr" else "decode"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        extracted = extractor.extract(text)
+        sample["extract"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        fingerprint = security.fingerprint(
+            vendor=extracted.get('vendor_name', ''),
+            inv_id=extracted.get('invoice_number', ''),
+            amount=extracted.get('amount', 0)
+        )
+        vendor_trust = security.verify_vendor(extracted.get('vendor_name', ''))
+        security_context = {
+            "is_duplicate": security.check_duplicate(fingerprint),
+            "vendor_status": vendor_trust.get('status'),
+            "vendor_score": vendor_trust.get('score'),
+            "fingerprint": fingerprint,
+            "document_sha256": doc.sha256,
+            "erp_validation": erp_gateway.check_po(extracted.get('po_number')),
+            "gst_validation": security.verify_gstin(extracted.get('gstin', '')),
+            "digital_forensics": security.analyze_digital_footprint(doc.metadata),
+            "bank_validation": security.verify_bank_details(vendor_trust.get('data'), extracted,
+                                                            master_unavailable=vendor_trust.get('status') == 'UNVERIFIED'),
+        }
+        sample["security"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        result = decision_engine.evaluate(extracted, security_context)
+        sample["decision"] = time.perf_counter() - t0
+
+        payload = result.dict()
+        t0 = time.perf_counter()
+        bench_db.save_decision(invoice_id=result.processed_invoice.get('invoice_number', 'UNK'), payload=payload)
+        sample["db_write"] = time.perf_counter() - t0
+
+        # The real request path (streaming, early exit) on an unparsed context
+        t0 = time.perf_counter()
+        result = analyze_file(DocumentContext(doc_bytes, filename))
+        bench_db.save_decision(invoice_id=result.processed_invoice.get('invoice_number', 'UNK'), payload=result.dict())
+        sample["end_to_end"] = time.perf_counter() - t0
+        return sample
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Private duplicate stores: benchmark invoices must not land in the real ones
+        duplicate_module.duplicate_index = duplicate_module.DuplicateIndex(db_path=os.path.join(tmp, "fingerprints.db"))
+        pipeline_module.near_duplicate_index = NearDuplicateIndex(db_path=os.path.join(tmp, "near_duplicates.db"))
+        # Synchronous writes so db_write measures the commit, not the enqueue
+        bench_db = SQLiteDB(db_path=os.path.join(tmp, "bench_invoices.db"), background_writes=False)
+
+        # Warm-up on a different seed so imports, regex and SQLite are hot
+        for filename, _, data in generate_corpus(warmup, formats, pages, seed + 1):
+            try:
+                measure(data, filename, bench_db)
+            except Exception:
+                pass
+
+        corpus = list(generate_corpus(count, formats, pages, seed))
+        started = time.perf_counter()
+        for filename, fmt, data in corpus:
+            generated[fmt] += 1
+            try:
+                sample = measure(data, filename, bench_db)
+            except Exception as e:
+                errors[fmt] += 1
+                logging.getLogger(__name__).warning(f"⚠️ {filename}: {e}")
+                continue
+            for stage, seconds in sample.items():
+                timings[stage].append(seconds)
+            per_format[fmt].append(sample["end_to_end"])
+        wall = time.perf_counter() - started
+        bench_db.close()
+
+    skipped = [fmt for fmt in formats if not generated[fmt]]
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "documents": count,
+            "pages_per_document": pages,
+            "warmup": warmup,
+            "seed": seed,
+            "text_cache": use_cache,
+            "stream_early_exit": settings.STREAM_EARLY_EXIT,
+            "ocr_available": OCR_AVAILABLE and PDF_OCR_AVAILABLE,
+            "formats": {fmt: generated[fmt] for fmt in formats},
+            "skipped_formats": skipped,  # renderer library not installed
+            "errors": dict(errors),
+            "wall_s": round(wall, 3),
+        },
+        "stages": {stage: summarize(timings[stage]) for stage in STAGES if timings[stage]},
+        "end_to_end_by_format": {fmt: summarize(v) for fmt, v in per_format.items()},
+    }
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Stages whose p95 regressed by more than max_regression (fraction) vs the baseline."""
+    regressions = []
+    for stage, stats in report["stages"].items():
+        before: Optional[Dict[str, Any]] = baseline.get("stages", {}).get(stage)
+        if not before or not before.get("p95_ms"):
+            continue
+        change = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"]
+        if change > max_regression:
+            regressions.append(f"{stage}: p95 {before['p95_ms']}ms -> {stats['p95_ms']}ms (+{change:.0%})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the invoice pipeline stage by stage")
+    parser.add_argument("--count", type=int, default=50, help="invoices per format")
+    parser.add_argument("--pages", type=int, default=1, help="pages per invoice")
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--warmup", type=int, default=2, help="invoices per format run before timing")
+    parser.add_argument("--cache", action="store_true", help="leave the text cache on (off by default: cold decode)")
+    parser.add_argument("--out", help="write the JSON report here (stdout otherwise)")
+    parser.add_argument("--baseline", help="previous JSON report to compare p95 against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    # Keep per-document pipeline logging out of the timings and the report
+    logging.basicConfig(level=logging.WARNING)
+
+    formats = [f for f in args.formats.split(",") if f]
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"unknown formats: {', '.join(sorted(unknown))} (choose from {', '.join(FORMATS)})")
+
+    report = run(args.count, formats, args.pages, args.seed, args.warmup, args.cache)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+        print(f"📊 Report written to {args.out}", file=sys.stderr)
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_regression)
+        for line in regressions:
+            print(f"❌ Regression: {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("✅ No stage regressed beyond the threshold", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
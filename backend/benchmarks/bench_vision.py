@@ -0,0 +1,151 @@
+"""
+Vision backend benchmark and agreement check.
+
+Runs the configured YOLO weights through each requested backend (PyTorch,
+ONNX Runtime, OpenVINO, optionally their INT8 exports) on the same images
+and reports frames per second at batch 1 and at --batch, plus how closely
+each backend's detections agree with the first one (the reference):
+- agreement: matched boxes (same class, IoU >= --iou) x 2 / all boxes (F1)
+- mean_iou: mean IoU of the matched boxes
+- same_counts: share of images with identical per-label object counts
+  (what the API's object_counts / safety_alert are built from)
+Exits non-zero when a backend's agreement is below --min-agreement, so an
+export can be checked before VISION_BACKEND is switched on an edge box.
+
+Usage:
+    python -m backend.benchmarks.bench_vision --backends torch,onnx,onnx-int8,openvino --images ./frames
+"""
+from typing import Any, Dict, List, Tuple
+import numpy as np
+import argparse
+import logging
+import json
+import glob
+import time
+import sys
+import os
+
+def parse_backend(name: str) -> Tuple[str, bool]:
+    backend, _, variant = name.partition("-")
+    if variant not in ("", "int8"):
+        raise ValueError(f"Unknown backend variant {name!r} (use e.g. onnx or onnx-int8)")
+    return backend, variant == "int8"
+
+def load_images(path: str) -> List[np.ndarray]:
+    import cv2
+    from ultralytics.utils import ASSETS
+
+    root = path or str(ASSETS)  # bus.jpg and zidane.jpg ship with ultralytics
+    files = sorted(f for ext in ("jpg", "jpeg", "png") for f in glob.glob(os.path.join(root, f"*.{ext}")))
+    images = [image for image in (cv2.imread(f) for f in files) if image is not None]
+    if not images:
+        raise ValueError(f"No images found in {root}")
+    return images
+
+def detections(result) -> List[Tuple[int, np.ndarray]]:
+    boxes = result.boxes
+    return list(zip(boxes.cls.cpu().numpy().astype(int).tolist(), boxes.xyxy.cpu().numpy()))
+
+def iou(a: np.ndarray, b: np.ndarray) -> float:
+    w = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    h = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = w * h
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return float(inter / union) if union > 0 else 0.0
+
+def match(reference: List[Tuple[int, np.ndarray]], other: List[Tuple[int, np.ndarray]],
+          threshold: float) -> List[float]:
+    """Greedy one-to-one matching of same-class boxes, best IoU first; the matched IoUs."""
+    pairs = sorted(
+        ((iou(ra, ob), i, j) for i, (rc, ra) in enumerate(reference) for j, (oc, ob) in enumerate(other) if rc == oc),
+        reverse=True,
+    )
+    used_ref, used_other, matched = set(), set(), []
+    for score, i, j in pairs:
+        if score < threshold:
+            break
+        if i in used_ref or j in used_other:
+            continue
+        used_ref.add(i)
+        used_other.add(j)
+        matched.append(score)
+    return matched
+
+def counts(found: List[Tuple[int, np.ndarray]]) -> Dict[int, int]:
+    tally: Dict[int, int] = {}
+    for cls, _ in found:
+        tally[cls] = tally.get(cls, 0) + 1
+    return tally
+
+def throughput(model, images: List[np.ndarray], imgsz: int, frames: int, batch: int) -> float:
+    stream = [images[i % len(images)] for i in range(frames)]
+    model(stream[:batch], imgsz=imgsz, verbose=False)  # warm-up (and first-call allocation)
+    started = time.perf_counter()
+    for i in range(0, frames, batch):
+        model(stream[i:i + batch], imgsz=imgsz, verbose=False)
+    return frames / (time.perf_counter() - started)
+
+def run(backends: List[str], weights: str, images_path: str, imgsz: int, frames: int, batch: int,
+        iou_threshold: float, export_dir: str, calibration: str) -> Dict[str, Any]:
+    from backend.app.agents.vision_backends import load_model
+
+    images = load_images(images_path)
+    report: Dict[str, Any] = {"weights": weights, "imgsz": imgsz, "images": len(images), "frames": frames,
+                              "batch": batch, "reference": backends[0], "backends": {}}
+    reference = None
+    for name in backends:
+        backend, int8 = parse_backend(name)
+        started = time.perf_counter()
+        model = load_model(weights, backend, imgsz, int8, export_dir, calibration)
+        load_seconds = time.perf_counter() - started
+        found = [detections(model(image, imgsz=imgsz, verbose=False)[0]) for image in images]
+        entry: Dict[str, Any] = {
+            "load_seconds": round(load_seconds, 2),
+            "fps_batch_1": round(throughput(model, images, imgsz, frames, 1), 1),
+            f"fps_batch_{batch}": round(throughput(model, images, imgsz, frames, batch), 1),
+            "detections": sum(len(f) for f in found),
+        }
+        if reference is None:
+            reference = found
+        else:
+            matched = [match(ref, other, iou_threshold) for ref, other in zip(reference, found)]
+            total = sum(len(ref) + len(other) for ref, other in zip(reference, found))
+            ious = [score for image in matched for score in image]
+            entry["agreement"] = round(2 * len(ious) / total, 4) if total else 1.0
+            entry["mean_iou"] = round(float(np.mean(ious)), 4) if ious else None
+            entry["same_counts"] = round(
+                sum(counts(ref) == counts(other) for ref, other in zip(reference, found)) / len(images), 4)
+        report["backends"][name] = entry
+        logging.info(f"{name}: {entry}")
+    return report
+
+def main():
+    from backend.app.core.config import settings
+
+    parser = argparse.ArgumentParser(description="Compare vision backends: speed and detection agreement")
+    parser.add_argument("--backends", default="torch,onnx,openvino",
+                        help="comma-separated, first is the reference (torch, onnx, openvino, onnx-int8, openvino-int8)")
+    parser.add_argument("--weights", default=settings.VISION_MODEL)
+    parser.add_argument("--images", default="", help="directory of frames (default: ultralytics sample images)")
+    parser.add_argument("--imgsz", type=int, default=settings.VISION_IMGSZ)
+    parser.add_argument("--frames", type=int, default=64, help="frames timed per backend and batch size")
+    parser.add_argument("--batch", type=int, default=settings.VISION_BATCH_SIZE)
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for two boxes to count as the same detection")
+    parser.add_argument("--min-agreement", type=float, default=0.0, help="fail below this agreement (0-1)")
+    parser.add_argument("--export-dir", default=settings.VISION_EXPORT_DIR)
+    parser.add_argument("--calibration", default=settings.VISION_INT8_CALIBRATION)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run([b.strip() for b in args.backends.split(",") if b.strip()], args.weights, args.images,
+                 args.imgsz, args.frames, max(1, args.batch), args.iou, args.export_dir, args.calibration)
+    print(json.dumps(report, indent=2))
+    below = [name for name, entry in report["backends"].items() if entry.get("agreement", 1.0) < args.min_agreement]
+    if below:
+        print(f"❌ Detections disagree with {report['reference']} beyond --min-agreement: {', '.join(below)}",
+              file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ Benchmarked {len(report['backends'])} backend(s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
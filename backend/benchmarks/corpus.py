@@ -0,0 +1,250 @@
+"""
+Synthetic invoice corpus for benchmarks.
+
+Generates realistic invoices (vendor master + seed vendors, POs, GSTINs,
+bank details, multi-page line-item annexures) and renders them as TXT, CSV,
+DOCX, XLSX, text-layer PDF and image (scanned) PDF. Output is deterministic
+for a given seed.
+
+Usage:
+    python -m backend.benchmarks.corpus --out corpus/ --count 50 --pages 3
+"""
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from datetime import date, timedelta
+import argparse
+import random
+import csv
+import io
+import os
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+try:
+    from docx import Document
+except ImportError:
+    Document = None
+try:
+    from PIL import Image, ImageDraw
+except ImportError:
+    Image = None
+
+# Vendors from the ERP master (resolve as TRUSTED/FLAGGED) plus the
+# seed_data.py vendors (resolve as NEW)
+MASTER_VENDORS = [
+    ("Acme Corp", "1234567890", "ACME0001234"),
+    ("Globex Inc", "9876543210", "HDFC0001234"),
+    ("Flipkart India Private Limited", "50200012345678", "HDFC0001234"),
+    ("Amazon Seller Services", "50200087654321", "ICIC0001234"),
+    ("Zomato Limited", "50200011223344", "KOTAK0001234"),
+    ("CyberDyne Systems", "666666666", "SKYNET0123"),
+]
+SEED_VENDORS = [
+    "Amazon Web Services", "Microsoft Azure", "Google Cloud",
+    "Tata Consultancy Services", "Infosys Ltd", "Wipro Limited",
+    "Salesforce Inc", "Oracle Corp", "SAP SE", "Adobe Systems",
+    "Slack Technologies", "Zoom Video Communications", "Dell Technologies",
+]
+PO_NUMBERS = ["PO-1001", "PO-9942", "PO-3321", "PO-FK01", "PO-AMZ1", "PO-7777"]
+CURRENCIES = [("INR", "Rs."), ("USD", "$"), ("EUR", "EUR"), ("GBP", "GBP")]
+ITEMS = ["Cloud compute hours", "Support retainer", "Laptop lease", "Office supplies",
+         "Consulting services", "Software licence", "Freight charges", "Data storage"]
+
+FORMATS = ["txt", "csv", "docx", "xlsx", "pdf", "scan.pdf"]
+LINES_PER_PAGE = 40
+
+def make_invoice(rng: random.Random, pages: int = 1) -> Dict[str, Any]:
+    """One invoice as structured data: header, line items, totals."""
+    if rng.random() < 0.6:
+        vendor, account, ifsc = rng.choice(MASTER_VENDORS)
+    else:
+        vendor, account, ifsc = rng.choice(SEED_VENDORS), str(rng.randint(10**9, 10**12)), None
+    currency, symbol = rng.choice(CURRENCIES)
+
+    n_items = max(3, pages * LINES_PER_PAGE - 12)
+    items = []
+    for i in range(n_items):
+        qty = rng.randint(1, 20)
+        price = round(rng.uniform(5, 900), 2)
+        items.append((f"{rng.choice(ITEMS)} #{i + 1}", qty, price, round(qty * price, 2)))
+    subtotal = round(sum(i[3] for i in items), 2)
+    tax = round(subtotal * 0.18, 2)
+
+    return {
+        "vendor": vendor,
+        "invoice_number": f"INV-{rng.randint(2023, 2025)}-{rng.randint(1000, 99999)}",
+        "date": (date(2024, 1, 1) + timedelta(days=rng.randint(0, 600))).strftime("%d/%m/%Y"),
+        "po_number": rng.choice(PO_NUMBERS) if rng.random() < 0.7 else None,
+        "gstin": f"{rng.randint(10, 37)}AAPC{rng.choice('ABCDEFGH')}{rng.randint(1000, 9999)}F1Z{rng.randint(1, 9)}"
+                 if currency == "INR" else None,
+        "account_number": account,
+        "ifsc": ifsc,
+        "currency": currency,
+        "symbol": symbol,
+        "items": items,
+        "subtotal": subtotal,
+        "tax": tax,
+        "total": round(subtotal + tax, 2),
+    }
+
+def invoice_lines(inv: Dict[str, Any]) -> List[str]:
+    """Plain-text layout shared by every format."""
+    sym = inv["symbol"]
+    lines = [
+        "TAX INVOICE",
+        f"Vendor: {inv['vendor']}",
+        f"Invoice No: {inv['invoice_number']}",
+        f"Invoice Date: {inv['date']}",
+    ]
+    if inv["po_number"]:
+        lines.append(f"PO Number: {inv['po_number']}")
+    if inv["gstin"]:
+        lines.append(f"GSTIN: {inv['gstin']}")
+    lines.append(f"Account No: {inv['account_number']}")
+    if inv["ifsc"]:
+        lines.append(f"IFSC: {inv['ifsc']}")
+    lines.append("Description | Qty | Unit Price | Line Total")
+    for desc, qty, price, line_total in inv["items"]:
+        lines.append(f"{desc} | {qty} | {price:,.2f} | {line_total:,.2f}")
+    lines += [
+        f"Sub Total: {sym} {inv['subtotal']:,.2f}",
+        f"Tax (18%): {sym} {inv['tax']:,.2f}",
+        f"Grand Total: {sym} {inv['total']:,.2f} {inv['currency']}",
+    ]
+    return lines
+
+def _paginate(lines: List[str]) -> List[List[str]]:
+    return [lines[i:i + LINES_PER_PAGE] for i in range(0, len(lines), LINES_PER_PAGE)] or [[]]
+
+# ── RENDERERS ────────────────────────────────────────────────────────────────
+
+def render_txt(inv: Dict[str, Any]) -> bytes:
+    return "\n".join(invoice_lines(inv)).encode("utf-8")
+
+def render_csv(inv: Dict[str, Any]) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for line in invoice_lines(inv):
+        writer.writerow([cell.strip() for cell in line.split("|")])
+    return buf.getvalue().encode("utf-8")
+
+def render_docx(inv: Dict[str, Any]) -> Optional[bytes]:
+    if Document is None:
+        return None
+    doc = Document()
+    for line in invoice_lines(inv):
+        doc.add_paragraph(line)
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+def render_xlsx(inv: Dict[str, Any]) -> Optional[bytes]:
+    if openpyxl is None:
+        return None
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for line in invoice_lines(inv):
+        ws.append([cell.strip() for cell in line.split("|")])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+def _pdf_escape(text: str) -> str:
+    text = text.encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def render_pdf(inv: Dict[str, Any], producer: str = "Tally.ERP 9") -> bytes:
+    """Text-layer PDF written directly (Helvetica, one text object per page)."""
+    pages = _paginate(invoice_lines(inv))
+    objects: List[bytes] = []
+
+    def add(body: str) -> int:
+        objects.append(body.encode("latin-1"))
+        return len(objects)
+
+    add("<< /Type /Catalog /Pages 2 0 R >>")
+    add("")  # page tree, filled in once the kids are known
+    font = add("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    kids = []
+    for page_lines in pages:
+        ops = ["BT", "/F1 10 Tf", "14 TL", "40 760 Td"]
+        ops += [f"({_pdf_escape(l)}) Tj T*" for l in page_lines]
+        ops.append("ET")
+        stream = "\n".join(ops)
+        content = add(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        kids.append(add(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {content} 0 R "
+            f"/Resources << /Font << /F1 {font} 0 R >> >> >>"
+        ))
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode("latin-1")
+    info = add(f"<< /Producer ({_pdf_escape(producer)}) /Creator (Accounts Payable) >>")
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{i} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for off in offsets:
+        out.write(f"{off:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R /Info {info} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+def render_scan_pdf(inv: Dict[str, Any], dpi: int = 100) -> Optional[bytes]:
+    """Image-only PDF (no text layer), as produced by an office scanner."""
+    if Image is None:
+        return None
+    images = []
+    for page_lines in _paginate(invoice_lines(inv)):
+        img = Image.new("L", (int(8.5 * dpi), int(11 * dpi)), 255)
+        draw = ImageDraw.Draw(img)
+        for i, line in enumerate(page_lines):
+            draw.text((int(0.5 * dpi), int(0.5 * dpi) + i * 24), line, fill=0)
+        images.append(img)
+    buf = io.BytesIO()
+    images[0].save(buf, "PDF", resolution=dpi, save_all=True, append_images=images[1:])
+    return buf.getvalue()
+
+RENDERERS = {
+    "txt": render_txt,
+    "csv": render_csv,
+    "docx": render_docx,
+    "xlsx": render_xlsx,
+    "pdf": render_pdf,
+    "scan.pdf": render_scan_pdf,
+}
+
+def generate_corpus(
+    count: int, formats: List[str] = FORMATS, pages: int = 1, seed: int = 42
+) -> Iterator[Tuple[str, str, bytes]]:
+    """Yield (filename, format, bytes); formats whose library is missing are skipped."""
+    rng = random.Random(seed)
+    for n in range(count):
+        inv = make_invoice(rng, pages=pages)
+        for fmt in formats:
+            data = RENDERERS[fmt](inv)
+            if data is not None:
+                yield f"invoice_{n:05d}.{fmt}", fmt, data
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic invoice corpus to disk")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    written = 0
+    for filename, _, data in generate_corpus(args.count, args.formats.split(","), args.pages, args.seed):
+        with open(os.path.join(args.out, filename), "wb") as f:
+            f.write(data)
+        written += 1
+    print(f"✅ Wrote {written} files to {args.out}")
+
+if __name__ == "__main__":
+    main()
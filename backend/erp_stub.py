@@ -0,0 +1,64 @@
+"""
+Stand-in for the remote ERP, serving the local master data over the API
+AsyncERPClient expects. For tests, benchmarks and local development:
+
+    python -m backend.erp_stub --port 8100 --latency-ms 40
+    ERP_BASE_URL=http://127.0.0.1:8100 uvicorn backend.main:app
+
+--latency-ms simulates a slow upstream; --fail-rate makes a share of
+requests answer 503 (circuit breaker drills). GET /stats reports how many
+lookups reached the "ERP", i.e. what caching and coalescing saved.
+"""
+from fastapi import FastAPI, HTTPException, Query
+from backend.app.services.erp_mock import erp_system
+from collections import Counter
+from typing import Any, Dict
+import argparse
+import asyncio
+import random
+import os
+
+app = FastAPI(title="ERP stand-in")
+calls: Counter = Counter()
+LATENCY_SECONDS = float(os.environ.get("ERP_STUB_LATENCY_MS", "0")) / 1000
+FAIL_RATE = float(os.environ.get("ERP_STUB_FAIL_RATE", "0"))
+
+async def _upstream(kind: str):
+    calls[kind] += 1
+    if LATENCY_SECONDS:
+        await asyncio.sleep(LATENCY_SECONDS)
+    if FAIL_RATE and random.random() < FAIL_RATE:
+        calls["failed"] += 1
+        raise HTTPException(503, "ERP stand-in: injected failure")
+
+@app.get("/purchase-orders/{po_number}")
+async def get_purchase_order(po_number: str) -> Dict[str, Any]:
+    await _upstream("po")
+    po = erp_system.master.current.purchase_orders.get(po_number.strip().upper())
+    if po is None:
+        raise HTTPException(404, f"PO {po_number} not found")
+    return {"po_number": po.po_number, **po.as_dict()}
+
+@app.get("/vendors/match")
+async def match_vendor(name: str = Query(..., min_length=1)) -> Dict[str, Any]:
+    await _upstream("vendor")
+    result = erp_system.validate_vendor(name)
+    if not result.get("exists"):
+        raise HTTPException(404, f"Vendor '{name}' not found")
+    return {"name": result["name"], "score": result["score"], "data": result["data"]}
+
+@app.get("/stats")
+def stats() -> Dict[str, int]:
+    return dict(calls)
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--fail-rate", type=float, default=0)
+    args = parser.parse_args()
+    LATENCY_SECONDS = args.latency_ms / 1000
+    FAIL_RATE = args.fail_rate
+    uvicorn.run(app, host=args.host, port=args.port)
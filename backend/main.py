@@ -1,9 +1,31 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from backend.app.core.config import settings
-from backend.app.api.pipeline import router
+from backend.app.api.pipeline import router, shutdown_process_pool
+from backend.app.api.responses import FastJSONResponse
+from backend.app.services.admission import admission
+from backend.app.schemas.ai import db
+from backend.app.services.duplicate_index import duplicate_index
+from backend.app.services.erp_client import erp_gateway
+from backend.app.services.vision_worker import vision_workers
+import threading
 
-app = FastAPI(title=settings.PROJECT_NAME)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the duplicate Bloom filter in the background; until it is ready
+    # the duplicate check is a plain insert, so startup isn't held up by a big table.
+    threading.Thread(target=duplicate_index.warm, name="duplicate-warm", daemon=True).start()
+    yield
+    # Drain background workers so in-flight batch items finish cleanly
+    shutdown_process_pool()
+    admission.shutdown()
+    erp_gateway.close()
+    vision_workers.close()
+    # Commit queued decisions before the process exits
+    db.close()
+
+app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # --- REAL PRODUCT FIX: CORS Configuration ---
 # Allow frontend (localhost:7575) to talk to backend (localhost:8000)
@@ -29,6 +51,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],  # Pagination + backpressure hints for the dashboard
 )
 
 @app.get("/")
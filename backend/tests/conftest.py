@@ -0,0 +1,5 @@
+import sys
+import os
+
+# Tests import the app the way it runs: `backend.app...` from the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
@@ -0,0 +1,92 @@
+import random
+import socket
+
+import pytest
+
+from backend.app.agents.decision import BATCH_COLUMNS, DecisionAgent, batch_columns, decision_features
+from backend.app.services.erp_client import AsyncERPClient, ERPGateway
+from backend.benchmarks.bench_decision import random_case
+
+CLEAN_INVOICE = {
+    "vendor_name": "Acme Corp",
+    "invoice_number": "INV-1",
+    "amount": 500.0,
+    "currency": "INR",
+    "po_number": "PO-1001",
+    "gstin": None,
+    "date": "2024-03-12",
+}
+
+
+def _closed_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def erp_down():
+    """ERPGateway pointed at a stopped erp_stub (nothing listening)."""
+    gateway = ERPGateway(AsyncERPClient(base_url=f"http://127.0.0.1:{_closed_port()}", timeout=0.5))
+    yield gateway
+    gateway.close()
+
+
+def test_erp_outage_sends_po_invoices_to_review(erp_down):
+    erp_check = erp_down.check_po("PO-1001")
+    assert erp_check["erp_unavailable"] is True
+
+    security_check = {"vendor_status": "TRUSTED", "vendor_score": 90, "is_duplicate": False,
+                      "erp_validation": erp_check}
+    agent = DecisionAgent()
+    result = agent.evaluate(CLEAN_INVOICE, security_check)
+    assert result.decision == "NEEDS_REVIEW"
+    assert [f.code for f in result.fraud_flags] == ["ERP_UNAVAILABLE"]
+
+    features = dict(zip(BATCH_COLUMNS, decision_features(CLEAN_INVOICE, security_check)))
+    assert features["erp_unavailable"] is True
+    batch = agent.evaluate_batch(batch_columns([(CLEAN_INVOICE, security_check)]))
+    assert batch["decision"][0] == "NEEDS_REVIEW"
+    assert batch["confidence"][0] == result.confidence_score
+    assert batch["high_flags"][0] == 0
+
+
+def test_erp_outage_does_not_turn_the_vendor_into_a_bank_mismatch(erp_down, monkeypatch):
+    from backend.app.agents.security import SecurityAgent
+    from backend.app.services import erp_client
+    monkeypatch.setattr(erp_client, "erp_gateway", erp_down)
+
+    security = SecurityAgent()
+    vendor_trust = security.verify_vendor("Acme Corp")
+    assert vendor_trust["status"] == "UNVERIFIED"
+    bank_check = security.verify_bank_details(vendor_trust["data"], {"account_number": "123456789"},
+                                              master_unavailable=True)
+    assert bank_check["match"] is True
+
+    security_check = {"vendor_status": vendor_trust["status"], "vendor_score": vendor_trust["score"],
+                      "is_duplicate": False, "erp_validation": erp_down.check_po("PO-1001"),
+                      "bank_validation": bank_check}
+    agent = DecisionAgent()
+    for extraction in (CLEAN_INVOICE, dict(CLEAN_INVOICE, po_number=None)):
+        result = agent.evaluate(extraction, security_check)
+        assert result.decision == "NEEDS_REVIEW"
+        assert not [f.code for f in result.fraud_flags if f.severity == "HIGH"]
+        batch = agent.evaluate_batch(batch_columns([(extraction, security_check)]))
+        assert (batch["decision"][0], batch["confidence"][0]) == (result.decision, result.confidence_score)
+
+
+def test_evaluate_batch_matches_evaluate_on_synthetic_corpus():
+    rng = random.Random(7)
+    cases = [random_case(rng) for _ in range(5000)]
+    agent = DecisionAgent()
+    batch = agent.evaluate_batch(batch_columns(cases))
+
+    for i, (extraction, security_check) in enumerate(cases):
+        result = agent.evaluate(extraction, security_check, render=False)
+        high_flags = sum(f.severity == "HIGH" for f in result.fraud_flags)
+        assert (result.decision, result.confidence_score, high_flags) == \
+            (batch["decision"][i], batch["confidence"][i], batch["high_flags"][i]), (i, extraction, security_check)
+    # Every decision (and the ERP-outage branch) is exercised
+    assert set(batch["decision"]) == {"APPROVED", "NEEDS_REVIEW", "REJECTED"}
+    assert any(sc["erp_validation"].get("erp_unavailable") and ex["po_number"] for ex, sc in cases)
+    assert any(sc["vendor_status"] == "UNVERIFIED" for _, sc in cases)
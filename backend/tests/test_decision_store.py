@@ -0,0 +1,27 @@
+from backend.app.schemas.ai import SQLiteDB
+
+
+def _store(tmp_path) -> SQLiteDB:
+    return SQLiteDB(db_path=str(tmp_path / "invoices.db"), background_writes=True)
+
+
+def test_background_writes_are_opt_in(tmp_path):
+    assert SQLiteDB(db_path=str(tmp_path / "invoices.db")).background_writes is False
+
+
+def test_failed_batch_keeps_the_good_rows(tmp_path):
+    store = _store(tmp_path)
+    good = store.save_decision("INV-1", {"decision": "APPROVED", "confidence_score": 0.9})
+    store.save_decision("INV-2", {"decision": "APPROVED", "confidence_score": 0.9})
+    store.flush()
+
+    rows = [
+        ("INV-3", "APPROVED", 0.9, "{}", good["timestamp"], None, None, None, None, None),
+        (None, "APPROVED", 0.9, "{}", good["timestamp"], None, None, None, None, None),  # NOT NULL violation
+        ("INV-4", "REJECTED", 0.1, "{}", good["timestamp"], None, None, None, None, None),
+    ]
+    store._insert(rows)
+
+    saved = {row[0] for row in store._connect().execute("SELECT invoice_id FROM decisions")}
+    store.close()
+    assert saved == {"INV-1", "INV-2", "INV-3", "INV-4"}
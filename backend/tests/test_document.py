@@ -0,0 +1,55 @@
+from backend.app.services import document
+from backend.app.services.document import DocumentContext
+from backend.app.services.text_cache import TextCache
+from backend.benchmarks.corpus import make_invoice, render_pdf
+import random
+import PyPDF2
+import pytest
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = TextCache(db_path=str(tmp_path / "text_cache.db"))
+    monkeypatch.setattr(document, "text_cache", cache)
+    monkeypatch.setattr(document.settings, "TEXT_CACHE_ENABLED", True)
+    return cache
+
+def _read(contents: bytes, pages: int = None):
+    stream = DocumentContext(contents, "invoice.pdf").iter_text()
+    read = [page for _, page in zip(range(pages), stream)] if pages else list(stream)
+    stream.close()  # early exit, as extract_stream does
+    return read
+
+def test_resume_decodes_only_pages_after_cached_ones(cache, monkeypatch):
+    contents = render_pdf(make_invoice(random.Random(3), pages=4))
+    calls = []
+    extract_text = PyPDF2.PageObject.extract_text
+    monkeypatch.setattr(PyPDF2.PageObject, "extract_text", lambda page, *a, **k: calls.append(1) or extract_text(page, *a, **k))
+
+    full = _read(contents)  # reference (and a cache entry we replace below)
+    assert len(full) == 4
+    cache._memory.clear()
+    cache.put(DocumentContext(contents, "invoice.pdf").sha256, full[:2], "text_layer", complete=False)
+
+    calls.clear()
+    assert _read(contents) == full
+    assert len(calls) == 2  # pages 3 and 4 only
+    assert cache.get(DocumentContext(contents, "invoice.pdf").sha256)["complete"]
+
+def test_resume_ocr_starts_at_next_page(cache, monkeypatch):
+    contents = render_pdf(make_invoice(random.Random(4), pages=1))
+    requested = []
+
+    def fake_ocr(file_contents, first_page=1):
+        requested.append(first_page)
+        for page_no in range(first_page, 6):
+            yield f"scanned page {page_no}\n"
+
+    monkeypatch.setattr(document, "iter_ocr_pages", fake_ocr)
+    monkeypatch.setattr(document, "OCR_AVAILABLE", True)
+    monkeypatch.setattr(document, "PDF_OCR_AVAILABLE", True)
+    digest = DocumentContext(contents, "invoice.pdf").sha256
+    cache.put(digest, ["scanned page 1\n", "scanned page 2\n"], "ocr", complete=False)
+
+    pages = _read(contents)
+    assert requested == [3]
+    assert pages == [f"scanned page {n}\n" for n in range(1, 6)]
@@ -0,0 +1,89 @@
+import pytest
+
+from backend.app.core.config import settings
+from backend.app.services import duplicate_index as duplicate_module
+from backend.app.services import invoice_pipeline
+from backend.app.services.duplicate_index import DuplicateIndex
+from backend.app.services.near_duplicate import NearDuplicateIndex
+
+INVOICE = "Vendor: Acme Corp\nInvoice No: INV-4711\nDate: 12/03/2024\nTotal: $500.00\n"
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    index = DuplicateIndex(db_path=str(tmp_path / "fingerprints.db"), capacity=1000)
+    index.warm()
+    monkeypatch.setattr(duplicate_module, "duplicate_index", index)
+    monkeypatch.setattr(settings, "NEAR_DUP_ENABLED", False)
+    return index
+
+
+def test_reupload_is_answered_without_a_claim(index):
+    security = invoice_pipeline.security
+    fingerprint = security.fingerprint("Acme", "INV-1", 10.0)
+
+    assert security.check_duplicate(fingerprint) is False
+    assert security.check_duplicate(fingerprint) is True
+    assert index.stats()["claims"] == 1
+    assert index.stats()["bloom_negatives"] == 1
+
+
+def test_failed_request_releases_its_claim(index, monkeypatch):
+    def vendor_lookup_down(vendor_name):
+        raise RuntimeError("vendor master unavailable")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(invoice_pipeline, "_verify_vendor", vendor_lookup_down)
+        with pytest.raises(RuntimeError):
+            invoice_pipeline.analyze_text(INVOICE)
+
+    retry = invoice_pipeline.analyze_text(INVOICE)
+    assert retry.security_context["is_duplicate"] is False
+    assert invoice_pipeline.analyze_text(INVOICE).security_context["is_duplicate"] is True
+
+
+def test_duplicate_request_failure_keeps_the_original_claim(index):
+    first = invoice_pipeline.analyze_text(INVOICE)
+    extracted = first.processed_invoice
+    fingerprint = first.security_context["fingerprint"]
+
+    invoice_pipeline.release_duplicate_claim(extracted, fingerprint, is_duplicate=True)
+    assert index.seen(fingerprint)
+
+
+def test_failed_request_leaves_no_near_duplicate_entry(index, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "NEAR_DUP_ENABLED", True)
+    monkeypatch.setattr(invoice_pipeline, "near_duplicate_index",
+                        NearDuplicateIndex(db_path=str(tmp_path / "near_duplicates.db")))
+
+    def decision_down(extracted_data, security_context):
+        raise RuntimeError("decision engine crashed")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(invoice_pipeline, "_decide", decision_down)
+        with pytest.raises(RuntimeError):
+            invoice_pipeline.analyze_text(INVOICE)
+
+    retry = invoice_pipeline.analyze_text(INVOICE)
+    assert retry.security_context["near_duplicates"] == []
+
+
+def test_new_fingerprint_costs_only_the_claim(index):
+    security = invoice_pipeline.security
+    fingerprint = security.fingerprint("Acme", "INV-2", 10.0)
+    index.refresh_seconds = 3600  # no catch-up: the claim itself must reach the filter
+
+    assert security.check_duplicate(fingerprint) is False
+    assert index.stats()["db_lookups"] == 0
+    assert security.check_duplicate(fingerprint) is True
+    assert index.stats()["claims"] == 1
+
+
+def test_cold_index_leaves_the_check_to_the_claim(tmp_path):
+    index = DuplicateIndex(db_path=str(tmp_path / "fingerprints.db"))
+    fingerprint = invoice_pipeline.security.fingerprint("Acme", "INV-3", 10.0)
+
+    assert index.seen(fingerprint) is False
+    assert index.claim(fingerprint) is True
+    assert index.claim(fingerprint) is False
+    assert index.stats()["db_lookups"] == 0
@@ -0,0 +1,46 @@
+from backend.app.agents.extractor import InvoiceParserAgent
+import json
+import os
+
+GOLDEN = os.path.join(os.path.dirname(__file__), "golden", "extractor_golden.json")
+
+def test_extract_matches_golden_corpus():
+    # Expected values were produced by the original (pre-precompilation) extractor
+    with open(GOLDEN, encoding="utf-8") as f:
+        cases = json.load(f)
+    agent = InvoiceParserAgent()
+    for i, case in enumerate(cases):
+        assert agent.extract(case["text"]) == case["expected"], f"golden case {i}"
+
+def _pages(lines, per_page):
+    return ["\n".join(lines[i:i + per_page]) + "\n" for i in range(0, len(lines), per_page)]
+
+def test_stream_amount_not_settled_by_sub_total():
+    pages = [
+        "Vendor: Acme Corp\nInvoice No: INV-2024-001\nInvoice Date: 01/02/2024\nSub Total: 100\n",
+        "Line items continued\nGrand Total: 5000\n",
+    ]
+    agent = InvoiceParserAgent()
+    streamed, read, stopped = agent.extract_stream(pages, early_exit=True)
+    assert streamed["amount"] == agent.extract("".join(pages))["amount"] == 5000.0
+    assert read == 2
+
+def test_stream_matches_extract_on_multi_page_corpus():
+    from backend.benchmarks.corpus import make_invoice, invoice_lines
+    import random
+
+    rng = random.Random(7)
+    agent = InvoiceParserAgent()
+    for _ in range(20):
+        lines = invoice_lines(make_invoice(rng, pages=rng.randint(2, 4)))
+        for per_page in (7, 40):
+            pages = _pages(lines, per_page)
+            expected = agent.extract("".join(pages))
+            for early_exit in (False, True):
+                streamed, _, _ = agent.extract_stream(pages, early_exit=early_exit)
+                if early_exit:
+                    # Early exit only promises the required fields
+                    streamed = {k: streamed[k] for k in InvoiceParserAgent.EARLY_EXIT_FIELDS}
+                    assert streamed == {k: expected[k] for k in InvoiceParserAgent.EARLY_EXIT_FIELDS}
+                else:
+                    assert streamed == expected
@@ -0,0 +1,17 @@
+from backend.app.services.metrics import MetricsRegistry
+
+def _series(text: str, name: str):
+    return {line.split(" ")[0]: float(line.split(" ")[1]) for line in text.splitlines() if line.startswith(name)}
+
+def test_histogram_over_range_observation_counts_as_inf_only():
+    registry = MetricsRegistry()
+    registry.describe("latency_seconds", "histogram", "test", buckets=(0.1, 1.0))
+    registry.observe("latency_seconds", 0.05)
+    registry.observe("latency_seconds", 90.0)
+
+    series = _series(registry.render(), "latency_seconds")
+    assert series['latency_seconds_bucket{le="0.1"}'] == 1
+    assert series['latency_seconds_bucket{le="1.0"}'] == 1
+    assert series['latency_seconds_bucket{le="+Inf"}'] == 2
+    assert series["latency_seconds_sum"] == 90.05
+    assert series["latency_seconds_count"] == 2
@@ -0,0 +1,84 @@
+from backend.app.services.near_duplicate import NearDuplicateIndex
+
+TEMPLATE = """Northwind Facilities Services Pvt Ltd
+Plot 14, Industrial Estate Phase II, Pune 411019
+GSTIN 27AAACN1234F1Z5  |  accounts@northwind-facilities.example
+TAX INVOICE
+Invoice No: {number}
+Invoice Date: {date}
+Bill To: Contoso Manufacturing Ltd, Unit 7, MIDC Bhosari, Pune 411026
+Description                                   Qty    Rate      Amount
+Housekeeping services - main plant             1      {a}      {a}
+Security services - 24x7 guarding              1      {b}      {b}
+Pest control - quarterly visit                 1      4,500.00  4,500.00
+Sub Total {sub}
+CGST 9% / SGST 9% as applicable
+Grand Total: {total}
+Payment terms: 30 days from invoice date. Bank: HDFC Bank, A/C 50200012345678, IFSC HDFC0001234
+This is a computer generated invoice and does not require a signature.
+"""
+
+
+def _invoice(number, date, a, b):
+    total = a + b + 4500
+    text = TEMPLATE.format(number=number, date=date, a=f"{a:,.2f}", b=f"{b:,.2f}",
+                           sub=f"{total:,.2f}", total=f"{total:,.2f}")
+    fields = {"vendor_name": "Northwind Facilities Services Pvt Ltd", "invoice_number": number, "amount": float(total),
+              "date": date}
+    return text, fields
+
+
+def _index(tmp_path) -> NearDuplicateIndex:
+    return NearDuplicateIndex(db_path=str(tmp_path / "near_duplicates.db"))
+
+
+def test_next_months_invoice_on_the_same_template_is_not_a_near_duplicate(tmp_path):
+    index = _index(tmp_path)
+    march, march_fields = _invoice("NW/2024/0311", "31/03/2024", 42000, 36500)
+    april, april_fields = _invoice("NW/2024/0412", "30/04/2024", 43800, 36500)
+
+    assert index.check_and_add(march, march_fields, 0.85) == []
+    # The template alone puts the pair over the threshold...
+    assert index.query(index.signature_for(april, april_fields), 0.85)
+    # ...but neither the invoice number nor the amount agrees
+    assert index.check_and_add(april, april_fields, 0.85) == []
+
+
+def test_recurring_invoice_for_the_same_amount_is_not_a_near_duplicate(tmp_path):
+    index = _index(tmp_path)
+    # A fixed monthly retainer: only the invoice number and date change
+    march, march_fields = _invoice("NW/2024/0311", "31/03/2024", 44000, 36500)
+    april, april_fields = _invoice("NW/2024/0412", "30/04/2024", 44000, 36500)
+
+    assert index.check_and_add(march, march_fields, 0.85) == []
+    assert index.query(index.signature_for(april, april_fields), 0.85)
+    assert index.check_and_add(april, april_fields, 0.85) == []
+
+
+def test_re_keyed_copy_with_the_same_date_and_amount_is_a_near_duplicate(tmp_path):
+    index = _index(tmp_path)
+    original, fields = _invoice("NW/2024/0311", "31/03/2024", 44000, 36500)
+    copy, copy_fields = _invoice("NW/2024/0318", "31/03/2024", 44000, 36500)
+
+    index.check_and_add(original, fields, 0.85)
+    matches = index.check_and_add(copy, copy_fields, 0.85)
+    assert [m["invoice_id"] for m in matches] == ["NW/2024/0311"]
+
+
+def test_edited_copy_is_a_near_duplicate(tmp_path):
+    index = _index(tmp_path)
+    original, fields = _invoice("NW/2024/0311", "31/03/2024", 42000, 36500)
+    copy, copy_fields = _invoice("NW/2024/0311-A", "31/03/2024", 42000, 36500)
+
+    index.check_and_add(original, fields, 0.85)
+    matches = index.check_and_add(copy, copy_fields, 0.85)
+    assert [m["invoice_id"] for m in matches] == ["NW/2024/0311"]
+
+
+def test_discard_forgets_a_failed_request(tmp_path):
+    index = _index(tmp_path)
+    text, fields = _invoice("NW/2024/0311", "31/03/2024", 42000, 36500)
+
+    index.check_and_add(text, fields, 0.85)
+    index.discard(fields)
+    assert index.check_and_add(text, fields, 0.85) == []
@@ -0,0 +1,26 @@
+import sqlite3
+
+from backend.app.services.text_cache import TextCache
+
+
+def test_disk_tier_is_evicted_without_a_scan_per_write(tmp_path, monkeypatch):
+    cache = TextCache(db_path=str(tmp_path / "text_cache.db"), memory_mb=0, disk_mb=1)
+    statements = []
+
+    def traced_connect():
+        conn = sqlite3.connect(cache.db_path, timeout=10)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(cache, "_connect", traced_connect)
+    page = "x" * 50_000
+    for i in range(100):  # 5 MB through a 1 MB tier
+        cache.put(f"{i:064x}", [page], "native", True)
+
+    conn = sqlite3.connect(cache.db_path)
+    assert conn.execute("SELECT SUM(size) FROM text_cache").fetchone()[0] <= cache.disk_limit
+    # The most recent entries survive
+    assert conn.execute("SELECT 1 FROM text_cache WHERE digest = ?", (f"{99:064x}",)).fetchone()
+    scans = [s for s in statements if "SUM(size)" in s]
+    assert len(scans) <= 100 // 2  # re-counted every ~0.1 MB written, not on every store
+    assert cache.stats()["evictions"] > 0
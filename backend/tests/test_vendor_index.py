@@ -0,0 +1,31 @@
+import pytest
+
+from backend.app.core.config import settings
+from backend.app.services.erp_mock import erp_system
+
+
+def _match(name):
+    match, score = erp_system.master.current.vendor_index.lookup(name)
+    return match if score >= settings.VENDOR_MATCH_THRESHOLD else None
+
+
+@pytest.mark.parametrize("name", ["Corp", "Inc", "Ltd", "Limited", "Private Limited", "Pvt. Ltd."])
+def test_legal_form_alone_matches_no_vendor(name):
+    assert _match(name) is None
+
+
+@pytest.mark.parametrize("name, vendor", [
+    ("Globex Corporation", "Globex Inc"),
+    ("Globex, Inc.", "Globex Inc"),
+    ("ACME CORP.", "Acme Corp"),
+    ("Zomato Ltd", "Zomato Limited"),
+    ("FLIPKART INDIA PVT LTD", "Flipkart India Private Limited"),
+    ("Flipkart", "Flipkart India Private Limited"),
+    ("Swiggy Ltd", "Swiggy"),
+])
+def test_legal_form_spelling_does_not_change_the_match(name, vendor):
+    assert _match(name) == vendor
+
+
+def test_shared_legal_form_is_not_a_match():
+    assert _match("Soylent Corp") is None
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+from backend.app.services.vision_worker import VisionWorkerPool
+
+
+class _Proc:
+    """Stands in for a worker process; the tests decide when it dies."""
+
+    def __init__(self):
+        self.alive = True
+        self.exitcode = None
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self, timeout=None):
+        pass
+
+    def terminate(self):
+        self.alive = False
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = VisionWorkerPool(workers=2, slots=4, slot_bytes=1024, timeout=30)
+    monkeypatch.setattr(pool, "_spawn", lambda worker_id: _Proc())
+    monkeypatch.setattr(pool, "_listen", lambda: None)  # the test drives _supervise itself
+    yield pool
+    pool.close()
+
+
+def test_restart_fails_the_dead_workers_frames_and_sessions_at_once(pool):
+    streamed = pool.submit(b"frame", session="cam-1")  # worker 0
+    other = pool.submit(b"frame")                      # worker 1 (least busy)
+    streamed_again = pool.submit(b"frame", session="cam-1")
+    dead_queue = pool._requests[0]
+
+    pool._procs[0].alive = False
+    pool._spawned_at[0] = time.monotonic() - 60  # past the restart backoff
+    pool._supervise()
+
+    for future in (streamed, streamed_again):
+        assert future.done()
+        with pytest.raises(RuntimeError, match="exited"):
+            future.result()
+    assert not other.done()
+    assert pool.restarts == 1
+    assert "cam-1" not in pool._sessions
+    assert pool._inflight == [0, 1]
+    assert len(pool._free) == 3
+    # The replacement starts from an empty queue instead of replaying the failed frames
+    assert pool._requests[0] is not dead_queue
+    assert pool._procs[0].is_alive()